@@ -2,38 +2,98 @@
 selfie.fm - FastAPI Backend
 AI-Powered Link Sharing Platform with Voice Messages
 """
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Query, BackgroundTasks
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, FileResponse
-from fastapi import Request
-from sqlalchemy.orm import Session
+from fastapi.responses import HTMLResponse, StreamingResponse, RedirectResponse
+from fastapi import Request, Header
+from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
 import uvicorn
 
 from database import get_db, init_db
-from models import User, Link, ProfileView, LinkClick, VoiceMessage
+from models import User, Link, ProfileView, LinkClick, VoiceMessage, TTSJob
 from schemas import (
     UserCreate, UserResponse, LinkCreate, LinkResponse,
-    ScrapeRequest, ScrapeResponse, UserCreateFromLinktree,
-    VoiceCloneResponse, GenerateVoiceRequest, GenerateWelcomeRequest,
-    VoiceMessageResponse
+    ScrapeRequest, ScrapeResponse, LinktreeImportRequest, UserCreateFromLinktree,
+    GenerateVoiceRequest, GenerateWelcomeRequest, BulkLinkVoiceRequest,
+    BulkVoiceDecisionRequest, TTSJobResponse, VoiceCloneJobResponse
 )
 from scraper import scraper
+from linktree_import import linktree_importer, LINKTREE_IMPORT_MAX_URLS
 from voice_ai import VoiceAIService
+from inworld_client import inworld, InworldUnavailableError
+from audio_storage import audio_storage
+from audio_delivery import audio_file_response, audio_url
+import audio_variants
+import audio_sprites
+import sample_preprocessing
+from audio_sweeper import audio_sweeper
+from welcome_scheduler import welcome_scheduler
+from tts_jobs import job_queue, job_to_dict
 from datetime import datetime, timedelta
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, update, insert
+import query_stats
+import search
+import json
+import os
+import asyncio
+import secrets
 
 app = FastAPI(title="selfie.fm", description="AI-powered link sharing with voice messages")
 
+# Operator-only endpoints (bulk import) require "Authorization: Bearer <token>"; unset disables them
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN")
+
+def require_admin_token(authorization: Optional[str] = Header(None)):
+    """Dependency for operator endpoints"""
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Operator endpoints are disabled (ADMIN_API_TOKEN is not set)")
+    if not authorization or not secrets.compare_digest(authorization.encode(), f"Bearer {ADMIN_API_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid or missing admin token")
+
 # Mount static files and templates
 app.mount("/static", StaticFiles(directory="../frontend/static"), name="static")
 templates = Jinja2Templates(directory="../frontend/templates")
+templates.env.globals["audio_url"] = audio_url
+templates.env.globals["audio_sources"] = audio_variants.audio_sources
 
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    search.init_search_index()
+    await job_queue.start()
+    await audio_sweeper.start()
+    await welcome_scheduler.start()
+
+# Stop background workers and release pooled HTTP connections on shutdown
+@app.on_event("shutdown")
+async def shutdown_event():
+    await job_queue.stop()
+    await audio_sweeper.stop()
+    await welcome_scheduler.stop()
+    await inworld.close()
+    await linktree_importer.close()
+
+# Per-request query instrumentation
+@app.middleware("http")
+async def query_stats_middleware(request: Request, call_next):
+    """Count SQL statements per request and report them via Server-Timing"""
+    stats = query_stats.start()
+    response = await call_next(request)
+    
+    route = getattr(request.scope.get("route"), "path", request.url.path)
+    response.headers["Server-Timing"] = stats.server_timing()
+    query_stats.logger.debug(
+        f"{request.method} {route} -> {response.status_code}: "
+        f"{stats.count} queries in {stats.duration_ms:.2f}ms"
+    )
+    query_stats.check_budget(stats, f"{request.method} {route}")
+    return response
+
+# Cap voice sample upload bodies before the multipart parser spools them
+app.add_middleware(sample_preprocessing.UploadSizeLimit)
 
 # Homepage route
 @app.get("/", response_class=HTMLResponse)
@@ -97,10 +157,15 @@ async def user_profile(request: Request, username: str, db: Session = Depends(ge
     db.commit()
     
     links = db.query(Link).filter(Link.user_id == user.id, Link.is_active == True).all()
+    variants = audio_variants.variants_for(
+        [user.welcome_message_audio] + [link.voice_message_audio for link in links]
+    )
+    # All link intros in one file when a current sprite exists
+    intro_sprite = audio_sprites.sprite_for(db, user.id, links)
     
     return templates.TemplateResponse(
         "profile.html",
-        {"request": request, "user": user, "links": links}
+        {"request": request, "user": user, "links": links, "audio_variants": variants, "intro_sprite": intro_sprite}
     )
 
 # API Routes
@@ -114,6 +179,23 @@ def scrape_linktree(scrape_request: ScrapeRequest):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/api/import/linktree", dependencies=[Depends(require_admin_token)])
+async def import_linktrees(import_request: LinktreeImportRequest):
+    """Import many Linktree profiles, streaming one JSON result per line as each URL finishes"""
+    if not import_request.urls:
+        raise HTTPException(status_code=400, detail="No URLs to import")
+    if len(import_request.urls) > LINKTREE_IMPORT_MAX_URLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {LINKTREE_IMPORT_MAX_URLS} URLs can be imported at once"
+        )
+
+    async def results():
+        async for result in linktree_importer.import_urls(import_request.urls):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
 @app.post("/api/users", response_model=UserResponse)
 def create_user(user: UserCreate, db: Session = Depends(get_db)):
     """Create a new user"""
@@ -129,6 +211,8 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
         avatar_url=user.avatar_url
     )
     db.add(db_user)
+    db.flush()
+    search.index_user(db, db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
@@ -146,22 +230,21 @@ def create_user_from_linktree(user_data: UserCreateFromLinktree, db: Session = D
         username=user_data.username,
         display_name=user_data.display_name,
         bio=user_data.bio,
+        avatar_url=user_data.avatar_url,
         imported_from_linktree=True,
         is_published=False
     )
     db.add(db_user)
     db.flush()
-    
-    # Add links
-    for idx, link_data in enumerate(user_data.links):
-        db_link = Link(
-            user_id=db_user.id,
-            title=link_data['title'],
-            url=link_data['url'],
-            order=idx
-        )
-        db.add(db_link)
-    
+    search.index_user(db, db_user)
+    
+    # Add links (imports carry every link on the page, so insert and index them in bulk)
+    if user_data.links:
+        db.execute(insert(Link), [
+            {"user_id": db_user.id, "title": link_data['title'], "url": link_data['url'], "order": idx}
+            for idx, link_data in enumerate(user_data.links)
+        ])
+        search.index_new_links(db, [db_user.id])
     db.commit()
     db.refresh(db_user)
     return db_user
@@ -205,6 +288,7 @@ def update_user(username: str, user_data: UserCreate, db: Session = Depends(get_
     if user_data.avatar_url:
         user.avatar_url = user_data.avatar_url
     
+    search.index_user(db, user)
     db.commit()
     db.refresh(user)
     return user
@@ -223,6 +307,8 @@ def create_link(username: str, link: LinkCreate, db: Session = Depends(get_db)):
         description=link.description
     )
     db.add(db_link)
+    db.flush()
+    search.index_link(db, db_link)
     db.commit()
     db.refresh(db_link)
     return db_link
@@ -246,12 +332,13 @@ def update_link(username: str, link_id: int, link: LinkCreate, db: Session = Dep
     if link.description:
         db_link.description = link.description
     
+    search.index_link(db, db_link)
     db.commit()
     db.refresh(db_link)
     return db_link
 
 @app.delete("/api/users/{username}/links/{link_id}")
-def delete_link(username: str, link_id: int, db: Session = Depends(get_db)):
+def delete_link(username: str, link_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Delete a link"""
     user = db.query(User).filter(User.username == username).first()
     if not user:
@@ -264,8 +351,12 @@ def delete_link(username: str, link_id: int, db: Session = Depends(get_db)):
     if not db_link:
         raise HTTPException(status_code=404, detail="Link not found")
     
+    audio_path = db_link.voice_message_audio
     db.delete(db_link)
+    search.remove_link(db, link_id)
     db.commit()
+    if audio_path:
+        background_tasks.add_task(VoiceAIService.delete_audio_file, audio_path)
     return {"message": "Link deleted successfully"}
 
 @app.get("/api/users/{username}/links", response_model=List[LinkResponse])
@@ -278,6 +369,32 @@ def get_user_links(username: str, db: Session = Depends(get_db)):
     links = db.query(Link).filter(Link.user_id == user.id, Link.is_active == True).all()
     return links
 
+# Search API Routes
+
+@app.get("/api/search")
+def search_all(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: str = Query(default="all", pattern="^(all|profiles|links)$"),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """Ranked prefix search over published profiles and their links"""
+    response = {"query": q, "limit": limit, "offset": offset}
+    
+    # Fetch one extra row per type to know whether there's another page
+    if type in ("all", "profiles"):
+        profiles = search.search_profiles(db, q, limit=limit + 1, offset=offset)
+        response["profiles"] = profiles[:limit]
+        response["profiles_has_more"] = len(profiles) > limit
+    
+    if type in ("all", "links"):
+        links = search.search_links(db, q, limit=limit + 1, offset=offset)
+        response["links"] = links[:limit]
+        response["links_has_more"] = len(links) > limit
+    
+    return response
+
 # Analytics API Routes
 
 @app.get("/api/admin/{username}/stats")
@@ -404,8 +521,8 @@ def get_recent_clicks(username: str, limit: int = 20, db: Session = Depends(get_
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Get recent clicks with link information
-    recent_clicks = db.query(LinkClick).filter(
+    # Get recent clicks with link information (eager-load links to avoid N+1)
+    recent_clicks = db.query(LinkClick).options(joinedload(LinkClick.link)).filter(
         LinkClick.user_id == user.id
     ).order_by(desc(LinkClick.click_date)).limit(limit).all()
     
@@ -528,6 +645,88 @@ def get_pending_voice_messages(username: str, db: Session = Depends(get_db)):
         "created_at": vm.created_at.isoformat()
     } for vm in pending]
 
+@app.get("/api/admin/{username}/moderation")
+def get_moderation_feed(
+    username: str,
+    cursor: Optional[int] = Query(default=None, ge=1),
+    limit: int = Query(default=50, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """
+    Cursor-paginated feed of pending voice messages, newest first
+    
+    Pass the returned next_cursor back as ?cursor= to get the next page.
+    """
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    query = db.query(VoiceMessage).filter(
+        VoiceMessage.user_id == user.id,
+        VoiceMessage.is_approved == False,
+        VoiceMessage.is_active == True
+    )
+    if cursor:
+        query = query.filter(VoiceMessage.id < cursor)
+    
+    # Ids increase with creation time, so keyset pagination on id keeps newest-first order
+    page = query.order_by(desc(VoiceMessage.id)).limit(limit + 1).all()
+    has_more = len(page) > limit
+    page = page[:limit]
+    
+    return {
+        "items": [{
+            "id": vm.id,
+            "text_content": vm.text_content,
+            "audio_file_path": vm.audio_file_path,
+            "created_at": vm.created_at.isoformat()
+        } for vm in page],
+        "next_cursor": page[-1].id if has_more else None
+    }
+
+@app.post("/api/admin/{username}/voices/bulk")
+def bulk_voice_decision(
+    username: str,
+    decision: BulkVoiceDecisionRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """Approve or reject a set of pending voice messages in one update"""
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    pending = (
+        VoiceMessage.id.in_(set(decision.ids)),
+        VoiceMessage.user_id == user.id,
+        VoiceMessage.is_active == True,
+        VoiceMessage.is_approved == False
+    )
+    
+    audio_paths = []
+    if decision.action == "approve":
+        values = {"is_approved": True, "approved_at": datetime.now()}
+    else:
+        values = {"is_active": False}
+        audio_paths = [
+            path for (path,) in db.query(VoiceMessage.audio_file_path).filter(*pending)
+            if path
+        ]
+    
+    result = db.execute(
+        update(VoiceMessage).where(*pending).values(**values).execution_options(synchronize_session=False)
+    )
+    db.commit()
+    
+    for path in audio_paths:
+        background_tasks.add_task(VoiceAIService.delete_audio_file, path)
+    
+    return {
+        "action": decision.action,
+        "updated": result.rowcount,
+        "skipped": len(set(decision.ids)) - result.rowcount
+    }
+
 @app.put("/api/admin/{username}/voices/{voice_id}/approve")
 def approve_voice_message(username: str, voice_id: int, db: Session = Depends(get_db)):
     """Approve a voice message"""
@@ -549,7 +748,12 @@ def approve_voice_message(username: str, voice_id: int, db: Session = Depends(ge
     return {"message": "Voice message approved"}
 
 @app.put("/api/admin/{username}/voices/{voice_id}/reject")
-def reject_voice_message(username: str, voice_id: int, db: Session = Depends(get_db)):
+def reject_voice_message(
+    username: str,
+    voice_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
     """Reject a voice message"""
     user = db.query(User).filter(User.username == username).first()
     if not user:
@@ -565,6 +769,9 @@ def reject_voice_message(username: str, voice_id: int, db: Session = Depends(get
     voice.is_active = False
     db.commit()
     
+    if voice.audio_file_path:
+        background_tasks.add_task(VoiceAIService.delete_audio_file, voice.audio_file_path)
+    
     return {"message": "Voice message rejected"}
 
 @app.put("/api/admin/{username}/auto-approve")
@@ -596,6 +803,7 @@ def update_profile_settings(
     user.display_name = display_name
     if bio is not None:
         user.bio = bio
+    search.index_user(db, user)
     db.commit()
     
     return {"message": "Profile updated"}
@@ -614,7 +822,15 @@ def toggle_publish(username: str, db: Session = Depends(get_db)):
 
 # Voice AI Routes
 
-@app.post("/api/voice/clone/{username}", response_model=VoiceCloneResponse)
+def job_accepted(job: TTSJob) -> TTSJobResponse:
+    """202 body pointing the client at the job status endpoint"""
+    return TTSJobResponse(
+        job_id=job.id,
+        status=job.status,
+        status_url=f"/api/voice/jobs/{job.id}"
+    )
+
+@app.post("/api/voice/clone/{username}", response_model=VoiceCloneJobResponse, status_code=202)
 async def create_voice_clone(
     username: str,
     voice_samples: List[UploadFile] = File(...),
@@ -628,11 +844,14 @@ async def create_voice_clone(
     """
     Create voice clone from recorded samples using Inworld AI
     
-    This endpoint handles the complete voice cloning process:
+    This endpoint queues the voice cloning process:
     1. Receives 1-3 voice samples from browser recording
-    2. Sends samples to Inworld AI to create voice clone
-    3. Saves voice_id to user profile
-    4. Returns success with voice_id
+    2. Trims silence, normalizes and re-encodes them (when ffmpeg is available)
+    3. Saves the samples and queues a voice_clone job
+    4. Returns 202 with the job id and a preprocessing report (durations, bytes saved)
+    
+    The job sends the samples to Inworld AI and saves the voice_id to the user
+    profile; poll /api/voice/jobs/{job_id} for the result.
     """
     user = db.query(User).filter(User.username == username).first()
     if not user:
@@ -642,63 +861,82 @@ async def create_voice_clone(
     if not voice_samples or len(voice_samples) == 0:
         raise HTTPException(status_code=400, detail="At least one voice sample is required")
     
-    if len(voice_samples) > 3:
-        raise HTTPException(status_code=400, detail="Maximum 3 voice samples allowed")
-    
-    # Read all uploaded files
-    samples_data = []
-    for sample in voice_samples:
-        voice_data = await sample.read()
-        
-        # Validate file size per sample (5-15 seconds of audio, roughly 100KB-2MB)
-        if len(voice_data) < 50000:  # Less than ~50KB
-            raise HTTPException(status_code=400, detail=f"Voice sample '{sample.filename}' too short. Please record 5-15 seconds.")
-        
-        if len(voice_data) > 3000000:  # More than ~3MB
-            raise HTTPException(status_code=400, detail=f"Voice sample '{sample.filename}' too large. Please keep under 20 seconds.")
-        
-        samples_data.append(voice_data)
+    if len(voice_samples) > sample_preprocessing.VOICE_CLONE_MAX_SAMPLES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximum {sample_preprocessing.VOICE_CLONE_MAX_SAMPLES} voice samples allowed"
+        )
     
+    # Check each upload's size in place; Starlette has already spooled it to a temp file
+    uploads = []
+    processed_samples = []
     try:
-        # Create voice clone with Inworld AI
-        result = VoiceAIService.create_voice_clone(
-            voice_samples=samples_data,
-            voice_name=voice_name,
-            language=language,
-            tags=tags,
-            description=description,
-            remove_noise=remove_noise,
-            username=username
-        )
+        for sample in voice_samples:
+            try:
+                upload = sample_preprocessing.checked_upload(sample)
+            except sample_preprocessing.SampleRejected as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            uploads.append((sample.filename, upload))
+            size = sample_preprocessing.file_size(upload)
+            
+            if not sample_preprocessing.enabled():
+                # No decoder available: fall back to estimating length from file size (~100KB-2MB for 5-15s)
+                if size < 50000:  # Less than ~50KB
+                    raise HTTPException(status_code=400, detail=f"Voice sample '{sample.filename}' too short. Please record 5-15 seconds.")
+                
+                if size > 3000000:  # More than ~3MB
+                    raise HTTPException(status_code=400, detail=f"Voice sample '{sample.filename}' too large. Please keep under 20 seconds.")
         
-        if not result or not result.get("voice_id"):
-            raise HTTPException(status_code=500, detail="Failed to create voice clone")
+        # Decode, trim silence, normalize and re-encode; reject by real speech duration
+        preprocessing = None
+        samples = [upload for _, upload in uploads]
+        if sample_preprocessing.enabled():
+            try:
+                processed = await sample_preprocessing.preprocess_samples(uploads)
+            except sample_preprocessing.SampleRejected as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            samples = processed_samples = processed["samples"]
+            preprocessing = processed["report"]
         
-        # Update user with voice clone ID
-        user.voice_clone_id = result["voice_id"]
-        if result.get("sample_paths"):
-            user.voice_sample_path = result["sample_paths"][0]  # Save first sample path
-        db.commit()
+        if not inworld.configured:
+            raise HTTPException(status_code=400, detail="INWORLD_API_KEY environment variable is not set")
         
-        return VoiceCloneResponse(
-            voice_id=result["voice_id"],
-            sample_path=result.get("sample_paths", [None])[0],
-            message=result.get("message", "Voice clone created successfully!")
-        )
-        
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error creating voice clone: {str(e)}")
+        try:
+            # Stage samples in storage so the job survives a restart
+            sample_paths = await VoiceAIService.save_voice_samples(samples, username)
+            
+            job = job_queue.enqueue(db, user.id, "voice_clone", {
+                "sample_paths": sample_paths,
+                "voice_name": voice_name,
+                "language": language,
+                "tags": tags,
+                "description": description,
+                "remove_noise": remove_noise,
+                "preprocessing": preprocessing
+            })
+            return VoiceCloneJobResponse(**job_accepted(job).model_dump(), preprocessing=preprocessing)
+            
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error creating voice clone: {str(e)}")
+    finally:
+        # The uploads themselves are closed by Starlette; only the processed copies are ours
+        for spool in processed_samples:
+            spool.close()
 
 
 @app.post("/api/voice/test/{username}")
 async def test_voice(
     username: str,
     text: str = Form(...),
+    stream: bool = Form(default=False),
     db: Session = Depends(get_db)
 ):
-    """Test the user's cloned voice with custom text"""
+    """
+    Test the user's cloned voice with custom text
+    
+    With stream=true, audio chunks are sent as Inworld produces them instead of
+    after synthesis completes, and the result is saved to the TTS cache.
+    """
     user = db.query(User).filter(User.username == username).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -712,9 +950,33 @@ async def test_voice(
     if len(text) > 500:
         raise HTTPException(status_code=400, detail="Text too long. Maximum 500 characters for testing.")
     
+    if stream:
+        try:
+            audio_stream = VoiceAIService.stream_voice(text=text, voice_id=user.voice_clone_id)
+            # Pull the first chunk now so provider errors still become a proper error response
+            first_chunk = await audio_stream.__anext__()
+        except StopAsyncIteration:
+            raise HTTPException(status_code=500, detail="Failed to generate test audio")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except InworldUnavailableError as e:
+            raise HTTPException(
+                status_code=503, detail=str(e),
+                headers={"Retry-After": str(max(1, round(e.retry_after)))}
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error testing voice: {str(e)}")
+        
+        async def audio_chunks():
+            yield first_chunk
+            async for chunk in audio_stream:
+                yield chunk
+        
+        return StreamingResponse(audio_chunks(), media_type="audio/mpeg")
+    
     try:
         # Generate test audio
-        audio_bytes = VoiceAIService.test_voice_clone(
+        audio_bytes = await VoiceAIService.test_voice_clone(
             text=text,
             voice_id=user.voice_clone_id
         )
@@ -731,14 +993,14 @@ async def test_voice(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error testing voice: {str(e)}")
 
-@app.post("/api/voice/generate-link/{username}/{link_id}", response_model=VoiceMessageResponse)
+@app.post("/api/voice/generate-link/{username}/{link_id}", response_model=TTSJobResponse, status_code=202)
 async def generate_link_voice(
     username: str,
     link_id: int,
     request: GenerateVoiceRequest,
     db: Session = Depends(get_db)
 ):
-    """Generate voice message for a specific link"""
+    """Queue voice message generation for a specific link"""
     user = db.query(User).filter(User.username == username).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -750,37 +1012,61 @@ async def generate_link_voice(
     if not user.voice_clone_id:
         raise HTTPException(status_code=400, detail="Voice clone not set up. Please upload a voice sample first.")
     
-    try:
-        # Delete old audio if exists
-        if link.voice_message_audio:
-            VoiceAIService.delete_audio_file(link.voice_message_audio)
-        
-        # Generate new voice message
-        audio_path = VoiceAIService.generate_with_voice_clone(
-            text=request.text,
-            voice_id=user.voice_clone_id,
-            user_id=user.id,
-            purpose=f"link_{link_id}"
-        )
-        
-        if not audio_path:
-            raise HTTPException(status_code=500, detail="Failed to generate voice message")
-        
-        # Update link with voice message
-        link.voice_message_text = request.text
-        link.voice_message_audio = audio_path
-        db.commit()
-        
-        return VoiceMessageResponse(
-            audio_path=audio_path,
-            text=request.text,
-            message="Voice message generated successfully"
+    if not inworld.configured:
+        raise HTTPException(status_code=400, detail="INWORLD_API_KEY environment variable is not set")
+    
+    # The job swaps in the new audio and removes the old file when it finishes
+    job = job_queue.enqueue(db, user.id, "link_voice", {"link_id": link.id, "text": request.text})
+    return job_accepted(job)
+
+@app.post("/api/voice/generate-links/{username}", response_model=TTSJobResponse, status_code=202)
+async def generate_links_voice(
+    username: str,
+    request: BulkLinkVoiceRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Queue voice intros for many links at once
+    
+    Uses the given per-link texts; with auto_generate, also writes intros from the
+    title/description of every other active link. The job synthesizes them concurrently
+    and saves all links in one commit; its result lists the outcome per link.
+    """
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    if not user.voice_clone_id:
+        raise HTTPException(status_code=400, detail="Voice clone not set up. Please upload a voice sample first.")
+    
+    if not inworld.configured:
+        raise HTTPException(status_code=400, detail="INWORLD_API_KEY environment variable is not set")
+    
+    items = {item.link_id: item.text for item in request.links}
+    
+    user_link_ids = {
+        link_id for (link_id,) in db.query(Link.id).filter(
+            Link.user_id == user.id,
+            Link.id.in_(list(items))
         )
-        
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating voice: {str(e)}")
+    }
+    missing = sorted(set(items) - user_link_ids)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Links not found: {missing}")
+    
+    if request.auto_generate:
+        active_links = db.query(Link).filter(Link.user_id == user.id, Link.is_active == True).order_by(Link.order)
+        for link in active_links:
+            if link.id not in items:
+                items[link.id] = VoiceAIService.default_link_intro(link.title, link.description)
+    
+    if not items:
+        raise HTTPException(status_code=400, detail="No links to generate voice intros for")
+    
+    job = job_queue.enqueue(db, user.id, "bulk_link_voice", {
+        "links": [{"link_id": link_id, "text": text} for link_id, text in items.items()]
+    })
+    return job_accepted(job)
 
 @app.delete("/api/voice/link/{username}/{link_id}")
 async def delete_link_voice(
@@ -802,16 +1088,17 @@ async def delete_link_voice(
         link.voice_message_text = None
         link.voice_message_audio = None
         db.commit()
+        audio_sprites.schedule(user.id)
     
     return {"message": "Voice message deleted successfully"}
 
-@app.post("/api/voice/generate-welcome/{username}", response_model=VoiceMessageResponse)
+@app.post("/api/voice/generate-welcome/{username}", response_model=TTSJobResponse, status_code=202)
 async def generate_welcome_message(
     username: str,
     request: GenerateWelcomeRequest,
     db: Session = Depends(get_db)
 ):
-    """Generate welcome message for user profile"""
+    """Queue welcome message generation for user profile"""
     user = db.query(User).filter(User.username == username).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -819,47 +1106,49 @@ async def generate_welcome_message(
     if not user.voice_clone_id:
         raise HTTPException(status_code=400, detail="Voice clone not set up. Please upload a voice sample first.")
     
-    try:
-        # Delete old audio if exists
-        if user.welcome_message_audio:
-            VoiceAIService.delete_audio_file(user.welcome_message_audio)
-        
-        # Generate new welcome message
-        audio_path = VoiceAIService.generate_with_voice_clone(
-            text=request.text,
-            voice_id=user.voice_clone_id,
-            user_id=user.id,
-            purpose="welcome"
-        )
-        
-        if not audio_path:
-            raise HTTPException(status_code=500, detail="Failed to generate welcome message")
-        
-        # Update user with welcome message
-        user.welcome_message_text = request.text
-        user.welcome_message_audio = audio_path
-        user.welcome_message_type = request.message_type
-        db.commit()
-        
-        return VoiceMessageResponse(
-            audio_path=audio_path,
-            text=request.text,
-            message="Welcome message generated successfully"
-        )
-        
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating welcome message: {str(e)}")
-
-@app.get("/audio/{filename}")
-async def get_audio(filename: str):
-    """Serve audio files"""
-    from pathlib import Path
-    audio_path = Path(__file__).parent / "audio" / filename
-    if not audio_path.exists():
+    if not inworld.configured:
+        raise HTTPException(status_code=400, detail="INWORLD_API_KEY environment variable is not set")
+    
+    job = job_queue.enqueue(db, user.id, "welcome", {
+        "text": request.text,
+        "message_type": request.message_type
+    })
+    return job_accepted(job)
+
+@app.get("/api/voice/provider-status")
+def get_voice_provider_status():
+    """Rate limiter, circuit breaker and call counters for the Inworld client, for monitoring"""
+    return inworld.status()
+
+@app.get("/api/voice/jobs/{job_id}")
+def get_voice_job(job_id: int, db: Session = Depends(get_db)):
+    """Poll the status of a queued voice job; result holds audio_path (or voice_id) once succeeded"""
+    job = db.query(TTSJob).filter(TTSJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
+
+@app.api_route("/audio/{filename}", methods=["GET", "HEAD"])
+async def get_audio(filename: str, request: Request):
+    """Serve audio files with immutable caching and byte ranges, or redirect to the object store"""
+    key = f"audio/{filename}"
+    extra_headers = {}
+    if key.endswith(".mp3"):
+        # MP3 URLs may be answered with a smaller Opus/AAC variant the client accepts
+        extra_headers["Vary"] = "Accept"
+        variant = await asyncio.to_thread(audio_variants.negotiate, key, request.headers.get("accept"))
+        if variant:
+            key = variant.audio_path
+    
+    url = audio_storage.url(key)
+    if url:
+        # Presigned URLs expire, so only let the browser reuse the redirect briefly
+        return RedirectResponse(url, status_code=307, headers={"Cache-Control": "private, max-age=300", **extra_headers})
+    
+    audio_path = audio_storage.local_path(key)
+    if not audio_path:
         raise HTTPException(status_code=404, detail="Audio file not found")
-    return FileResponse(audio_path, media_type="audio/mpeg")
+    return audio_file_response(request, audio_path, extra_headers)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,153 @@
+"""
+HTTP delivery of stored audio for VoiceTree
+Immutable cache headers, strong ETags and single byte-range (206) responses
+"""
+import os
+import re
+import hashlib
+from pathlib import Path
+from email.utils import formatdate
+from typing import Optional, Tuple, Dict, AsyncIterator
+
+import aiofiles
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+# Audio files are write-once: a new recording always gets a new file name
+AUDIO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# Content types by file extension (MP3 originals plus their Opus/AAC variants)
+AUDIO_MEDIA_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".opus": "audio/ogg",
+    ".m4a": "audio/mp4",
+}
+
+# tts_<sha256>.<ext> - the name already is a hash of the file
+HASHED_NAME_RE = re.compile(r"^tts_([0-9a-f]{64})\.\w+$")
+
+
+class RangeNotSatisfiable(Exception):
+    """The Range header doesn't overlap the file"""
+    pass
+
+
+def audio_url(audio_path: Optional[str]) -> Optional[str]:
+    """Public URL for a stored audio path (e.g. "audio/tts_<sha256>.mp3" -> "/audio/tts_<sha256>.mp3")"""
+    if not audio_path:
+        return None
+    return f"/audio/{audio_path.rsplit('/', 1)[-1]}"
+
+
+def audio_etag(filename: str, size: int) -> str:
+    """Strong ETag: the content hash from the file name, or a hash of the (write-once) name and size"""
+    match = HASHED_NAME_RE.match(filename)
+    digest = match.group(1) if match else hashlib.sha256(f"{filename}:{size}".encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=" range into inclusive (start, end) offsets
+
+    Returns None for headers we don't handle (other units, multiple ranges, malformed),
+    in which case the whole file is sent.
+
+    Raises:
+        RangeNotSatisfiable: If the range starts past the end of the file
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    start_text, sep, end_text = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not start_text:
+            # Suffix range: the last N bytes
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - suffix, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+
+async def _read_range(path: Path, start: int, length: int) -> AsyncIterator[bytes]:
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = await f.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+def audio_file_response(request: Request, path: Path, extra_headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Serve a local audio file with caching and seeking support
+
+    Answers If-None-Match with 304, a single Range with 206 (honouring If-Range),
+    an unsatisfiable Range with 416, and HEAD without a body.
+    """
+    stat_result = os.stat(path)
+    size = stat_result.st_size
+    etag = audio_etag(path.name, size)
+    media_type = AUDIO_MEDIA_TYPES.get(path.suffix, "application/octet-stream")
+    headers = {
+        "ETag": etag,
+        "Cache-Control": AUDIO_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        **(extra_headers or {})
+    }
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    start, end = 0, size - 1
+    status_code = 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and size and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    length = end - start + 1 if size else 0
+    headers["Content-Length"] = str(length)
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(
+        _read_range(path, start, length),
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type
+    )
@@ -0,0 +1,252 @@
+"""
+Link intro audio sprites for VoiceTree
+Concatenates a profile's link intros into one MP3 with a JSON offset map, so a profile view downloads one file instead of one per link
+"""
+import os
+import json
+import asyncio
+import time
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Optional, List, Dict, Iterable, Tuple
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import AudioSprite, Link
+from audio_storage import audio_storage
+from audio_delivery import audio_url
+from audio_variants import FFMPEG_PATH, run_ffmpeg, file_digest
+
+# Sprite configuration
+AUDIO_SPRITES_ENABLED = os.getenv("AUDIO_SPRITES_ENABLED", "true").lower() == "true"
+AUDIO_SPRITE_MIN_INTROS = int(os.getenv("AUDIO_SPRITE_MIN_INTROS", "2"))  # Fewer intros are served as separate files
+AUDIO_SPRITE_BITRATE = os.getenv("AUDIO_SPRITE_BITRATE", "48k")  # Constant bitrate, so seeking by time is exact
+AUDIO_SPRITE_GAP = float(os.getenv("AUDIO_SPRITE_GAP", "0.3"))  # Seconds of silence between intros
+AUDIO_SPRITE_DEBOUNCE = float(os.getenv("AUDIO_SPRITE_DEBOUNCE", "2"))  # Wait for a burst of intro changes to settle
+AUDIO_SPRITE_RETRY_BACKOFF = float(os.getenv("AUDIO_SPRITE_RETRY_BACKOFF", "300"))  # Seconds before retrying a failed build, doubling per failure
+AUDIO_SPRITE_RETRY_MAX = float(os.getenv("AUDIO_SPRITE_RETRY_MAX", "86400"))  # Longest wait between retries
+
+SPRITE_SAMPLE_RATE = 22050  # Matches the TTS output, so intros aren't resampled twice
+
+# One sprite build at a time; they're an optimization, not on any request path
+_build_semaphore = asyncio.Semaphore(1)
+
+# user_id -> scheduled build task, and users whose intros changed while their build ran
+_pending_builds: Dict[int, asyncio.Task] = {}
+_dirty_users = set()
+
+# user_id -> (signature, consecutive failures, retry after) for builds ffmpeg couldn't produce
+_failed_builds: Dict[int, Tuple[str, int, float]] = {}
+
+
+def enabled() -> bool:
+    return AUDIO_SPRITES_ENABLED and bool(FFMPEG_PATH)
+
+
+def _intro_links(links: Iterable[Link]) -> List[Link]:
+    """Active links with an intro, in profile order"""
+    return sorted(
+        (link for link in links if link.is_active and link.voice_message_audio),
+        key=lambda link: (link.order or 0, link.id)
+    )
+
+
+def intro_signature(links: Iterable[Link]) -> str:
+    """Identifies the set of intros a sprite contains; changes whenever any intro does"""
+    digest = hashlib.sha256()
+    for link in _intro_links(links):
+        digest.update(f"{link.id}:{link.voice_message_audio}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _backing_off(user_id: int, signature: str) -> bool:
+    """True while a build of these exact intros recently failed and shouldn't be retried yet"""
+    failed = _failed_builds.get(user_id)
+    return failed is not None and failed[0] == signature and time.monotonic() < failed[2]
+
+
+def _record_failure(user_id: int, signature: str):
+    """Remember a failed build so page views don't retry it until the backoff passes or the intros change"""
+    failed = _failed_builds.get(user_id)
+    failures = failed[1] + 1 if failed and failed[0] == signature else 1
+    delay = min(AUDIO_SPRITE_RETRY_BACKOFF * 2 ** (failures - 1), AUDIO_SPRITE_RETRY_MAX)
+    _failed_builds[user_id] = (signature, failures, time.monotonic() + delay)
+
+
+def sprite_for(db: Session, user_id: int, links: List[Link]) -> Optional[Dict]:
+    """
+    The current sprite for a profile page, or None to use one audio file per link
+
+    If the stored sprite was built from different intros (or there is none yet),
+    a rebuild is scheduled and the page falls back to per-link files meanwhile.
+    A build of the same intros that failed recently is not retried until its backoff passes.
+
+    Args:
+        db: The request's database session
+        user_id: Profile owner
+        links: The profile's active links
+
+    Returns:
+        {"src": sprite URL, "segments": {"<link_id>": [start_seconds, end_seconds]}}
+    """
+    if not enabled():
+        return None
+
+    sprite = db.query(AudioSprite).filter(AudioSprite.user_id == user_id).first()
+    wanted = len(_intro_links(links)) >= AUDIO_SPRITE_MIN_INTROS
+    signature = intro_signature(links)
+    if wanted and sprite and sprite.signature == signature:
+        return {"src": audio_url(sprite.audio_path), "segments": json.loads(sprite.segments)}
+    if wanted and _backing_off(user_id, signature):
+        return None
+    if wanted or sprite:
+        # Build a missing or stale sprite, or remove one that's no longer needed
+        schedule(user_id)
+    return None
+
+
+def _append_pcm(combined, path: Path) -> int:
+    """Copy decoded 16-bit mono PCM onto the combined stream; returns the number of samples"""
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            combined.write(chunk)
+            size += len(chunk)
+    return size // 2
+
+
+async def build_sprite(user_id: int) -> Optional[str]:
+    """
+    Build (or remove) the intro sprite for a user, replacing the previous one
+
+    Each intro is decoded to PCM, the intros are joined with short silences,
+    and the result is encoded once as constant-bitrate MP3. Offsets come from
+    the decoded sample counts.
+
+    Returns:
+        The new sprite's audio path, or None if none was built
+    """
+    with SessionLocal() as db:
+        links = db.query(Link).filter(Link.user_id == user_id, Link.is_active == True).all()
+        intros = [(link.id, link.voice_message_audio) for link in _intro_links(links)]
+        signature = intro_signature(links)
+        existing = db.query(AudioSprite).filter(AudioSprite.user_id == user_id).first()
+        if existing and existing.signature == signature:
+            return existing.audio_path
+
+    if len(intros) < AUDIO_SPRITE_MIN_INTROS:
+        _failed_builds.pop(user_id, None)
+        _replace_sprite(user_id, None)
+        return None
+
+    if _backing_off(user_id, signature):
+        return None
+
+    async with _build_semaphore:
+        with tempfile.TemporaryDirectory(prefix="voicetree_sprite_") as work_dir:
+            work_dir = Path(work_dir)
+            combined_path = work_dir / "combined.pcm"
+            gap = bytes(2 * int(SPRITE_SAMPLE_RATE * AUDIO_SPRITE_GAP))
+            segments = {}
+            position = 0
+            with open(combined_path, "wb") as combined:
+                for link_id, intro_path in intros:
+                    source = audio_storage.local_path(intro_path)
+                    if source is None or not source.exists():
+                        source = work_dir / "intro.mp3"
+                        source.write_bytes(await asyncio.to_thread(audio_storage.get, intro_path))
+                    pcm_path = work_dir / "intro.pcm"
+                    if not await run_ffmpeg([
+                        "-i", str(source), "-vn", "-ac", "1", "-ar", str(SPRITE_SAMPLE_RATE),
+                        "-f", "s16le", str(pcm_path)
+                    ], "building audio sprite"):
+                        _record_failure(user_id, signature)
+                        return None
+
+                    if position:
+                        combined.write(gap)
+                        position += len(gap) // 2
+                    samples = _append_pcm(combined, pcm_path)
+                    segments[str(link_id)] = [
+                        round(position / SPRITE_SAMPLE_RATE, 3),
+                        round((position + samples) / SPRITE_SAMPLE_RATE, 3)
+                    ]
+                    position += samples
+
+            output = work_dir / "sprite.mp3"
+            if not await run_ffmpeg([
+                "-f", "s16le", "-ac", "1", "-ar", str(SPRITE_SAMPLE_RATE), "-i", str(combined_path),
+                "-c:a", "libmp3lame", "-b:a", AUDIO_SPRITE_BITRATE, str(output)
+            ], "building audio sprite"):
+                _record_failure(user_id, signature)
+                return None
+
+            size = output.stat().st_size
+            audio_path = f"audio/sprite_{file_digest(output)}.mp3"
+            await asyncio.to_thread(audio_storage.put_file, audio_path, output)
+
+    _failed_builds.pop(user_id, None)
+    _replace_sprite(user_id, {
+        "signature": signature,
+        "audio_path": audio_path,
+        "segments": json.dumps(segments),
+        "size_bytes": size
+    })
+    return audio_path
+
+
+def _replace_sprite(user_id: int, values: Optional[Dict]):
+    """Point the user at a new sprite (or none) and delete the old file unless another profile shares it"""
+    with SessionLocal() as db:
+        sprite = db.query(AudioSprite).filter(AudioSprite.user_id == user_id).first()
+        old_path = sprite.audio_path if sprite else None
+        if values is None:
+            if sprite:
+                db.delete(sprite)
+        elif sprite:
+            for name, value in values.items():
+                setattr(sprite, name, value)
+        else:
+            db.add(AudioSprite(user_id=user_id, **values))
+        db.commit()
+
+        new_path = values["audio_path"] if values else None
+        if old_path and old_path != new_path and not db.query(AudioSprite).filter(
+            AudioSprite.audio_path == old_path
+        ).first():
+            try:
+                audio_storage.delete(old_path)
+            except Exception as e:
+                print(f"Error deleting audio sprite {old_path}: {str(e)}")
+
+
+def schedule(user_id: int):
+    """
+    Rebuild a user's sprite in the background after their intros change
+
+    Changes arriving while a build is queued or running are folded into one more build.
+    """
+    if not enabled():
+        return
+    task = _pending_builds.get(user_id)
+    if task is not None and not task.done():
+        _dirty_users.add(user_id)
+        return
+
+    async def run():
+        try:
+            while True:
+                await asyncio.sleep(AUDIO_SPRITE_DEBOUNCE)
+                _dirty_users.discard(user_id)
+                try:
+                    await build_sprite(user_id)
+                except Exception as e:
+                    print(f"Error building audio sprite for user {user_id}: {str(e)}")
+                if user_id not in _dirty_users:
+                    break
+        finally:
+            _pending_builds.pop(user_id, None)
+
+    _pending_builds[user_id] = asyncio.get_running_loop().create_task(run())
@@ -0,0 +1,353 @@
+"""
+Audio blob storage for VoiceTree
+Local sharded directory layout or an S3-compatible object store, selected by AUDIO_STORAGE_BACKEND
+"""
+import os
+import shutil
+import hashlib
+from pathlib import Path
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Optional, Iterator, List, NamedTuple, BinaryIO
+
+# Storage configuration
+AUDIO_STORAGE_BACKEND = os.getenv("AUDIO_STORAGE_BACKEND", "local")  # "local" or "s3"
+AUDIO_STORAGE_ROOT = Path(os.getenv("AUDIO_STORAGE_ROOT", str(Path(__file__).parent)))
+
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. http://localhost:9000 for MinIO
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID")
+S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY")
+S3_PRESIGN_EXPIRES = int(os.getenv("S3_PRESIGN_EXPIRES", "3600"))  # Seconds
+
+READ_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_MEMORY = 1024 * 1024  # Remote blobs opened for reading stay in memory up to this size, then spill to disk
+
+# Stored audio is write-once, so the object store can let browsers and CDNs keep it forever
+OBJECT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class StoredObject(NamedTuple):
+    """One blob found while listing storage"""
+    key: str  # Relative path as stored in the database
+    size: int
+    modified: float  # Unix timestamp
+    cursor: str  # Position to resume listing after this object
+
+
+class AudioStorage(ABC):
+    """
+    Interface for audio blob storage
+
+    Keys are the relative paths stored in the database, e.g. "audio/tts_<hash>.mp3"
+    or "audio/voice_samples/<user>_sample_0.mp3". Methods are blocking; call them
+    through asyncio.to_thread from async code.
+    """
+
+    @abstractmethod
+    def put(self, key: str, data: bytes, content_type: str = "audio/mpeg"):
+        raise NotImplementedError
+
+    @abstractmethod
+    def put_file(self, key: str, source_path: Path, content_type: str = "audio/mpeg"):
+        """Store a finished local file under key, consuming the source file"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def put_fileobj(self, key: str, fileobj: BinaryIO, content_type: str = "audio/mpeg"):
+        """Store the contents of an open binary file from its start, copying in chunks"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        """Open a blob for reading; the caller closes it"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_chunks(self, key: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def size(self, key: str) -> Optional[int]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """Delete a blob; returns False if it didn't exist"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def list(self, prefix: str = "audio/", start_after: Optional[str] = None, limit: int = 1000) -> List[StoredObject]:
+        """
+        List up to limit blobs under prefix in a stable order
+
+        Pass the last object's cursor as start_after to continue where a previous page ended.
+        """
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Filesystem path for serving the blob directly, or None for remote backends"""
+        return None
+
+    def url(self, key: str, expires: int = S3_PRESIGN_EXPIRES) -> Optional[str]:
+        """Direct download URL (e.g. presigned) for clients, or None if the app must serve it"""
+        return None
+
+
+class LocalAudioStorage(AudioStorage):
+    """
+    Files on local disk, sharded into two levels of hashed subdirectories
+
+    audio/tts_ab12.mp3 is stored at <root>/audio/3f/a9/tts_ab12.mp3 so no directory
+    grows past a few thousand entries. Files written before sharding are still
+    found at their old flat path.
+    """
+
+    def __init__(self, root: Path = AUDIO_STORAGE_ROOT):
+        self.root = Path(root)
+
+    def _sharded_path(self, key: str) -> Path:
+        directory, _, filename = key.rpartition("/")
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return self.root / directory / digest[:2] / digest[2:4] / filename
+
+    def _path(self, key: str) -> Path:
+        path = self._sharded_path(key)
+        if not path.exists():
+            legacy = self.root / key
+            if legacy.is_file():
+                return legacy
+        return path
+
+    def put(self, key: str, data: bytes, content_type: str = "audio/mpeg"):
+        path = self._sharded_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so readers never see a partial file
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put_file(self, key: str, source_path: Path, content_type: str = "audio/mpeg"):
+        path = self._sharded_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(source_path), str(path))
+
+    def put_fileobj(self, key: str, fileobj: BinaryIO, content_type: str = "audio/mpeg"):
+        path = self._sharded_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        fileobj.seek(0)
+        with open(tmp_path, "wb") as f:
+            shutil.copyfileobj(fileobj, f, READ_CHUNK_SIZE)
+        os.replace(tmp_path, path)
+
+    def get(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._path(key), "rb")
+
+    def iter_chunks(self, key: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+        with open(self._path(key), "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def size(self, key: str) -> Optional[int]:
+        path = self._path(key)
+        return path.stat().st_size if path.is_file() else None
+
+    def delete(self, key: str) -> bool:
+        path = self._path(key)
+        if not path.is_file():
+            return False
+        path.unlink()
+        return True
+
+    def local_path(self, key: str) -> Optional[Path]:
+        path = self._path(key)
+        return path if path.is_file() else None
+
+    def _key_for(self, relative: str) -> str:
+        """Map an on-disk relative path back to its key by dropping the two shard directories"""
+        parts = relative.split("/")
+        if len(parts) >= 4 and all(len(part) == 2 for part in parts[-3:-1]):
+            expected = self._sharded_path("/".join(parts[:-3] + parts[-1:]))
+            if expected == self.root / relative:
+                return "/".join(parts[:-3] + parts[-1:])
+        return relative
+
+    def _walk(self, directory: Path, relative: str, start_after: Optional[str]) -> Iterator[StoredObject]:
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            child = f"{relative}/{entry.name}"
+            if entry.is_dir(follow_symlinks=False):
+                # Skip whole subtrees that sort entirely before the cursor
+                if start_after and child + "/" < start_after and not start_after.startswith(child + "/"):
+                    continue
+                yield from self._walk(Path(entry.path), child, start_after)
+            elif entry.is_file(follow_symlinks=False):
+                if start_after and child <= start_after:
+                    continue
+                stat_result = entry.stat()
+                yield StoredObject(self._key_for(child), stat_result.st_size, stat_result.st_mtime, child)
+
+    def list(self, prefix: str = "audio/", start_after: Optional[str] = None, limit: int = 1000) -> List[StoredObject]:
+        prefix = prefix.strip("/")
+        objects = []
+        for stored in self._walk(self.root / prefix, prefix, start_after):
+            objects.append(stored)
+            if len(objects) >= limit:
+                break
+        return objects
+
+
+class S3AudioStorage(AudioStorage):
+    """Objects in an S3-compatible bucket (AWS S3, MinIO, R2, ...) via boto3"""
+
+    def __init__(
+        self,
+        bucket: str = S3_BUCKET,
+        prefix: str = S3_PREFIX,
+        endpoint_url: Optional[str] = S3_ENDPOINT_URL,
+        region: str = S3_REGION,
+        access_key_id: Optional[str] = S3_ACCESS_KEY_ID,
+        secret_access_key: Optional[str] = S3_SECRET_ACCESS_KEY
+    ):
+        if not bucket:
+            raise ValueError("S3_BUCKET environment variable is not set")
+
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise ImportError("The s3 audio storage backend requires boto3 (pip install boto3)")
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            config=Config(signature_version="s3v4", max_pool_connections=50)
+        )
+
+    def _object_key(self, key: str) -> str:
+        return self.prefix + key
+
+    def _is_missing(self, error) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def put(self, key: str, data: bytes, content_type: str = "audio/mpeg"):
+        self.client.put_object(
+            Bucket=self.bucket, Key=self._object_key(key), Body=data,
+            ContentType=content_type, CacheControl=OBJECT_CACHE_CONTROL
+        )
+
+    def put_file(self, key: str, source_path: Path, content_type: str = "audio/mpeg"):
+        self.client.upload_file(
+            str(source_path), self.bucket, self._object_key(key),
+            ExtraArgs={"ContentType": content_type, "CacheControl": OBJECT_CACHE_CONTROL}
+        )
+        os.remove(source_path)
+
+    def put_fileobj(self, key: str, fileobj: BinaryIO, content_type: str = "audio/mpeg"):
+        fileobj.seek(0)
+        self.client.upload_fileobj(
+            fileobj, self.bucket, self._object_key(key),
+            ExtraArgs={"ContentType": content_type, "CacheControl": OBJECT_CACHE_CONTROL}
+        )
+
+    def get(self, key: str) -> bytes:
+        response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        return response["Body"].read()
+
+    def open(self, key: str) -> BinaryIO:
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        try:
+            self.client.download_fileobj(self.bucket, self._object_key(key), spool)
+        except Exception:
+            spool.close()
+            raise
+        spool.seek(0)
+        return spool
+
+    def iter_chunks(self, key: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+        response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        yield from response["Body"].iter_chunks(chunk_size)
+
+    def exists(self, key: str) -> bool:
+        return self.size(key) is not None
+
+    def size(self, key: str) -> Optional[int]:
+        from botocore.exceptions import ClientError
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as e:
+            if self._is_missing(e):
+                return None
+            raise
+        return response["ContentLength"]
+
+    def delete(self, key: str) -> bool:
+        if not self.exists(key):
+            return False
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        return True
+
+    def list(self, prefix: str = "audio/", start_after: Optional[str] = None, limit: int = 1000) -> List[StoredObject]:
+        params = {"Bucket": self.bucket, "Prefix": self._object_key(prefix), "MaxKeys": limit}
+        if start_after:
+            params["StartAfter"] = start_after
+        response = self.client.list_objects_v2(**params)
+        return [
+            StoredObject(
+                item["Key"][len(self.prefix):],
+                item["Size"],
+                item["LastModified"].timestamp(),
+                item["Key"]
+            )
+            for item in response.get("Contents", [])
+        ]
+
+    def url(self, key: str, expires: int = S3_PRESIGN_EXPIRES) -> Optional[str]:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._object_key(key)},
+            ExpiresIn=expires
+        )
+
+
+def create_storage(backend: str = AUDIO_STORAGE_BACKEND) -> AudioStorage:
+    """Build the configured storage backend"""
+    if backend == "local":
+        return LocalAudioStorage()
+    if backend == "s3":
+        return S3AudioStorage()
+    raise ValueError(f"Unknown AUDIO_STORAGE_BACKEND: {backend}")
+
+
+# Shared storage instance used by the voice service and the audio route
+audio_storage = create_storage()
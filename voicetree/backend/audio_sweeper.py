@@ -0,0 +1,277 @@
+"""
+Audio storage reclamation for VoiceTree
+Deletes stored audio that nothing in the database points at any more
+
+Usage:
+    python audio_sweeper.py --dry-run
+    python audio_sweeper.py --grace-hours 24
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Iterable, Set, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import User, Link, VoiceMessage, TTSCacheEntry, TTSJob, AudioVariant, AudioSprite
+from audio_storage import audio_storage
+import audio_variants
+
+# Sweeper configuration
+AUDIO_SWEEP_INTERVAL = float(os.getenv("AUDIO_SWEEP_INTERVAL", "21600"))  # Seconds between runs, 0 disables
+AUDIO_SWEEP_GRACE = float(os.getenv("AUDIO_SWEEP_GRACE", "86400"))  # Never delete files younger than this
+AUDIO_SWEEP_BATCH = int(os.getenv("AUDIO_SWEEP_BATCH", "200"))  # Files listed (and at most deleted) per batch
+AUDIO_SWEEP_BATCH_DELAY = float(os.getenv("AUDIO_SWEEP_BATCH_DELAY", "1"))  # Pause between batches, seconds
+AUDIO_SWEEP_MAX_BATCHES = int(os.getenv("AUDIO_SWEEP_MAX_BATCHES", "50"))  # Per run; the next run resumes there
+
+
+def _reference_counts(db: Session) -> Counter:
+    """How many live rows point at each audio path"""
+    counts = Counter()
+    columns = [
+        db.query(Link.voice_message_audio).filter(Link.voice_message_audio.isnot(None)),
+        db.query(User.welcome_message_audio).filter(User.welcome_message_audio.isnot(None)),
+        db.query(User.voice_sample_path).filter(User.voice_sample_path.isnot(None)),
+        # Rejected messages are deactivated, so their audio is no longer needed
+        db.query(VoiceMessage.audio_file_path).filter(
+            VoiceMessage.audio_file_path.isnot(None),
+            VoiceMessage.is_active == True
+        ),
+    ]
+    for query in columns:
+        counts.update(path for (path,) in query.yield_per(1000))
+    return counts
+
+
+def build_reference_set(db: Session) -> Set[str]:
+    """
+    Every audio path that must be kept
+
+    Database references, TTS cache files (the cache evicts those itself), Opus/AAC
+    variants of kept files, profile intro sprites, and samples staged for clone jobs
+    that haven't run yet.
+    """
+    references = set(_reference_counts(db))
+    references.update(path for (path,) in db.query(TTSCacheEntry.audio_path).yield_per(1000))
+    references.update(path for (path,) in db.query(AudioSprite.audio_path).yield_per(1000))
+    references.update(
+        path for (source, path) in db.query(AudioVariant.source_path, AudioVariant.audio_path).yield_per(1000)
+        if source in references
+    )
+    for (payload,) in db.query(TTSJob.payload).filter(
+        TTSJob.kind == "voice_clone",
+        TTSJob.status.in_(["pending", "running"])
+    ):
+        references.update(json.loads(payload).get("sample_paths", []))
+    return references
+
+
+def _referenced_now(db: Session, paths: Iterable[str]) -> Set[str]:
+    """Re-check candidates against the database right before deleting them"""
+    paths = list(paths)
+    if not paths:
+        return set()
+    found = set()
+    for column in (Link.voice_message_audio, User.welcome_message_audio, User.voice_sample_path,
+                   TTSCacheEntry.audio_path, AudioVariant.audio_path, AudioSprite.audio_path):
+        found.update(path for (path,) in db.query(column).filter(column.in_(paths)))
+    # Same rule as _reference_counts: a rejected (inactive) message doesn't keep its audio
+    found.update(path for (path,) in db.query(VoiceMessage.audio_file_path).filter(
+        VoiceMessage.audio_file_path.in_(paths),
+        VoiceMessage.is_active == True
+    ))
+    return found
+
+
+def reconcile_cache_refs(db: Session) -> int:
+    """
+    Lower TTS cache reference counts that are higher than the rows actually using the file
+
+    Leaked references (e.g. from deleted users) keep files from ever being evicted.
+    Entries used within the grace period are skipped, since a job may have taken
+    a reference it hasn't saved yet.
+
+    Returns:
+        Number of entries corrected
+    """
+    counts = _reference_counts(db)
+    # last_used_at is set by the database clock (UTC)
+    cutoff = datetime.utcnow() - timedelta(seconds=AUDIO_SWEEP_GRACE)
+    corrected = 0
+    for entry_id, audio_path, ref_count in db.query(
+        TTSCacheEntry.id, TTSCacheEntry.audio_path, TTSCacheEntry.ref_count
+    ).filter(TTSCacheEntry.ref_count > 0, TTSCacheEntry.last_used_at < cutoff).all():
+        actual = counts.get(audio_path, 0)
+        if actual < ref_count:
+            db.execute(
+                update(TTSCacheEntry).where(
+                    TTSCacheEntry.id == entry_id,
+                    TTSCacheEntry.ref_count == ref_count
+                ).values(ref_count=actual)
+            )
+            corrected += 1
+    db.commit()
+    return corrected
+
+
+# Blocking steps of a sweep; each runs in a worker thread with its own session so the event loop stays free
+
+def _load_references(dry_run: bool) -> Tuple[Set[str], int]:
+    """Build the reference set and (unless dry run) reconcile cache reference counts"""
+    with SessionLocal() as db:
+        references = build_reference_set(db)
+        corrected = 0 if dry_run else reconcile_cache_refs(db)
+    return references, corrected
+
+
+def _still_referenced(paths: Iterable[str]) -> Set[str]:
+    with SessionLocal() as db:
+        return _referenced_now(db, paths)
+
+
+def _reclaim(key: str) -> bool:
+    """Delete a stored file and its variants; returns False if the file was already gone"""
+    deleted = audio_storage.delete(key)
+    audio_variants.delete_variants(key)
+    return deleted
+
+
+class AudioSweeper:
+    """Walks audio storage in batches, resuming from where the previous run stopped"""
+
+    def __init__(self):
+        self.cursor: Optional[str] = None
+        self.last_report: Optional[Dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def sweep(self, dry_run: bool = False, max_batches: int = AUDIO_SWEEP_MAX_BATCHES,
+                    grace: float = AUDIO_SWEEP_GRACE) -> Dict:
+        """
+        Run one sweep over (part of) the audio store
+
+        Args:
+            dry_run: Only report what would be deleted
+            max_batches: Stop after this many batches (0 for no limit); the next sweep continues there
+            grace: Minimum file age in seconds before it can be deleted
+
+        Returns:
+            Report with files scanned, reclaimable/deleted counts and bytes
+        """
+        started = time.monotonic()
+        references, corrected = await asyncio.to_thread(_load_references, dry_run)
+
+        report = {
+            "dry_run": dry_run,
+            "started_after": self.cursor,
+            "scanned": 0,
+            "referenced": 0,
+            "too_new": 0,
+            "reclaimable_files": 0,
+            "reclaimable_bytes": 0,
+            "deleted_files": 0,
+            "deleted_bytes": 0,
+            "cache_refs_corrected": corrected,
+            "complete": False
+        }
+
+        cutoff = time.time() - grace
+        batches = 0
+        while True:
+            objects = await asyncio.to_thread(
+                audio_storage.list, "audio/", self.cursor, AUDIO_SWEEP_BATCH
+            )
+            if not objects:
+                # Reached the end of the store; the next sweep starts over
+                self.cursor = None
+                report["complete"] = True
+                break
+
+            candidates = []
+            for stored in objects:
+                report["scanned"] += 1
+                if stored.key in references:
+                    report["referenced"] += 1
+                elif stored.modified > cutoff:
+                    report["too_new"] += 1
+                else:
+                    candidates.append(stored)
+
+            if candidates and not dry_run:
+                still_used = await asyncio.to_thread(_still_referenced, [stored.key for stored in candidates])
+                candidates = [stored for stored in candidates if stored.key not in still_used]
+
+            for stored in candidates:
+                report["reclaimable_files"] += 1
+                report["reclaimable_bytes"] += stored.size
+                if dry_run:
+                    continue
+                try:
+                    if await asyncio.to_thread(_reclaim, stored.key):
+                        report["deleted_files"] += 1
+                        report["deleted_bytes"] += stored.size
+                except Exception as e:
+                    print(f"Error reclaiming audio {stored.key}: {str(e)}")
+
+            self.cursor = objects[-1].cursor
+            batches += 1
+            if max_batches and batches >= max_batches:
+                break
+            # Rate limit: leave storage I/O (and the object store API) to live traffic
+            await asyncio.sleep(AUDIO_SWEEP_BATCH_DELAY)
+
+        if dry_run:
+            # A dry run shouldn't move the real sweep's position
+            self.cursor = report["started_after"]
+        report["duration_seconds"] = round(time.monotonic() - started, 2)
+        self.last_report = report
+        return report
+
+    async def _run_forever(self):
+        while True:
+            await asyncio.sleep(AUDIO_SWEEP_INTERVAL)
+            try:
+                report = await self.sweep()
+                print(
+                    f"Audio sweep: {report['deleted_files']} files / {report['deleted_bytes']} bytes reclaimed "
+                    f"({report['scanned']} scanned)"
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error sweeping audio storage: {str(e)}")
+
+    async def start(self):
+        """Launch the periodic sweep (started with the app)"""
+        if AUDIO_SWEEP_INTERVAL > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Shared sweeper, started and stopped with the app
+audio_sweeper = AudioSweeper()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reclaim unreferenced audio files")
+    parser.add_argument("--dry-run", action="store_true", help="Report reclaimable files and bytes without deleting")
+    parser.add_argument("--grace-hours", type=float, default=AUDIO_SWEEP_GRACE / 3600,
+                        help="Only delete files older than this")
+    args = parser.parse_args()
+
+    report = asyncio.run(audio_sweeper.sweep(dry_run=args.dry_run, max_batches=0, grace=args.grace_hours * 3600))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Multi-bitrate audio variants for VoiceTree
+Re-encodes stored MP3s to low-bitrate Opus/AAC with a local ffmpeg and serves the smallest one a client can play
+"""
+import os
+import shutil
+import asyncio
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Optional, List, Dict, Iterable
+
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models import AudioVariant
+from audio_storage import audio_storage
+from audio_delivery import audio_url
+
+# Encoder configuration
+FFMPEG_PATH = os.getenv("FFMPEG_PATH") or shutil.which("ffmpeg")
+AUDIO_VARIANTS_ENABLED = os.getenv("AUDIO_VARIANTS_ENABLED", "true").lower() == "true"
+AUDIO_OPUS_BITRATE = os.getenv("AUDIO_OPUS_BITRATE", "24k")
+AUDIO_AAC_BITRATE = os.getenv("AUDIO_AAC_BITRATE", "48k")
+AUDIO_ENCODE_CONCURRENCY = int(os.getenv("AUDIO_ENCODE_CONCURRENCY", "2"))  # Parallel ffmpeg processes
+
+# format -> (file extension, mime type, ffmpeg encoder arguments)
+VARIANT_FORMATS = {
+    "opus": ("opus", "audio/ogg; codecs=opus", ["-c:a", "libopus", "-b:a", AUDIO_OPUS_BITRATE, "-application", "voip"]),
+    "aac": ("m4a", "audio/mp4", ["-c:a", "aac", "-b:a", AUDIO_AAC_BITRATE, "-movflags", "+faststart"]),
+}
+
+# Accept header media types that mean a client can play each format
+ACCEPT_TYPES = {
+    "opus": ("audio/ogg", "audio/opus"),
+    "aac": ("audio/mp4", "audio/aac", "audio/x-m4a"),
+}
+
+_encode_semaphore = asyncio.Semaphore(AUDIO_ENCODE_CONCURRENCY)
+
+# Keep references to scheduled encodes so they aren't garbage collected mid-run
+_pending_tasks = set()
+
+
+def enabled() -> bool:
+    return AUDIO_VARIANTS_ENABLED and bool(FFMPEG_PATH)
+
+
+async def run_ffmpeg(args: List[str], context: str) -> bool:
+    """Run ffmpeg once (overwriting outputs); returns False and logs stderr, prefixed by context, if it fails"""
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG_PATH, "-nostdin", "-v", "error", "-y", *args,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        print(f"Error {context}: {stderr.decode(errors='replace').strip()}")
+        return False
+    return True
+
+
+def file_digest(path: Path) -> str:
+    """sha256 of a file, read in chunks; stored audio is named after it"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def encode_variants(source_path: str) -> List[str]:
+    """
+    Encode the missing Opus/AAC variants of a stored MP3
+
+    A variant is only kept if it's smaller than the source. Variant files are
+    named after the hash of their own bytes, like the MP3s they come from.
+
+    Returns:
+        Relative paths of the variants created
+    """
+    with SessionLocal() as db:
+        existing = {
+            fmt for (fmt,) in db.query(AudioVariant.format).filter(AudioVariant.source_path == source_path)
+        }
+    missing = [fmt for fmt in VARIANT_FORMATS if fmt not in existing]
+    if not missing:
+        return []
+
+    created = []
+    async with _encode_semaphore:
+        with tempfile.TemporaryDirectory(prefix="voicetree_variants_") as work_dir:
+            work_dir = Path(work_dir)
+            source = audio_storage.local_path(source_path)
+            if source is None:
+                # Remote storage: fetch the MP3 into the scratch directory first
+                source = work_dir / "source.mp3"
+                source.write_bytes(await asyncio.to_thread(audio_storage.get, source_path))
+            source_size = source.stat().st_size
+
+            for fmt in missing:
+                extension, mime_type, encoder_args = VARIANT_FORMATS[fmt]
+                output = work_dir / f"variant.{extension}"
+                if not await run_ffmpeg(
+                    ["-i", str(source), "-vn", "-ac", "1", *encoder_args, str(output)], f"encoding {source_path}"
+                ):
+                    continue
+
+                size = output.stat().st_size
+                if size >= source_size:
+                    continue
+
+                audio_path = f"audio/tts_{file_digest(output)}.{extension}"
+                await asyncio.to_thread(audio_storage.put_file, audio_path, output, mime_type.split(";")[0])
+                with SessionLocal() as db:
+                    db.add(AudioVariant(
+                        source_path=source_path,
+                        format=fmt,
+                        audio_path=audio_path,
+                        mime_type=mime_type,
+                        size_bytes=size
+                    ))
+                    try:
+                        db.commit()
+                        created.append(audio_path)
+                    except IntegrityError:
+                        # Encoded concurrently by another worker
+                        db.rollback()
+    return created
+
+
+def schedule(source_path: str):
+    """Encode variants in the background so generation latency doesn't include ffmpeg"""
+    if not enabled() or not source_path.endswith(".mp3"):
+        return
+
+    async def run():
+        try:
+            await encode_variants(source_path)
+        except Exception as e:
+            print(f"Error creating audio variants for {source_path}: {str(e)}")
+
+    task = asyncio.get_running_loop().create_task(run())
+    _pending_tasks.add(task)
+    task.add_done_callback(_pending_tasks.discard)
+
+
+def variants_for(source_paths: Iterable[str]) -> Dict[str, List[AudioVariant]]:
+    """Variants of many files in one query, smallest first"""
+    source_paths = {path for path in source_paths if path}
+    if not source_paths:
+        return {}
+
+    variants: Dict[str, List[AudioVariant]] = {}
+    with SessionLocal() as db:
+        rows = db.query(AudioVariant).filter(
+            AudioVariant.source_path.in_(source_paths)
+        ).order_by(AudioVariant.size_bytes).all()
+    for variant in rows:
+        variants.setdefault(variant.source_path, []).append(variant)
+    return variants
+
+
+def delete_variants(source_path: str) -> int:
+    """Remove the variants of a file that is being deleted; returns the number removed"""
+    with SessionLocal() as db:
+        rows = db.query(AudioVariant).filter(AudioVariant.source_path == source_path).all()
+        for variant in rows:
+            try:
+                audio_storage.delete(variant.audio_path)
+            except Exception as e:
+                print(f"Error deleting audio variant {variant.audio_path}: {str(e)}")
+            db.delete(variant)
+        db.commit()
+    return len(rows)
+
+
+def accepted_formats(accept: Optional[str]) -> set:
+    """Variant formats the client lists in its Accept header (q=0 entries excluded)"""
+    formats = set()
+    for entry in (accept or "").lower().split(","):
+        media_type, *params = [part.strip() for part in entry.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass
+        if quality <= 0:
+            continue
+        for fmt, media_types in ACCEPT_TYPES.items():
+            if media_type in media_types:
+                formats.add(fmt)
+    return formats
+
+
+def negotiate(source_path: str, accept: Optional[str]) -> Optional[AudioVariant]:
+    """Smallest variant of source_path the client says it can play, or None to serve the MP3"""
+    formats = accepted_formats(accept)
+    if not formats:
+        return None
+    for variant in variants_for([source_path]).get(source_path, []):
+        if variant.format in formats:
+            return variant
+    return None
+
+
+def audio_sources(audio_path: Optional[str], variants: Dict[str, List[AudioVariant]]) -> List[Dict[str, str]]:
+    """
+    <source> entries for an <audio> element, smallest first with the MP3 last
+
+    The browser plays the first type it supports, so clients that handle Opus
+    or AAC never download the MP3.
+    """
+    if not audio_path:
+        return []
+    sources = [
+        {"src": audio_url(variant.audio_path), "type": variant.mime_type}
+        for variant in (variants or {}).get(audio_path, [])
+    ]
+    sources.append({"src": audio_url(audio_path), "type": "audio/mpeg"})
+    return sources
@@ -6,6 +6,8 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+import query_stats
+
 # SQLite database URL
 SQLALCHEMY_DATABASE_URL = "sqlite:///./voicetree.db"
 
@@ -15,6 +17,9 @@ engine = create_engine(
     connect_args={"check_same_thread": False}  # Needed for SQLite
 )
 
+# Count statements and DB time per request
+query_stats.install(engine)
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -34,5 +39,14 @@ def get_db():
 def init_db():
     """
     Initialize database - create all tables
+
+    create_all skips tables that already exist, so indexes added to a model later
+    (e.g. the moderation feed's) are created here for databases made before them.
     """
     Base.metadata.create_all(bind=engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as e:
+                print(f"Error creating index {index.name}: {str(e)}")
@@ -0,0 +1,302 @@
+"""
+Async Inworld AI API client
+One pooled keep-alive HTTP session shared for the app's lifetime
+"""
+import os
+import json
+import base64
+import asyncio
+from typing import Optional, Dict, List, AsyncIterator, Callable, Awaitable, Any, BinaryIO
+
+import aiohttp
+
+from resilience import TokenBucket, CircuitBreaker, CircuitOpenError, backoff_delay
+
+INWORLD_API_KEY = os.getenv("INWORLD_API_KEY")
+INWORLD_API_BASE = os.getenv("INWORLD_API_BASE", "https://api.inworld.ai/tts/v1").rstrip("/")  # Override to point at a stand-in
+
+# Connection pool and timeout settings (seconds)
+INWORLD_CONNECT_TIMEOUT = float(os.getenv("INWORLD_CONNECT_TIMEOUT", "5"))
+INWORLD_READ_TIMEOUT = float(os.getenv("INWORLD_READ_TIMEOUT", "30"))
+INWORLD_MAX_CONNECTIONS = int(os.getenv("INWORLD_MAX_CONNECTIONS", "20"))
+INWORLD_KEEPALIVE_TIMEOUT = float(os.getenv("INWORLD_KEEPALIVE_TIMEOUT", "60"))
+
+# Request rate sized to the provider quota (0 disables the limiter)
+INWORLD_RATE_LIMIT = float(os.getenv("INWORLD_RATE_LIMIT", "10"))  # Requests per second
+INWORLD_RATE_BURST = int(os.getenv("INWORLD_RATE_BURST", "20"))
+
+# Retries for throttling, 5xx and network errors (seconds; full-jitter exponential backoff)
+INWORLD_MAX_RETRIES = int(os.getenv("INWORLD_MAX_RETRIES", "3"))
+INWORLD_RETRY_BASE_DELAY = float(os.getenv("INWORLD_RETRY_BASE_DELAY", "0.5"))
+INWORLD_RETRY_MAX_DELAY = float(os.getenv("INWORLD_RETRY_MAX_DELAY", "10"))
+
+# Circuit breaker: open after this many consecutive failures, probe again after the reset timeout
+INWORLD_BREAKER_THRESHOLD = int(os.getenv("INWORLD_BREAKER_THRESHOLD", "5"))
+INWORLD_BREAKER_RESET = float(os.getenv("INWORLD_BREAKER_RESET", "30"))
+
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+# Chunk size when streaming sample files into an upload
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class InworldAPIError(Exception):
+    """Raised when Inworld returns a non-200 response or an unusable body"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class InworldUnavailableError(InworldAPIError):
+    """Raised without calling Inworld while the circuit breaker is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Inworld AI is unavailable, retry in {retry_after:.0f}s", 503, True, retry_after)
+
+
+def _retry_after(response: aiohttp.ClientResponse) -> Optional[float]:
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+async def _raise_for_status(response: aiohttp.ClientResponse):
+    if response.status != 200:
+        message = f"Inworld AI API error: {await response.text()}"
+        response.release()
+        raise InworldAPIError(
+            message,
+            response.status,
+            retryable=response.status in RETRYABLE_STATUSES,
+            retry_after=_retry_after(response)
+        )
+
+
+async def _file_chunks(fileobj: BinaryIO) -> AsyncIterator[bytes]:
+    """Read a file from its start in chunks, off the event loop"""
+    fileobj.seek(0)
+    while True:
+        chunk = await asyncio.to_thread(fileobj.read, UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+class InworldClient:
+    """Thin async wrapper over the Inworld TTS REST endpoints"""
+
+    def __init__(self, api_key: Optional[str] = INWORLD_API_KEY, base_url: str = INWORLD_API_BASE):
+        self.api_key = api_key
+        self.base_url = base_url
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.limiter = TokenBucket(INWORLD_RATE_LIMIT, INWORLD_RATE_BURST)
+        self.breaker = CircuitBreaker(INWORLD_BREAKER_THRESHOLD, INWORLD_BREAKER_RESET)
+        self.counters = {"requests": 0, "retries": 0, "throttled": 0, "failures": 0, "rejected": 0}
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Create the pooled session on first use (it must be bound to the running event loop)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=INWORLD_MAX_CONNECTIONS,
+                keepalive_timeout=INWORLD_KEEPALIVE_TIMEOUT
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=INWORLD_CONNECT_TIMEOUT,
+                sock_read=INWORLD_READ_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                headers={"Authorization": f"Basic {self.api_key}"}
+            )
+        return self._session
+
+    def status(self) -> Dict:
+        """Limiter, breaker and call counters for monitoring"""
+        return {
+            "configured": self.configured,
+            "limiter": self.limiter.snapshot(),
+            "breaker": self.breaker.snapshot(),
+            "counters": dict(self.counters)
+        }
+
+    async def _call(self, attempt: Callable[[], Awaitable[Any]], idempotent: bool = True) -> Any:
+        """
+        Run one API request through the rate limiter, circuit breaker and retry policy
+
+        Throttled (429) requests are always retried; other retryable failures only
+        when the request is idempotent, since a clone may have been created already.
+
+        Raises:
+            InworldUnavailableError: If the breaker is open
+            InworldAPIError: If the request fails and retries are exhausted
+        """
+        retry = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError as e:
+                self.counters["rejected"] += 1
+                raise InworldUnavailableError(e.retry_after)
+
+            try:
+                await self.limiter.acquire()
+                self.counters["requests"] += 1
+                try:
+                    result = await attempt()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    raise InworldAPIError(f"Inworld AI connection error: {e!r}", retryable=True)
+            except InworldAPIError as e:
+                throttled = e.status == 429
+                if throttled:
+                    self.counters["throttled"] += 1
+                    # The provider says we're over quota: slow every caller down, not just this one
+                    self.limiter.pause(e.retry_after or backoff_delay(retry, INWORLD_RETRY_BASE_DELAY, INWORLD_RETRY_MAX_DELAY))
+                    self.breaker.record_neutral()
+                elif e.retryable:
+                    self.counters["failures"] += 1
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_neutral()
+
+                if not e.retryable or retry >= INWORLD_MAX_RETRIES or not (idempotent or throttled):
+                    raise
+                delay = backoff_delay(retry, INWORLD_RETRY_BASE_DELAY, INWORLD_RETRY_MAX_DELAY)
+                if e.retry_after:
+                    delay = max(delay, e.retry_after)
+                retry += 1
+                self.counters["retries"] += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release_trial()
+                raise
+
+            self.breaker.record_success()
+            return result
+
+    async def close(self):
+        """Close pooled connections (called on app shutdown)"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def synthesize(self, text: str, voice_id: str, model_id: str, audio_config: Dict) -> bytes:
+        """
+        Synthesize speech and return the decoded audio bytes
+
+        Raises:
+            InworldAPIError: If the API call fails or returns no audio
+        """
+        payload = {
+            "text": text,
+            "voiceId": voice_id,
+            "modelId": model_id,
+            "audioConfig": audio_config
+        }
+
+        async def attempt():
+            async with self._get_session().post(f"{self.base_url}/voice", json=payload) as response:
+                await _raise_for_status(response)
+                return await response.json()
+
+        result = await self._call(attempt)
+        audio_content_base64 = result.get("audioContent")
+        if not audio_content_base64:
+            raise InworldAPIError("No audio content in response", 200)
+
+        return base64.b64decode(audio_content_base64)
+
+    async def synthesize_stream(self, text: str, voice_id: str, model_id: str, audio_config: Dict) -> AsyncIterator[bytes]:
+        """
+        Stream synthesized speech, yielding decoded audio chunks as Inworld produces them
+
+        The streaming endpoint answers with newline-delimited JSON, one
+        {"result": {"audioContent": ...}} object per chunk.
+
+        Raises:
+            InworldAPIError: If the API call fails or a chunk reports an error
+        """
+        payload = {
+            "text": text,
+            "voiceId": voice_id,
+            "modelId": model_id,
+            "audioConfig": audio_config
+        }
+
+        async def attempt():
+            response = await self._get_session().post(f"{self.base_url}/voice:stream", json=payload)
+            await _raise_for_status(response)
+            return response
+
+        # Only opening the stream is retried; once audio has been yielded a failure is final
+        response = await self._call(attempt)
+        async with response:
+            # Split lines ourselves: a base64 chunk can be longer than aiohttp's readline limit
+            buffer = b""
+            async for data in response.content.iter_any():
+                buffer += data
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    chunk = self._decode_stream_line(line)
+                    if chunk:
+                        yield chunk
+            chunk = self._decode_stream_line(buffer)
+            if chunk:
+                yield chunk
+
+    @staticmethod
+    def _decode_stream_line(line: bytes) -> Optional[bytes]:
+        line = line.strip()
+        if not line:
+            return None
+        message = json.loads(line)
+        if "error" in message:
+            raise InworldAPIError(f"Inworld AI stream error: {message['error']}")
+        audio_content_base64 = (message.get("result") or {}).get("audioContent")
+        return base64.b64decode(audio_content_base64) if audio_content_base64 else None
+
+    async def clone_voice(self, samples: List[BinaryIO], fields: Dict[str, str]) -> Dict:
+        """
+        Upload voice samples to create a clone and return the parsed response
+
+        Samples are open binary files, streamed into the multipart body in chunks
+        rather than loaded into memory.
+
+        Raises:
+            InworldAPIError: If the API call fails
+        """
+        def build_form() -> aiohttp.FormData:
+            # A FormData body can only be sent once, so each attempt builds its own.
+            # Files are wrapped in generators because aiohttp closes file payloads
+            # once sent, which would break the next attempt.
+            form = aiohttp.FormData()
+            for name, value in fields.items():
+                form.add_field(name, value)
+            for idx, sample_file in enumerate(samples):
+                form.add_field(
+                    "audioSamples", _file_chunks(sample_file),
+                    filename=f"sample_{idx}.mp3",
+                    content_type="audio/mpeg"
+                )
+            return form
+
+        async def attempt():
+            async with self._get_session().post(f"{self.base_url}/clone", data=build_form()) as response:
+                await _raise_for_status(response)
+                return await response.json()
+
+        return await self._call(attempt, idempotent=False)
+
+
+# Shared client, one connection pool for the whole app
+inworld = InworldClient()
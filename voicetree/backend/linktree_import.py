@@ -0,0 +1,364 @@
+"""
+Bulk Linktree import for VoiceTree
+Fetches many Linktree profiles concurrently (politely, per host) and creates their users and links in batched inserts
+
+Usage:
+    python linktree_import.py https://linktr.ee/alice bob carol
+    python linktree_import.py --file creators.txt  # One URL or username per line, "-" for stdin
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from database import SessionLocal, init_db
+from models import User, Link
+from scraper import scraper
+import search
+
+# Import configuration
+LINKTREE_IMPORT_CONCURRENCY = int(os.getenv("LINKTREE_IMPORT_CONCURRENCY", "16"))  # Pages fetched at once, all hosts
+LINKTREE_IMPORT_PER_HOST = int(os.getenv("LINKTREE_IMPORT_PER_HOST", "4"))  # Pages fetched at once from one host
+LINKTREE_IMPORT_DELAY = float(os.getenv("LINKTREE_IMPORT_DELAY", "0.25"))  # Min seconds between request starts per host
+LINKTREE_IMPORT_TIMEOUT = float(os.getenv("LINKTREE_IMPORT_TIMEOUT", "10"))  # Seconds per page, like the single scrape
+LINKTREE_IMPORT_RETRIES = int(os.getenv("LINKTREE_IMPORT_RETRIES", "2"))  # Extra attempts after a 429/503
+LINKTREE_IMPORT_MAX_URLS = int(os.getenv("LINKTREE_IMPORT_MAX_URLS", "1000"))  # Per request
+LINKTREE_IMPORT_BATCH = int(os.getenv("LINKTREE_IMPORT_BATCH", "50"))  # Profiles per insert transaction
+LINKTREE_IMPORT_FLUSH_INTERVAL = float(os.getenv("LINKTREE_IMPORT_FLUSH_INTERVAL", "1"))  # Max seconds a fetched profile waits for its batch
+
+MAX_RETRY_AFTER = 30  # Cap on a host's Retry-After, so one import can't stall for minutes
+
+USERNAME_RE = re.compile(r"^[a-z0-9._-]{3,50}$")
+
+
+class LinktreeImportError(Exception):
+    """A single profile could not be fetched or parsed"""
+    pass
+
+
+class _HostSlot:
+    """Caps concurrent requests to one host and spaces out their start times"""
+
+    def __init__(self):
+        self.semaphore = asyncio.Semaphore(LINKTREE_IMPORT_PER_HOST)
+        self.lock = asyncio.Lock()
+        self.next_start = 0.0
+
+    def back_off(self, seconds: float):
+        """Hold every request to this host for a while (the host asked us to slow down)"""
+        self.next_start = max(self.next_start, time.monotonic() + seconds)
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        try:
+            async with self.lock:
+                wait = self.next_start - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self.next_start = time.monotonic() + LINKTREE_IMPORT_DELAY
+        except BaseException:
+            self.semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.semaphore.release()
+
+
+def _retry_after(response: aiohttp.ClientResponse) -> float:
+    try:
+        seconds = float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        seconds = max(LINKTREE_IMPORT_DELAY, 1.0)
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+def _existing_usernames(usernames: List[str]) -> set:
+    with SessionLocal() as db:
+        return {
+            row[0] for row in db.query(User.username).filter(User.username.in_(usernames))
+        }
+
+
+def _username_taken(error: IntegrityError) -> bool:
+    """Whether an insert failed on the users.username unique constraint (not some other constraint)"""
+    message = str(error.orig)
+    return "users.username" in message or "ix_users_username" in message
+
+
+def insert_profiles(profiles: List[Dict]) -> Dict[str, Tuple[Optional[int], int, Optional[str]]]:
+    """
+    Create users and their links for scraped profiles in one transaction
+
+    Users and links each go in as one executemany INSERT, and the search index is
+    filled from them with one INSERT ... SELECT per table, so a batch costs a
+    handful of statements however many links it has. Usernames taken in the
+    meantime are left alone.
+
+    Returns:
+        username -> (new user id or None, number of links, error or None); no id
+        and no error means the username was taken
+    """
+    with SessionLocal() as db:
+        taken = {
+            row[0] for row in db.query(User.username).filter(
+                User.username.in_([profile["username"] for profile in profiles])
+            )
+        }
+        fresh = [profile for profile in profiles if profile["username"] not in taken]
+        results = {username: (None, 0, None) for username in taken}
+        if not fresh:
+            return results
+
+        try:
+            db.execute(insert(User), [
+                {
+                    "username": profile["username"],
+                    "display_name": profile["display_name"],
+                    "bio": profile["bio"],
+                    "avatar_url": profile.get("avatar_url"),
+                    "imported_from_linktree": True,
+                    "is_published": False
+                }
+                for profile in fresh
+            ])
+            user_ids = dict(db.query(User.username, User.id).filter(
+                User.username.in_([profile["username"] for profile in fresh])
+            ).all())
+            link_rows = [
+                {"user_id": user_ids[profile["username"]], "title": link["title"], "url": link["url"], "order": idx}
+                for profile in fresh
+                for idx, link in enumerate(profile["links"])
+            ]
+            if link_rows:
+                db.execute(insert(Link), link_rows)
+            search.index_new_users(db, user_ids.values())
+            search.index_new_links(db, user_ids.values())
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            if len(fresh) > 1:
+                # Retry one by one, so only the profile at fault is affected
+                for profile in fresh:
+                    results.update(insert_profiles([profile]))
+                return results
+            username = fresh[0]["username"]
+            if _username_taken(e):
+                # Claimed between our check and the insert
+                results[username] = (None, 0, None)
+            else:
+                results[username] = (None, 0, f"Error saving profile: {str(e.orig)}")
+            return results
+        except SQLAlchemyError as e:
+            db.rollback()
+            for profile in fresh:
+                results[profile["username"]] = (None, 0, f"Error saving profile: {str(e)}")
+            return results
+
+        for profile in fresh:
+            results[profile["username"]] = (user_ids[profile["username"]], len(profile["links"]), None)
+        return results
+
+
+class LinktreeImporter:
+    """Pooled async fetcher for bulk imports; one instance is shared by the API and CLI"""
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._fetch_semaphore: Optional[asyncio.Semaphore] = None
+        self._hosts: Dict[str, _HostSlot] = {}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Create the pooled session on first use (it must be bound to the running event loop)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=LINKTREE_IMPORT_CONCURRENCY,
+                limit_per_host=LINKTREE_IMPORT_PER_HOST
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"User-Agent": scraper.session.headers["User-Agent"]}
+            )
+            self._fetch_semaphore = asyncio.Semaphore(LINKTREE_IMPORT_CONCURRENCY)
+            self._hosts = {}
+        return self._session
+
+    async def close(self):
+        """Release pooled connections (called on app shutdown)"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _host_slot(self, host: str) -> _HostSlot:
+        slot = self._hosts.get(host)
+        if slot is None:
+            slot = self._hosts[host] = _HostSlot()
+        return slot
+
+    async def fetch_profile(self, url: str, username: str) -> Dict:
+        """
+        Fetch and parse one Linktree page
+
+        Raises:
+            LinktreeImportError: If the page can't be fetched or parsed
+        """
+        session = self._get_session()
+        slot = self._host_slot(urlsplit(url).hostname or "")
+        timeout = aiohttp.ClientTimeout(total=LINKTREE_IMPORT_TIMEOUT)
+        try:
+            for attempt in range(LINKTREE_IMPORT_RETRIES + 1):
+                async with slot, self._fetch_semaphore:
+                    async with session.get(url, timeout=timeout) as response:
+                        if response.status in (429, 503) and attempt < LINKTREE_IMPORT_RETRIES:
+                            slot.back_off(_retry_after(response))
+                            continue
+                        if response.status == 404:
+                            raise LinktreeImportError("Linktree profile not found")
+                        response.raise_for_status()
+                        if not scraper.is_linktree_url(str(response.url)):
+                            raise LinktreeImportError("Redirected away from Linktree")
+                        html = await response.text()
+                        break
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise LinktreeImportError(f"Failed to fetch Linktree page: {str(e) or type(e).__name__}")
+
+        try:
+            # Parsing is CPU bound; keep it off the event loop
+            profile = await asyncio.to_thread(scraper.parse_html, html, username)
+        except Exception as e:
+            raise LinktreeImportError(f"Error scraping Linktree: {str(e)}")
+        # Keep the username this import checked for duplicates and existing users
+        profile["username"] = username
+        return profile
+
+    async def _fetch_into(self, queue: asyncio.Queue, url: str, username: str):
+        try:
+            await queue.put((url, username, await self.fetch_profile(url, username), None))
+        except LinktreeImportError as e:
+            await queue.put((url, username, None, str(e)))
+        except Exception as e:
+            await queue.put((url, username, None, f"Error scraping Linktree: {str(e)}"))
+
+    async def import_urls(self, urls: List[str]) -> AsyncIterator[Dict]:
+        """
+        Import many Linktree profiles, yielding a result per URL as soon as it is known
+
+        Each result has the url, username and a status: "created" (with user_id and
+        links), "exists", "duplicate" (repeated in this import), "invalid" or "failed"
+        (with error). Created profiles are inserted in batches, so their results
+        arrive a batch at a time. A final {"summary": {...}} item gives the counts.
+        """
+        started = time.monotonic()
+        summary = {"total": len(urls), "created": 0, "exists": 0, "duplicate": 0, "invalid": 0, "failed": 0, "links": 0}
+
+        def result(url: str, username: Optional[str], status: str, **extra) -> Dict:
+            summary[status] += 1
+            return {"url": url, "username": username, "status": status, **extra}
+
+        # Resolve usernames up front, so duplicates and existing users cost no requests
+        planned = []
+        seen = set()
+        for raw_url in urls:
+            url = scraper.normalize_url(raw_url)
+            username = scraper.extract_username_from_url(url)
+            if not scraper.is_linktree_url(url) or not USERNAME_RE.match(username):
+                yield result(raw_url, None, "invalid", error="Not a Linktree profile URL")
+            elif username in seen:
+                yield result(raw_url, username, "duplicate")
+            else:
+                seen.add(username)
+                planned.append((url, username))
+
+        existing = await asyncio.to_thread(_existing_usernames, [username for _, username in planned]) if planned else set()
+        for url, username in planned:
+            if username in existing:
+                yield result(url, username, "exists")
+        planned = [(url, username) for url, username in planned if username not in existing]
+
+        queue: asyncio.Queue = asyncio.Queue()
+        tasks = [asyncio.create_task(self._fetch_into(queue, url, username)) for url, username in planned]
+        outstanding = len(tasks)
+        batch: List[Tuple[str, Dict]] = []
+        try:
+            while outstanding or batch:
+                item = None
+                if outstanding:
+                    try:
+                        item = await asyncio.wait_for(
+                            queue.get(), timeout=LINKTREE_IMPORT_FLUSH_INTERVAL if batch else None
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+
+                if item is not None:
+                    outstanding -= 1
+                    url, username, profile, error = item
+                    if error:
+                        yield result(url, username, "failed", error=error)
+                    else:
+                        batch.append((url, profile))
+
+                if batch and (item is None or not outstanding or len(batch) >= LINKTREE_IMPORT_BATCH):
+                    inserted = await asyncio.to_thread(insert_profiles, [profile for _, profile in batch])
+                    for url, profile in batch:
+                        user_id, link_count, error = inserted[profile["username"]]
+                        if error:
+                            yield result(url, profile["username"], "failed", error=error)
+                        elif user_id is None:
+                            yield result(url, profile["username"], "exists")
+                        else:
+                            summary["links"] += link_count
+                            yield result(url, profile["username"], "created", user_id=user_id, links=link_count)
+                    batch = []
+        finally:
+            # The client went away (or an insert failed): stop fetching pages nobody will see
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        summary["duration_seconds"] = round(time.monotonic() - started, 2)
+        yield {"summary": summary}
+
+
+# Shared importer, its session closed with the app
+linktree_importer = LinktreeImporter()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import Linktree profiles as VoiceTree users")
+    parser.add_argument("urls", nargs="*", help="Linktree URLs or usernames")
+    parser.add_argument("--file", help="Read URLs from a file, one per line (\"-\" for stdin)")
+    args = parser.parse_args()
+
+    urls = list(args.urls)
+    if args.file:
+        source = sys.stdin if args.file == "-" else open(args.file)
+        with source:
+            urls.extend(line.strip() for line in source if line.strip() and not line.startswith("#"))
+    if not urls:
+        parser.error("no URLs given")
+
+    init_db()
+    search.init_search_index()
+
+    async def run():
+        try:
+            async for result in linktree_importer.import_urls(urls):
+                print(json.dumps(result), flush=True)
+        finally:
+            await linktree_importer.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
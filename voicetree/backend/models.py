@@ -2,7 +2,7 @@
 Database Models for VoiceTree
 GitHub Issue #1: User profile model and link management
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -73,6 +73,10 @@ class Link(Base):
 class VoiceMessage(Base):
     """Voice message model with ElevenLabs AI integration - GitHub Issue #2"""
     __tablename__ = "voice_messages"
+    __table_args__ = (
+        # Serves the keyset-paginated moderation feed
+        Index("ix_voice_messages_moderation", "user_id", "is_approved", "is_active", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -117,3 +121,85 @@ class LinkClick(Base):
     
     def __repr__(self):
         return f"<LinkClick(link_id={self.link_id}, date={self.click_date})>"
+
+class TTSCacheEntry(Base):
+    """Content-addressed cache of synthesized audio, reference counted by its users"""
+    __tablename__ = "tts_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), unique=True, nullable=False, index=True)  # sha256 of text + voice + model + config
+    audio_path = Column(String(500), unique=True, nullable=False)  # Named by content hash, e.g. audio/tts_<sha256 of bytes>.mp3
+    size_bytes = Column(Integer, default=0)
+    ref_count = Column(Integer, default=0)  # Links/users/messages currently pointing at this file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    
+    def __repr__(self):
+        return f"<TTSCacheEntry(audio_path='{self.audio_path}', refs={self.ref_count})>"
+
+class TTSCacheAlias(Base):
+    """Another cache key whose synthesis produced the same bytes as an existing entry"""
+    __tablename__ = "tts_cache_aliases"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), unique=True, nullable=False, index=True)
+    entry_id = Column(Integer, ForeignKey("tts_cache.id"), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<TTSCacheAlias(cache_key='{self.cache_key}', entry_id={self.entry_id})>"
+
+class AudioVariant(Base):
+    """Low-bitrate re-encoding (Opus, AAC) of a stored MP3, served to clients that can play it"""
+    __tablename__ = "audio_variants"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    source_path = Column(String(500), nullable=False)  # The MP3 this was encoded from
+    format = Column(String(10), nullable=False)  # "opus" or "aac"
+    audio_path = Column(String(500), unique=True, nullable=False)
+    mime_type = Column(String(50), nullable=False)
+    size_bytes = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_audio_variants_source_format", "source_path", "format", unique=True),
+    )
+    
+    def __repr__(self):
+        return f"<AudioVariant(audio_path='{self.audio_path}', format='{self.format}')>"
+
+class AudioSprite(Base):
+    """All of a profile's link intros concatenated into one file, with each link's offsets"""
+    __tablename__ = "audio_sprites"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
+    signature = Column(String(64), nullable=False)  # Hash of the (link id, intro path) pairs it was built from
+    audio_path = Column(String(500), nullable=False)
+    segments = Column(Text, nullable=False)  # JSON {"<link_id>": [start_seconds, end_seconds]}
+    size_bytes = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<AudioSprite(user_id={self.user_id}, audio_path='{self.audio_path}')>"
+
+class TTSJob(Base):
+    """Queued voice generation or cloning work, processed by the background worker pool"""
+    __tablename__ = "tts_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    kind = Column(String(30), nullable=False)  # "link_voice", "welcome" or "voice_clone"
+    status = Column(String(20), default="pending", index=True)  # pending, running, succeeded, failed
+    progress = Column(String(100), nullable=True)  # Human readable step, e.g. "Synthesizing audio"
+    payload = Column(Text, nullable=False)  # JSON job arguments
+    result = Column(Text, nullable=True)  # JSON result, e.g. {"audio_path": ...}
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<TTSJob(id={self.id}, kind='{self.kind}', status='{self.status}')>"
@@ -0,0 +1,112 @@
+"""
+Per-request database query instrumentation for VoiceTree
+Counts SQL statements and DB time for each request and flags N+1 patterns
+"""
+import os
+import time
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger("voicetree.queries")
+
+# Strict mode is meant for tests: a route that goes over budget raises instead of logging
+QUERY_STATS_STRICT = os.getenv("QUERY_STATS_STRICT", "").lower() in ("1", "true", "yes")
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "20"))  # Max statements per request
+QUERY_REPEAT_LIMIT = int(os.getenv("QUERY_REPEAT_LIMIT", "3"))  # Max runs of one parameterized statement
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in strict mode when a request breaks its query budget"""
+    pass
+
+
+class QueryStats:
+    """Statement counters collected for a single request"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0  # Seconds spent inside cursor.execute
+        self.statements = Counter()
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.duration += elapsed
+        self.statements[statement] += 1
+
+    @property
+    def duration_ms(self) -> float:
+        return self.duration * 1000
+
+    def repeated(self, limit: int = None) -> list:
+        """Return (statement, count) pairs that ran more than `limit` times"""
+        limit = QUERY_REPEAT_LIMIT if limit is None else limit
+        return [(s, n) for s, n in self.statements.most_common() if n > limit]
+
+    def server_timing(self) -> str:
+        """Format the stats as a Server-Timing header value"""
+        return f'db;dur={self.duration_ms:.2f};desc="{self.count} queries"'
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def start() -> QueryStats:
+    """Begin collecting stats for the current request"""
+    stats = QueryStats()
+    _current_stats.set(stats)
+    return stats
+
+
+def current() -> Optional[QueryStats]:
+    """Stats for the request in progress, if any"""
+    return _current_stats.get()
+
+
+def check_budget(stats: QueryStats, route: str, budget: int = None, repeat_limit: int = None):
+    """
+    Compare a request's stats against the query budget
+
+    Logs a warning for every violation, and raises QueryBudgetExceeded in strict mode
+    """
+    budget = QUERY_BUDGET if budget is None else budget
+    problems = []
+
+    if stats.count > budget:
+        problems.append(f"{stats.count} queries (budget {budget})")
+
+    for statement, n in stats.repeated(repeat_limit):
+        problems.append(f"statement ran {n} times, possible N+1: {statement[:120]}")
+
+    if not problems:
+        return
+
+    message = f"{route}: " + "; ".join(problems)
+    if QUERY_STATS_STRICT:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def install(engine):
+    """Attach the statement counting hooks to a SQLAlchemy engine"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        stats = _current_stats.get()
+        if stats is not None:
+            # The statement text is already parameterized, so it doubles as the N+1 key
+            stats.record(statement, elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
@@ -0,0 +1,158 @@
+"""
+Rate limiting and circuit breaking for outbound provider calls
+Used by the Inworld client to stay inside the provider quota and fail fast while it is unhealthy
+"""
+import time
+import random
+import asyncio
+from typing import Optional, Dict
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` requests per second on average, bursts of up to `burst`
+
+    Waiters are served in arrival order. A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waiting = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        # Nothing accrues while paused, so the bucket doesn't come back full right after a 429
+        start = max(self.updated, self.paused_until)
+        if now > start:
+            self.tokens = min(self.burst, self.tokens + (now - start) * self.rate)
+        self.updated = max(self.updated, now)
+
+    async def acquire(self):
+        """Wait for a token"""
+        if self.rate <= 0:
+            return
+
+        self.waiting += 1
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    if now < self.paused_until:
+                        await asyncio.sleep(self.paused_until - now)
+                        continue
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+        finally:
+            self.waiting -= 1
+
+    def pause(self, seconds: float):
+        """Hold all callers for a while, e.g. after the provider answers 429 with Retry-After"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    def snapshot(self) -> Dict:
+        now = time.monotonic()
+        if self.rate > 0:
+            self._refill(now)
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "available_tokens": round(self.tokens, 2),
+            "waiting": self.waiting,
+            "paused_for_seconds": round(max(0.0, self.paused_until - now), 2)
+        }
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider that is failing"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Circuit open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures; after `reset_timeout`
+    seconds one trial call is let through (half open), and its outcome closes or reopens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self._trial_in_flight = False
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker will let a call through (0 if it already does)"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def before_call(self):
+        """
+        Raises:
+            CircuitOpenError: If calls are currently being rejected
+        """
+        if self.state == self.OPEN:
+            wait = self.retry_after()
+            if wait > 0:
+                raise CircuitOpenError(wait)
+            self.state = self.HALF_OPEN
+
+        if self.state == self.HALF_OPEN:
+            if self._trial_in_flight:
+                raise CircuitOpenError(self.reset_timeout)
+            self._trial_in_flight = True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """The trial call was abandoned (e.g. cancelled) before it finished"""
+        self._trial_in_flight = False
+
+    def record_neutral(self):
+        """The call ended without telling us anything about provider health (e.g. a 4xx)"""
+        if self.state == self.HALF_OPEN:
+            self.record_success()
+
+    def snapshot(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout_seconds": self.reset_timeout,
+            "retry_after_seconds": round(self.retry_after(), 2),
+            "times_opened": self.times_opened
+        }
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff for retry number `attempt` (0-based)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,276 @@
+"""
+Voice sample preprocessing for VoiceTree
+Decodes recorded samples, trims silence, normalizes loudness and re-encodes them before clone upload
+"""
+import os
+import sys
+import asyncio
+import tempfile
+from array import array
+from typing import Dict, List, BinaryIO, Union
+
+from fastapi import UploadFile, HTTPException
+from fastapi.responses import JSONResponse
+
+from audio_variants import FFMPEG_PATH
+
+# Preprocessing configuration
+VOICE_SAMPLE_PREPROCESS = os.getenv("VOICE_SAMPLE_PREPROCESS", "true").lower() == "true"
+VOICE_SAMPLE_RATE = int(os.getenv("VOICE_SAMPLE_RATE", "22050"))  # Hz, mono
+VOICE_SAMPLE_BITRATE = os.getenv("VOICE_SAMPLE_BITRATE", "64k")
+VOICE_SAMPLE_LOUDNESS = float(os.getenv("VOICE_SAMPLE_LOUDNESS", "-16"))  # Integrated loudness target, LUFS
+VOICE_SAMPLE_SILENCE_DB = float(os.getenv("VOICE_SAMPLE_SILENCE_DB", "-45"))  # Quieter than this counts as silence
+VOICE_SAMPLE_MIN_SECONDS = float(os.getenv("VOICE_SAMPLE_MIN_SECONDS", "5"))
+VOICE_SAMPLE_MAX_SECONDS = float(os.getenv("VOICE_SAMPLE_MAX_SECONDS", "20"))
+VOICE_SAMPLE_MAX_UPLOAD_BYTES = int(os.getenv("VOICE_SAMPLE_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))  # Raw upload cap
+VOICE_SAMPLE_SPOOL_BYTES = int(os.getenv("VOICE_SAMPLE_SPOOL_BYTES", str(512 * 1024)))  # Kept in memory up to this, then on disk
+
+# Samples accepted per clone request, and the cap on the whole request body: every sample
+# at its limit plus room for the form fields and multipart framing
+VOICE_CLONE_MAX_SAMPLES = 3
+VOICE_CLONE_MAX_REQUEST_BYTES = int(os.getenv(
+    "VOICE_CLONE_MAX_REQUEST_BYTES", str(VOICE_CLONE_MAX_SAMPLES * VOICE_SAMPLE_MAX_UPLOAD_BYTES + 64 * 1024)
+))
+
+# Samples are fed to ffmpeg in chunks of this size
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Stop decoding after this much audio so a long recording can't blow up the PCM buffer
+MAX_DECODE_SECONDS = VOICE_SAMPLE_MAX_SECONDS * 3
+
+# Silence kept around the speech so words aren't clipped, and the analysis frame size
+SILENCE_PADDING_SECONDS = 0.15
+FRAME_SECONDS = 0.02
+
+
+class SampleRejected(ValueError):
+    """The sample can't be used for cloning (undecodable, too large, or too short/long once silence is trimmed)"""
+    pass
+
+
+def enabled() -> bool:
+    return VOICE_SAMPLE_PREPROCESS and bool(FFMPEG_PATH)
+
+
+def new_spool() -> BinaryIO:
+    return tempfile.SpooledTemporaryFile(max_size=VOICE_SAMPLE_SPOOL_BYTES)
+
+
+def file_size(fileobj: BinaryIO) -> int:
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    return size
+
+
+def checked_upload(upload: UploadFile, max_bytes: int = VOICE_SAMPLE_MAX_UPLOAD_BYTES) -> BinaryIO:
+    """
+    Size-check an upload and hand back the file Starlette already spooled it into
+
+    The multipart parser has written the sample to a spooled temp file by the time the
+    route runs (UploadSizeLimit bounds how much it can receive), so the size is read with
+    seek/tell and the same file feeds ffmpeg and storage; nothing is copied.
+
+    Returns:
+        The upload's file, rewound; Starlette closes it after the response
+
+    Raises:
+        SampleRejected: If the upload is larger than max_bytes
+    """
+    if file_size(upload.file) > max_bytes:
+        raise SampleRejected(f"Voice sample '{upload.filename}' too large. Please keep under 20 seconds.")
+    return upload.file
+
+
+class UploadSizeLimit:
+    """
+    ASGI middleware capping the request body of voice sample uploads
+
+    A Content-Length over the limit is answered with 413 before any of the body is read.
+    A chunked or understated body is cut off with 413 as soon as it passes the limit, so
+    the multipart parser never spools more than max_bytes to memory or disk.
+    """
+
+    def __init__(self, app, path_prefix: str = "/api/voice/clone/", max_bytes: int = VOICE_CLONE_MAX_REQUEST_BYTES):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Upload too large. Voice samples may total at most {self.max_bytes // (1024 * 1024)}MB."
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised while the route parses the form, which FastAPI turns into the response
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def _ffmpeg(args: List[str], source: Union[bytes, BinaryIO]) -> bytes:
+    """Pipe bytes or a file (streamed from its start) through ffmpeg and return its stdout"""
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG_PATH, "-nostdin", "-v", "error", *args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+
+    async def feed():
+        try:
+            if isinstance(source, bytes):
+                process.stdin.write(source)
+                await process.stdin.drain()
+            else:
+                source.seek(0)
+                while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                    process.stdin.write(chunk)
+                    await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg stopped reading early (duration limit reached, or the input is broken)
+            pass
+        finally:
+            process.stdin.close()
+
+    stdout, stderr, _ = await asyncio.gather(process.stdout.read(), process.stderr.read(), feed())
+    await process.wait()
+    if process.returncode != 0:
+        print(f"ffmpeg failed: {stderr.decode(errors='replace').strip()}")
+        raise SampleRejected("Could not process audio")
+    return stdout
+
+
+def _speech_bounds(pcm: array, rate: int) -> tuple:
+    """Sample offsets of the first and last non-silent frames, padded; (0, 0) if all silent"""
+    threshold = int(32768 * (10 ** (VOICE_SAMPLE_SILENCE_DB / 20)))
+    frame = max(1, int(rate * FRAME_SECONDS))
+    loud_frames = [
+        start for start in range(0, len(pcm), frame)
+        if max(pcm[start:start + frame]) > threshold or -min(pcm[start:start + frame]) > threshold
+    ]
+    if not loud_frames:
+        return 0, 0
+
+    padding = int(rate * SILENCE_PADDING_SECONDS)
+    return max(0, loud_frames[0] - padding), min(len(pcm), loud_frames[-1] + frame + padding)
+
+
+async def preprocess_sample(source: BinaryIO, name: str) -> Dict:
+    """
+    Prepare one recorded sample for upload to Inworld
+
+    Decodes to mono PCM at VOICE_SAMPLE_RATE, trims leading and trailing silence,
+    normalizes loudness and re-encodes to MP3. The upload is streamed into ffmpeg,
+    and decoding stops after MAX_DECODE_SECONDS.
+
+    Args:
+        source: Uploaded sample file (any format ffmpeg can decode, e.g. webm/opus from the browser recorder)
+        name: Original filename, for error messages
+
+    Returns:
+        Dict with the processed "audio" (a spooled file) plus durations and byte counts
+
+    Raises:
+        SampleRejected: If the sample can't be decoded or its speech is too short or too long
+    """
+    try:
+        raw = await _ffmpeg(
+            ["-i", "pipe:0", "-t", str(MAX_DECODE_SECONDS), "-vn", "-ac", "1",
+             "-ar", str(VOICE_SAMPLE_RATE), "-f", "s16le", "pipe:1"],
+            source
+        )
+    except SampleRejected:
+        raise SampleRejected(f"Voice sample '{name}' could not be decoded. Please record it again.")
+    pcm = array("h")
+    pcm.frombytes(raw[:len(raw) - len(raw) % 2])
+    if sys.byteorder == "big":
+        pcm.byteswap()
+
+    original_seconds = len(pcm) / VOICE_SAMPLE_RATE
+    start, end = _speech_bounds(pcm, VOICE_SAMPLE_RATE)
+    speech_seconds = (end - start) / VOICE_SAMPLE_RATE
+
+    if speech_seconds < VOICE_SAMPLE_MIN_SECONDS:
+        raise SampleRejected(
+            f"Voice sample '{name}' has {speech_seconds:.1f}s of speech. "
+            f"Please record {VOICE_SAMPLE_MIN_SECONDS:.0f}-{VOICE_SAMPLE_MAX_SECONDS:.0f} seconds."
+        )
+    if original_seconds >= MAX_DECODE_SECONDS - FRAME_SECONDS:
+        raise SampleRejected(
+            f"Voice sample '{name}' is too long. Please keep it under {VOICE_SAMPLE_MAX_SECONDS:.0f} seconds."
+        )
+    if speech_seconds > VOICE_SAMPLE_MAX_SECONDS:
+        raise SampleRejected(
+            f"Voice sample '{name}' has {speech_seconds:.1f}s of speech. "
+            f"Please keep it under {VOICE_SAMPLE_MAX_SECONDS:.0f} seconds."
+        )
+
+    trimmed = pcm[start:end]
+    if sys.byteorder == "big":
+        trimmed.byteswap()
+    audio = await _ffmpeg(
+        [
+            "-f", "s16le", "-ac", "1", "-ar", str(VOICE_SAMPLE_RATE), "-i", "pipe:0",
+            # loudnorm works at a higher internal rate; resample back to the upload rate
+            "-af", f"loudnorm=I={VOICE_SAMPLE_LOUDNESS}:TP=-1.5:LRA=11,aresample={VOICE_SAMPLE_RATE}",
+            "-c:a", "libmp3lame", "-b:a", VOICE_SAMPLE_BITRATE, "-f", "mp3", "pipe:1"
+        ],
+        trimmed.tobytes()
+    )
+    spool = new_spool()
+    spool.write(audio)
+    spool.seek(0)
+
+    return {
+        "audio": spool,
+        "name": name,
+        "original_bytes": file_size(source),
+        "processed_bytes": len(audio),
+        "original_seconds": round(original_seconds, 2),
+        "speech_seconds": round(speech_seconds, 2)
+    }
+
+
+async def preprocess_samples(samples: List[tuple]) -> Dict:
+    """
+    Preprocess (name, file) samples concurrently
+
+    Returns:
+        Dict with the processed "samples" as spooled files (in order; the caller closes them)
+        and a "report" of durations and byte savings
+    """
+    results = await asyncio.gather(
+        *[preprocess_sample(source, name) for name, source in samples],
+        return_exceptions=True
+    )
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        for r in results:
+            if not isinstance(r, BaseException):
+                r["audio"].close()
+        raise errors[0]
+    original_bytes = sum(r["original_bytes"] for r in results)
+    processed_bytes = sum(r["processed_bytes"] for r in results)
+    return {
+        "samples": [r["audio"] for r in results],
+        "report": {
+            "samples": [{k: v for k, v in r.items() if k != "audio"} for r in results],
+            "original_bytes": original_bytes,
+            "processed_bytes": processed_bytes,
+            "bytes_saved": original_bytes - processed_bytes
+        }
+    }
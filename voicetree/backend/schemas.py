@@ -6,6 +6,8 @@ from pydantic import BaseModel, HttpUrl, Field
 from typing import Optional, List
 from datetime import datetime
 
+from voice_ai import TTS_MAX_TEXT_CHARS
+
 # User Schemas
 class UserBase(BaseModel):
     username: str = Field(..., min_length=3, max_length=50)
@@ -20,6 +22,7 @@ class UserCreateFromLinktree(BaseModel):
     username: str
     display_name: str
     bio: Optional[str] = None
+    avatar_url: Optional[str] = None
     links: List[dict] = []
 
 class UserResponse(UserBase):
@@ -58,8 +61,12 @@ class ScrapeResponse(BaseModel):
     username: str
     display_name: str
     bio: str
+    avatar_url: Optional[str] = None
     links: List[dict]
 
+class LinktreeImportRequest(BaseModel):
+    urls: List[str]
+
 # Voice AI Schemas
 class VoiceCloneResponse(BaseModel):
     voice_id: str
@@ -70,10 +77,31 @@ class GenerateVoiceRequest(BaseModel):
     text: str = Field(..., min_length=1, max_length=200)
     link_id: Optional[int] = None
 
+class LinkVoiceText(BaseModel):
+    link_id: int
+    text: str = Field(..., min_length=1, max_length=200)
+
+class BulkLinkVoiceRequest(BaseModel):
+    links: List[LinkVoiceText] = []
+    auto_generate: bool = False  # Write intros from title/description for active links not listed
+
 class GenerateWelcomeRequest(BaseModel):
-    text: str = Field(..., min_length=1, max_length=500)
+    text: str = Field(..., min_length=1, max_length=TTS_MAX_TEXT_CHARS)  # Long welcomes are synthesized in chunks
     message_type: str = Field(default="static")  # "static" or "daily_ai"
 
+class TTSJobResponse(BaseModel):
+    job_id: int
+    status: str
+    status_url: str
+
+class VoiceCloneJobResponse(TTSJobResponse):
+    preprocessing: Optional[dict] = None  # Per-sample durations and bytes saved before upload
+
+# Moderation Schemas
+class BulkVoiceDecisionRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=500)
+    action: str = Field(..., pattern="^(approve|reject)$")
+
 class VoiceMessageResponse(BaseModel):
     audio_path: str
     text: str
@@ -2,10 +2,250 @@
 Linktree scraper module for VoiceTree
 Scrapes Linktree pages to extract user information and links
 """
+import os
+import copy
+import time
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
 import requests
-from bs4 import BeautifulSoup
-from typing import Dict, List
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
 import re
+import json
+
+try:
+    from lxml import etree
+except ImportError:  # Optional: the standard library parser is used instead
+    etree = None
+
+# Scrape cache configuration
+SCRAPE_CACHE_TTL = float(os.getenv("SCRAPE_CACHE_TTL", "300"))  # Seconds a parsed page is served without asking Linktree
+SCRAPE_CACHE_NEGATIVE_TTL = float(os.getenv("SCRAPE_CACHE_NEGATIVE_TTL", "60"))  # Seconds a 404 is remembered
+SCRAPE_CACHE_SIZE = int(os.getenv("SCRAPE_CACHE_SIZE", "1000"))  # Usernames kept, least recently used evicted first
+
+# Concurrent scrapes of one username wait for the first; usernames share this many locks
+SCRAPE_LOCK_STRIPES = 64
+
+# Only these hosts are fetched; anything else could plant another profile under a Linktree username
+LINKTREE_HOSTS = {
+    host.strip().lower()
+    for host in os.getenv("LINKTREE_HOSTS", "linktr.ee,www.linktr.ee").split(",")
+    if host.strip()
+}
+
+
+class ScrapeCache:
+    """
+    LRU of parsed Linktree pages by username, with the validators they were served with
+    
+    Expired entries stay cached so they can be revalidated with a conditional GET;
+    a 304 refreshes them without downloading or parsing the page again.
+    """
+    
+    def __init__(self, max_size: int = SCRAPE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "revalidated": 0, "misses": 0, "negative_hits": 0}
+    
+    def get(self, username: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None:
+                self._entries.move_to_end(username)
+            return entry
+    
+    def put(self, username: str, entry: Dict):
+        """Store an entry: {"data" or "error", "etag", "last_modified", "fetched_at"}"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[username] = entry
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def fresh(self, entry: Dict) -> bool:
+        ttl = SCRAPE_CACHE_NEGATIVE_TTL if "error" in entry else SCRAPE_CACHE_TTL
+        return time.monotonic() - entry["fetched_at"] < ttl
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Linktree is a Next.js app; the page embeds the full profile as JSON in this script tag
+NEXT_DATA_RE = re.compile(
+    r'<script\b[^>]*\bid=["\']?__NEXT_DATA__["\']?[^>]*>(.*?)</script\s*>',
+    re.IGNORECASE | re.DOTALL
+)
+# Account fields read from that payload; anything but a string or null there means the format changed
+NEXT_DATA_ACCOUNT_FIELDS = ('username', 'pageTitle', 'displayName', 'description', 'profilePictureUrl', 'customAvatar')
+
+# Anchor selectors in priority order; links come from the first one that yields any:
+# a[data-testid*="link"], a[class*="Link"], a[href]:not([href^="#"]):not([href^="javascript"])
+LINK_SELECTORS = (
+    lambda attrs: 'link' in attrs.get('data-testid', ''),
+    lambda attrs: 'Link' in attrs.get('class', ''),
+    lambda attrs: 'href' in attrs and not attrs['href'].startswith(('#', 'javascript')),
+)
+
+# Elements whose text is never part of a link title
+SKIPPED_TEXT_TAGS = {'script', 'style', 'template'}
+
+# Column and schema limits for imported profiles (users.display_name, links.title, ...)
+MAX_DISPLAY_NAME = 100
+MAX_LINK_TITLE = 200
+MAX_LINK_URL = 1000
+MAX_AVATAR_URL = 500
+
+
+class PageExtractor:
+    """
+    Collects a page's title, og tags and links in one pass over the parser's events
+    
+    Works as an lxml parser target and behind the standard library HTMLParser, so
+    no document tree is built. Anchor text matches BeautifulSoup's get_text(strip=True):
+    each text node stripped, then joined.
+    """
+    
+    def __init__(self):
+        self.title: Optional[str] = None
+        self.meta: Dict[str, Optional[str]] = {}
+        self.candidates = [[] for _ in LINK_SELECTORS]
+        self._seen = [set() for _ in LINK_SELECTORS]
+        self._in_title = False
+        self._title_parts: List[str] = []
+        self._anchor: Optional[Dict] = None
+        self._text: List[str] = []
+        self._skip_depth = 0
+    
+    def _flush_text(self):
+        if self._text:
+            text = ''.join(self._text).strip()
+            self._text = []
+            if text and self._anchor is not None and not self._skip_depth:
+                self._anchor['parts'].append(text)
+    
+    def _close_anchor(self):
+        self._flush_text()
+        anchor, self._anchor = self._anchor, None
+        href = anchor['attrs'].get('href', '')
+        title = ''.join(anchor['parts'])
+        
+        if not href or not title or len(title) < 2:
+            return
+        if 'cookie' in title.lower() or 'privacy' in title.lower():
+            return
+        if not (href.startswith('http') or href.startswith('//')):
+            return
+        if href.startswith('//'):
+            href = 'https:' + href
+        
+        for tier, matches in enumerate(LINK_SELECTORS):
+            if matches(anchor['attrs']) and href not in self._seen[tier]:
+                self._seen[tier].add(href)
+                self.candidates[tier].append({'title': title, 'url': href})
+    
+    def start(self, tag: str, attrs: Dict[str, str]):
+        self._flush_text()
+        if tag == 'a':
+            if self._anchor is not None:
+                # Anchors can't nest; a new one closes the last
+                self._close_anchor()
+            self._anchor = {'attrs': attrs, 'parts': []}
+        elif tag == 'meta':
+            prop = attrs.get('property')
+            if prop in ('og:title', 'og:description') and prop not in self.meta:
+                self.meta[prop] = attrs.get('content')
+        elif tag == 'title' and self.title is None:
+            self._in_title = True
+        elif tag in SKIPPED_TEXT_TAGS:
+            self._skip_depth += 1
+    
+    def end(self, tag: str):
+        self._flush_text()
+        if tag == 'a' and self._anchor is not None:
+            self._close_anchor()
+        elif tag == 'title' and self._in_title:
+            self._in_title = False
+            self.title = ''.join(self._title_parts)
+        elif tag in SKIPPED_TEXT_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+    
+    def data(self, text: str):
+        if self._in_title:
+            self._title_parts.append(text)
+        elif self._anchor is not None:
+            self._text.append(text)
+    
+    def close(self) -> "PageExtractor":
+        if self._anchor is not None:
+            self._close_anchor()
+        if self._in_title:
+            self.title = ''.join(self._title_parts)
+        return self
+    
+    def links(self) -> List[Dict]:
+        """Links from the highest-priority selector that matched any"""
+        for candidates in self.candidates:
+            if candidates:
+                return candidates
+        return []
+
+
+class _StdlibPageParser(HTMLParser):
+    """Feeds HTMLParser events to a PageExtractor when lxml isn't installed"""
+    
+    def __init__(self, target: PageExtractor):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+    
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, {name: value or '' for name, value in attrs})
+    
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+    
+    def handle_data(self, data):
+        self.target.data(data)
+
+
+def extract_page(html: str) -> PageExtractor:
+    """Run the single-pass extractor over a page, with lxml if it's installed"""
+    extractor = PageExtractor()
+    if etree is not None:
+        parser = etree.HTMLParser(target=extractor)
+        parser.feed(html)
+        return parser.close()
+    parser = _StdlibPageParser(extractor)
+    parser.feed(html)
+    parser.close()
+    return extractor.close()
+
+
+def _strings_or_none(obj: Dict, keys) -> bool:
+    """Whether each of the given keys is missing, null or a string"""
+    return all(obj.get(key) is None or isinstance(obj[key], str) for key in keys)
+
+
+def fit_to_schema(data: Dict) -> Dict:
+    """
+    Trim scraped values to what the users/links columns and API schemas accept
+    
+    Long names and titles are truncated; URLs can't be, so links with an over-long
+    URL are dropped and an over-long avatar is left out.
+    """
+    data['display_name'] = data['display_name'].strip()[:MAX_DISPLAY_NAME] or data['username']
+    if data.get('avatar_url') and len(data['avatar_url']) > MAX_AVATAR_URL:
+        data['avatar_url'] = None
+    data['links'] = [
+        {'title': link['title'][:MAX_LINK_TITLE], 'url': link['url']}
+        for link in data['links']
+        if len(link['url']) <= MAX_LINK_URL
+    ]
+    return data
 
 
 class LinktreeScraper:
@@ -16,10 +256,12 @@ class LinktreeScraper:
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
         })
+        self.cache = ScrapeCache()
+        self._locks = [threading.Lock() for _ in range(SCRAPE_LOCK_STRIPES)]
     
     def extract_username_from_url(self, url: str) -> str:
         """Extract username from Linktree URL"""
-        url = url.strip().rstrip('/')
+        url = re.split(r'[?#]', url.strip())[0].rstrip('/')
         url = re.sub(r'^https?://', '', url)
         url = re.sub(r'^www\.', '', url)
         
@@ -30,95 +272,185 @@ class LinktreeScraper:
         
         return username.lower()
     
+    def normalize_url(self, url: str) -> str:
+        """Turn a bare username or scheme-less URL into a full Linktree URL"""
+        url = url.strip()
+        if re.match(r'^(www\.)?linktr\.ee/', url, re.IGNORECASE):
+            url = f'https://{url}'
+        elif not url.startswith('http'):
+            url = f'https://linktr.ee/{url}'
+        return url
+    
+    def is_linktree_url(self, url: str) -> bool:
+        """Whether a normalized URL points at an allowed Linktree host (see LINKTREE_HOSTS)"""
+        try:
+            parts = urlsplit(url)
+            host = (parts.hostname or '') + (f':{parts.port}' if parts.port else '')
+        except ValueError:
+            return False
+        return parts.scheme in ('http', 'https') and host in LINKTREE_HOSTS
+    
     def scrape_linktree(self, url: str) -> Dict:
         """
         Scrape a Linktree page and extract profile information and links
         
+        Results are cached by username for SCRAPE_CACHE_TTL seconds, then revalidated
+        with If-None-Match / If-Modified-Since. Missing profiles (404) are remembered
+        for SCRAPE_CACHE_NEGATIVE_TTL seconds.
+        
         Args:
             url: Linktree profile URL
             
         Returns:
             Dict containing username, display_name, bio, and links
         """
-        try:
-            # Normalize URL
-            if not url.startswith('http'):
-                url = f'https://linktr.ee/{url}'
-            
-            # Extract username
-            username = self.extract_username_from_url(url)
-            
-            # Fetch the page
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            # Parse HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract display name
-            display_name = username
-            title_tag = soup.find('title')
-            if title_tag:
-                title_text = title_tag.get_text()
-                if '|' in title_text:
-                    display_name = title_text.split('|')[0].strip()
-                elif 'Linktree' in title_text:
-                    display_name = title_text.replace('Linktree', '').strip()
-            
-            og_title = soup.find('meta', property='og:title')
-            if og_title and og_title.get('content'):
-                display_name = og_title['content']
-            
-            # Extract bio
-            bio = ""
-            og_description = soup.find('meta', property='og:description')
-            if og_description and og_description.get('content'):
-                bio = og_description['content']
-            
-            # Extract links
-            links = []
-            link_selectors = [
-                'a[data-testid*="link"]',
-                'a[class*="Link"]',
-                'a[href]:not([href^="#"]):not([href^="javascript"])'
-            ]
+        # Normalize URL
+        url = self.normalize_url(url)
+        if not self.is_linktree_url(url):
+            raise Exception("Not a Linktree profile URL")
+        
+        # Extract username
+        username = self.extract_username_from_url(url)
+        
+        with self._locks[hash(username) % SCRAPE_LOCK_STRIPES]:
+            entry = self.cache.get(username)
+            if entry is not None and self.cache.fresh(entry):
+                if "error" in entry:
+                    self.cache.counters["negative_hits"] += 1
+                    raise Exception(entry["error"])
+                self.cache.counters["hits"] += 1
+                return copy.deepcopy(entry["data"])
             
-            for selector in link_selectors:
-                link_elements = soup.select(selector)
-                for link in link_elements:
-                    href = link.get('href', '')
-                    title = link.get_text(strip=True)
-                    
-                    if not href or not title or len(title) < 2:
-                        continue
-                    
-                    if 'cookie' in title.lower() or 'privacy' in title.lower():
-                        continue
-                    
-                    if href.startswith('http') or href.startswith('//'):
-                        if href.startswith('//'):
-                            href = 'https:' + href
-                        
-                        if not any(l['url'] == href for l in links):
-                            links.append({
-                                'title': title,
-                                'url': href
-                            })
+            try:
+                # Fetch the page, conditionally if we still hold a parsed copy
+                headers = {}
+                if entry is not None and "data" in entry:
+                    if entry["etag"]:
+                        headers['If-None-Match'] = entry["etag"]
+                    if entry["last_modified"]:
+                        headers['If-Modified-Since'] = entry["last_modified"]
+                response = self.session.get(url, timeout=10, headers=headers)
                 
-                if links:
-                    break
+                if response.status_code == 304 and headers:
+                    self.cache.counters["revalidated"] += 1
+                    self.cache.put(username, {**entry, "fetched_at": time.monotonic()})
+                    return copy.deepcopy(entry["data"])
+                
+                self.cache.counters["misses"] += 1
+                response.raise_for_status()
+                
+                data = self.parse_html(response.text, username)
+                
+            except requests.RequestException as e:
+                error = f"Failed to fetch Linktree page: {str(e)}"
+                if e.response is not None and e.response.status_code == 404:
+                    self.cache.put(username, {"error": error, "fetched_at": time.monotonic()})
+                raise Exception(error)
+            except Exception as e:
+                raise Exception(f"Error scraping Linktree: {str(e)}")
             
-            return {
-                'username': username,
-                'display_name': display_name or username,
-                'bio': bio,
-                'links': links[:20]
-            }
+            self.cache.put(username, {
+                "data": data,
+                "etag": response.headers.get('ETag'),
+                "last_modified": response.headers.get('Last-Modified'),
+                "fetched_at": time.monotonic()
+            })
+            return copy.deepcopy(data)
+    
+    def parse_html(self, html: str, username: str) -> Dict:
+        """
+        Extract profile information and links from a fetched Linktree page
+        
+        The embedded __NEXT_DATA__ profile is used when present; otherwise the
+        page's title, og tags and anchors are read instead.
+        
+        Args:
+            html: Page source
+            username: Username the page was fetched for (fallback display name)
             
-        except requests.RequestException as e:
-            raise Exception(f"Failed to fetch Linktree page: {str(e)}")
-        except Exception as e:
-            raise Exception(f"Error scraping Linktree: {str(e)}")
+        Returns:
+            Dict containing username, display_name, bio, avatar_url, and links
+        """
+        data = self.parse_next_data(html, username)
+        if data is not None:
+            return fit_to_schema(data)
+        
+        page = extract_page(html)
+        
+        # Extract display name
+        display_name = username
+        if page.title is not None:
+            if '|' in page.title:
+                display_name = page.title.split('|')[0].strip()
+            elif 'Linktree' in page.title:
+                display_name = page.title.replace('Linktree', '').strip()
+        
+        if page.meta.get('og:title'):
+            display_name = page.meta['og:title']
+        
+        # Extract bio
+        bio = page.meta.get('og:description') or ""
+        
+        # Extract links
+        links = page.links()
+        
+        return fit_to_schema({
+            'username': username,
+            'display_name': display_name or username,
+            'bio': bio,
+            'avatar_url': None,
+            'links': links
+        })
+    
+    def parse_next_data(self, html: str, username: str) -> Optional[Dict]:
+        """
+        Read the profile from the page's embedded __NEXT_DATA__ JSON
+        
+        Returns:
+            Same shape as parse_html, with links in profile order, or None if the
+            page has no usable payload
+        """
+        if '__NEXT_DATA__' not in html:
+            return None
+        match = NEXT_DATA_RE.search(html)
+        if not match:
+            return None
+        try:
+            page_props = json.loads(match.group(1))['props']['pageProps']
+            account = page_props['account']
+        except (ValueError, KeyError, TypeError):
+            return None
+        if not isinstance(account, dict) or not _strings_or_none(account, NEXT_DATA_ACCOUNT_FIELDS):
+            return None
+        
+        raw_links = page_props.get('links') or account.get('links') or []
+        if not isinstance(raw_links, list):
+            raw_links = []
+        raw_links = [link for link in raw_links if isinstance(link, dict)]
+        # A payload of a shape we don't know is read from the HTML instead
+        if not all(_strings_or_none(link, ('url', 'title')) for link in raw_links):
+            return None
+        if all(isinstance(link.get('position'), int) for link in raw_links):
+            raw_links.sort(key=lambda link: link['position'])
+        
+        links = []
+        for link in raw_links:
+            href = (link.get('url') or '').strip()
+            title = (link.get('title') or '').strip()
+            if href.startswith('//'):
+                href = 'https:' + href
+            # Headers, embeds and other non-link blocks have no web URL
+            if not href.startswith('http'):
+                continue
+            links.append({'title': title or href, 'url': href})
+        
+        return {
+            'username': str(account.get('username') or username).lower(),
+            'display_name': account.get('pageTitle') or account.get('displayName') or username,
+            'bio': account.get('description') or "",
+            'avatar_url': account.get('profilePictureUrl') or account.get('customAvatar'),
+            'links': links
+        }
 
 
 scraper = LinktreeScraper()
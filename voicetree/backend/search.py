@@ -0,0 +1,167 @@
+"""
+Full-text search for VoiceTree
+SQLite FTS5 index over profiles (username, display name, bio) and links (title, URL)
+"""
+import re
+from typing import Optional
+
+from sqlalchemy import text, bindparam
+from sqlalchemy.orm import Session
+
+from database import engine
+
+# Column weights for bm25 ranking (higher = more important)
+PROFILE_WEIGHTS = (10.0, 5.0, 1.0)  # username, display_name, bio
+LINK_WEIGHTS = (5.0, 1.0)  # title, url
+
+MAX_QUERY_TERMS = 8
+
+
+def init_search_index():
+    """Create the FTS5 tables and backfill them from existing rows when empty"""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS profile_search USING fts5("
+            "username, display_name, bio, tokenize='unicode61 remove_diacritics 2')"
+        ))
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS link_search USING fts5("
+            "title, url, user_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')"
+        ))
+
+        indexed = conn.execute(text("SELECT count(*) FROM profile_search")).scalar()
+        if not indexed:
+            rebuild_search_index(conn)
+
+
+def rebuild_search_index(conn):
+    """Repopulate both FTS tables from users and links in bulk"""
+    conn.execute(text("DELETE FROM profile_search"))
+    conn.execute(text("DELETE FROM link_search"))
+    conn.execute(text(
+        "INSERT INTO profile_search(rowid, username, display_name, bio) "
+        "SELECT id, username, display_name, coalesce(bio, '') FROM users"
+    ))
+    conn.execute(text(
+        "INSERT INTO link_search(rowid, title, url, user_id) "
+        "SELECT id, title, url, user_id FROM links"
+    ))
+
+
+def index_user(db: Session, user):
+    """Add or refresh a user in the profile index (call before commit, after flush)"""
+    db.execute(text("DELETE FROM profile_search WHERE rowid = :id"), {"id": user.id})
+    db.execute(
+        text("INSERT INTO profile_search(rowid, username, display_name, bio) VALUES (:id, :username, :display_name, :bio)"),
+        {"id": user.id, "username": user.username, "display_name": user.display_name, "bio": user.bio or ""}
+    )
+
+
+def index_link(db: Session, link):
+    """Add or refresh a link in the link index (call before commit, after flush)"""
+    db.execute(text("DELETE FROM link_search WHERE rowid = :id"), {"id": link.id})
+    db.execute(
+        text("INSERT INTO link_search(rowid, title, url, user_id) VALUES (:id, :title, :url, :user_id)"),
+        {"id": link.id, "title": link.title, "url": link.url, "user_id": link.user_id}
+    )
+
+
+def index_new_users(db: Session, user_ids):
+    """Add freshly inserted users to the profile index in one statement (bulk imports)"""
+    db.execute(
+        text(
+            "INSERT INTO profile_search(rowid, username, display_name, bio) "
+            "SELECT id, username, display_name, coalesce(bio, '') FROM users WHERE id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True)),
+        {"ids": list(user_ids)}
+    )
+
+
+def index_new_links(db: Session, user_ids):
+    """Add every link of freshly imported users to the link index in one statement"""
+    db.execute(
+        text(
+            "INSERT INTO link_search(rowid, title, url, user_id) "
+            "SELECT id, title, url, user_id FROM links WHERE user_id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True)),
+        {"ids": list(user_ids)}
+    )
+
+
+def remove_link(db: Session, link_id: int):
+    """Drop a deleted link from the index"""
+    db.execute(text("DELETE FROM link_search WHERE rowid = :id"), {"id": link_id})
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 prefix query
+
+    Every term must match and each one matches as a prefix, so "jo mus" finds "John's Music".
+    Terms are quoted so FTS5 operators in user input are treated as plain text.
+    """
+    terms = re.findall(r"\w+", query.lower())[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_profiles(db: Session, query: str, limit: int = 20, offset: int = 0) -> list:
+    """Ranked search over published profiles"""
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    rows = db.execute(text(
+        "SELECT u.username, u.display_name, u.bio, u.avatar_url, "
+        "bm25(profile_search, :w_username, :w_display_name, :w_bio) AS rank "
+        "FROM profile_search JOIN users u ON u.id = profile_search.rowid "
+        "WHERE profile_search MATCH :match AND u.is_published = 1 "
+        "ORDER BY rank LIMIT :limit OFFSET :offset"
+    ), {
+        "match": match,
+        "w_username": PROFILE_WEIGHTS[0],
+        "w_display_name": PROFILE_WEIGHTS[1],
+        "w_bio": PROFILE_WEIGHTS[2],
+        "limit": limit,
+        "offset": offset,
+    }).all()
+
+    return [{
+        "username": r.username,
+        "display_name": r.display_name,
+        "bio": r.bio,
+        "avatar_url": r.avatar_url,
+        "score": round(-r.rank, 4)
+    } for r in rows]
+
+
+def search_links(db: Session, query: str, limit: int = 20, offset: int = 0) -> list:
+    """Ranked search over active links on published profiles"""
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    rows = db.execute(text(
+        "SELECT l.id, l.title, l.url, u.username, "
+        "bm25(link_search, :w_title, :w_url) AS rank "
+        "FROM link_search "
+        "JOIN links l ON l.id = link_search.rowid "
+        "JOIN users u ON u.id = l.user_id "
+        "WHERE link_search MATCH :match AND l.is_active = 1 AND u.is_published = 1 "
+        "ORDER BY rank LIMIT :limit OFFSET :offset"
+    ), {
+        "match": match,
+        "w_title": LINK_WEIGHTS[0],
+        "w_url": LINK_WEIGHTS[1],
+        "limit": limit,
+        "offset": offset,
+    }).all()
+
+    return [{
+        "id": r.id,
+        "title": r.title,
+        "url": r.url,
+        "username": r.username,
+        "score": round(-r.rank, 4)
+    } for r in rows]
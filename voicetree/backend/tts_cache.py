@@ -0,0 +1,220 @@
+"""
+Content-addressed TTS audio cache for VoiceTree
+Reuses synthesized audio for identical text/voice/model/config and reference counts shared files
+"""
+import os
+import json
+import asyncio
+import hashlib
+import unicodedata
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, AsyncIterator, List
+
+from sqlalchemy import func, or_, select, update, delete
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models import TTSCacheEntry, TTSCacheAlias
+from audio_storage import audio_storage
+import audio_variants
+
+# Total bytes kept in storage for cached audio before unreferenced entries are evicted
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+
+# One in-flight synthesis per key, so concurrent misses for the same text don't all hit Inworld.
+# Each entry is [lock, holders and waiters]; it's dropped when the last one leaves.
+_key_locks: Dict[str, List] = {}
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different inputs share a cache entry"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(text: str, voice_id: str, model_id: str, audio_config: Dict) -> str:
+    """sha256 over everything that affects the synthesized audio"""
+    material = json.dumps({
+        "text": normalize_text(text),
+        "voice_id": voice_id,
+        "model_id": model_id,
+        "audio_config": audio_config
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def content_filename(audio_data: bytes, extension: str = "mp3") -> str:
+    """Name audio after a hash of its bytes, so a URL always means the same content"""
+    return f"tts_{hashlib.sha256(audio_data).hexdigest()}.{extension}"
+
+
+def digest_filename(digest: str, extension: str = "mp3") -> str:
+    """content_filename for audio hashed incrementally while streaming"""
+    return f"tts_{digest}.{extension}"
+
+
+@asynccontextmanager
+async def key_lock(key: str) -> AsyncIterator[None]:
+    """
+    Hold the synthesis lock for a key
+
+    Locks live only while someone holds or waits on them, so the table stays as small as the
+    number of in-flight keys. (A fixed striped pool would deadlock chunked synthesis, which
+    takes chunk keys while holding the whole text's key.)
+    """
+    entry = _key_locks.get(key)
+    if entry is None:
+        entry = _key_locks[key] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _key_locks[key]
+
+
+def lookup(key: str, acquire: bool = False) -> Optional[str]:
+    """
+    Return the cached audio path for a key (or an alias of it) if the file still exists
+
+    With acquire, a reference is taken in the same conditional UPDATE that confirms the
+    entry still exists. Eviction only deletes entries that are unreferenced at its own
+    DELETE, so a hit can never point at a file that is about to be evicted.
+
+    Returns:
+        The audio path, or None on a miss (including an entry evicted during the lookup)
+    """
+    with SessionLocal() as db:
+        entry = db.query(TTSCacheEntry).filter(or_(
+            TTSCacheEntry.cache_key == key,
+            TTSCacheEntry.id.in_(select(TTSCacheAlias.entry_id).where(TTSCacheAlias.cache_key == key))
+        )).first()
+        if not entry:
+            return None
+
+        if not audio_storage.exists(entry.audio_path):
+            # File vanished behind our back; forget the entry so it gets regenerated
+            db.query(TTSCacheAlias).filter(TTSCacheAlias.entry_id == entry.id).delete(synchronize_session=False)
+            db.delete(entry)
+            db.commit()
+            return None
+
+        values = {TTSCacheEntry.last_used_at: func.now()}
+        if acquire:
+            values[TTSCacheEntry.ref_count] = TTSCacheEntry.ref_count + 1
+        audio_path = db.execute(
+            update(TTSCacheEntry).where(TTSCacheEntry.id == entry.id).values(values).returning(TTSCacheEntry.audio_path)
+        ).scalar()
+        db.commit()
+        return audio_path
+
+
+def store(key: str, audio_path: str, size_bytes: int, ref_count: int = 0):
+    """Record a freshly synthesized file, then evict if the cache is over budget"""
+    with SessionLocal() as db:
+        db.add(TTSCacheEntry(cache_key=key, audio_path=audio_path, size_bytes=size_bytes, ref_count=ref_count))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another worker stored the same key first, or different text produced identical audio
+            db.rollback()
+            entry = db.query(TTSCacheEntry).filter(TTSCacheEntry.audio_path == audio_path).first()
+            if entry:
+                if ref_count:
+                    entry.ref_count = TTSCacheEntry.ref_count + ref_count
+                if entry.cache_key != key:
+                    # Remember this key too, so the next request for it is a hit
+                    db.add(TTSCacheAlias(cache_key=key, entry_id=entry.id))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # The alias was recorded concurrently; still count the reference
+                    db.rollback()
+                    if ref_count:
+                        db.query(TTSCacheEntry).filter(TTSCacheEntry.id == entry.id).update(
+                            {TTSCacheEntry.ref_count: TTSCacheEntry.ref_count + ref_count},
+                            synchronize_session=False
+                        )
+                        db.commit()
+    evict()
+
+
+def release(audio_path: str) -> bool:
+    """
+    Drop a reference to a cached file
+
+    The file stays on disk for reuse until eviction needs the space.
+
+    Returns:
+        True if the path belongs to the cache, False if it's a plain (uncached) file
+    """
+    with SessionLocal() as db:
+        updated = db.query(TTSCacheEntry).filter(
+            TTSCacheEntry.audio_path == audio_path,
+            TTSCacheEntry.ref_count > 0
+        ).update(
+            {TTSCacheEntry.ref_count: TTSCacheEntry.ref_count - 1},
+            synchronize_session=False
+        )
+        db.commit()
+        if updated:
+            return True
+        return db.query(TTSCacheEntry.id).filter(TTSCacheEntry.audio_path == audio_path).first() is not None
+
+
+def evict(max_bytes: int = None) -> int:
+    """
+    Delete least recently used unreferenced entries until the cache fits in max_bytes
+
+    Returns:
+        Number of bytes freed
+    """
+    max_bytes = TTS_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    freed = 0
+    with SessionLocal() as db:
+        total = db.query(func.coalesce(func.sum(TTSCacheEntry.size_bytes), 0)).scalar()
+        if total <= max_bytes:
+            return 0
+
+        # Pick the least recently used unreferenced entries that bring the cache under budget
+        victims = []
+        needed = total - max_bytes
+        candidates = db.execute(
+            select(TTSCacheEntry.id, TTSCacheEntry.size_bytes).where(
+                TTSCacheEntry.ref_count <= 0
+            ).order_by(TTSCacheEntry.last_used_at)
+        ).yield_per(100)
+        for entry_id, size_bytes in candidates:
+            if needed <= 0:
+                break
+            victims.append(entry_id)
+            needed -= size_bytes or 0
+        candidates.close()
+
+        if not victims:
+            return 0
+
+        # Claim them only if they are still unreferenced, then delete files once the rows are gone,
+        # so a concurrent lookup either took its reference first (and keeps the file) or misses
+        claimed = db.execute(
+            delete(TTSCacheEntry).where(
+                TTSCacheEntry.id.in_(victims),
+                TTSCacheEntry.ref_count <= 0
+            ).returning(TTSCacheEntry.id, TTSCacheEntry.audio_path, TTSCacheEntry.size_bytes)
+        ).all()
+        if claimed:
+            db.query(TTSCacheAlias).filter(
+                TTSCacheAlias.entry_id.in_([row.id for row in claimed])
+            ).delete(synchronize_session=False)
+        db.commit()
+
+    for row in claimed:
+        try:
+            audio_storage.delete(row.audio_path)
+            audio_variants.delete_variants(row.audio_path)
+        except Exception as e:
+            # The entry is gone; the storage sweeper reclaims the orphaned file later
+            print(f"Error evicting cached audio {row.audio_path}: {str(e)}")
+        freed += row.size_bytes or 0
+    return freed
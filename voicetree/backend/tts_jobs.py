@@ -0,0 +1,360 @@
+"""
+Background TTS job queue for VoiceTree
+Voice generation and cloning run on a bounded worker pool; jobs persist in the database
+"""
+import os
+import json
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional, Dict
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import TTSJob, User, Link
+from voice_ai import VoiceAIService
+from audio_storage import audio_storage
+from inworld_client import inworld
+import audio_sprites
+
+# Worker pool configuration
+TTS_JOB_WORKERS = int(os.getenv("TTS_JOB_WORKERS", "4"))
+TTS_JOB_MAX_ATTEMPTS = int(os.getenv("TTS_JOB_MAX_ATTEMPTS", "3"))
+TTS_JOB_RETRY_DELAY = float(os.getenv("TTS_JOB_RETRY_DELAY", "5"))  # Seconds, doubled per attempt
+TTS_JOB_POLL_INTERVAL = float(os.getenv("TTS_JOB_POLL_INTERVAL", "2"))
+BULK_VOICE_CONCURRENCY = int(os.getenv("BULK_VOICE_CONCURRENCY", "5"))  # Parallel syntheses per bulk job
+
+
+class JobFailed(Exception):
+    """Raised by a job handler for errors that retrying won't fix"""
+    pass
+
+
+def set_progress(job_id: int, progress: str):
+    """Update a running job's progress from a separate session, leaving the handler's session untouched"""
+    with SessionLocal() as db:
+        db.execute(update(TTSJob).where(TTSJob.id == job_id).values(progress=progress))
+        db.commit()
+
+
+def job_to_dict(job: TTSJob) -> Dict:
+    """Serialize a job for the status endpoint"""
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "attempts": job.attempts,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None
+    }
+
+
+# Job handlers: each runs the provider call and applies the result to the database
+
+async def _run_link_voice(db: Session, job: TTSJob, payload: Dict) -> Dict:
+    user = db.query(User).filter(User.id == job.user_id).first()
+    link = db.query(Link).filter(Link.id == payload["link_id"], Link.user_id == job.user_id).first()
+    if not user or not link:
+        raise JobFailed("Link no longer exists")
+    if not user.voice_clone_id:
+        raise JobFailed("Voice clone not set up")
+
+    audio_path = await VoiceAIService.generate_with_voice_clone(
+        text=payload["text"],
+        voice_id=user.voice_clone_id,
+        user_id=user.id,
+        purpose=f"link_{link.id}"
+    )
+    if not audio_path:
+        raise Exception("Failed to generate voice message")
+
+    # Swap in the new audio and drop the superseded file
+    old_audio = link.voice_message_audio
+    link.voice_message_text = payload["text"]
+    link.voice_message_audio = audio_path
+    db.commit()
+    # Always release the old pointer: regenerating the same text took a second reference on the same file
+    if old_audio:
+        VoiceAIService.delete_audio_file(old_audio)
+    audio_sprites.schedule(user.id)
+
+    return {"audio_path": audio_path, "text": payload["text"], "link_id": link.id}
+
+
+async def _run_welcome(db: Session, job: TTSJob, payload: Dict) -> Dict:
+    user = db.query(User).filter(User.id == job.user_id).first()
+    if not user:
+        raise JobFailed("User no longer exists")
+    if not user.voice_clone_id:
+        raise JobFailed("Voice clone not set up")
+
+    audio_path = await VoiceAIService.generate_with_voice_clone(
+        text=payload["text"],
+        voice_id=user.voice_clone_id,
+        user_id=user.id,
+        purpose="welcome"
+    )
+    if not audio_path:
+        raise Exception("Failed to generate welcome message")
+
+    old_audio = user.welcome_message_audio
+    user.welcome_message_text = payload["text"]
+    user.welcome_message_audio = audio_path
+    user.welcome_message_type = payload.get("message_type", "static")
+    db.commit()
+    if old_audio:
+        VoiceAIService.delete_audio_file(old_audio)
+
+    return {"audio_path": audio_path, "text": payload["text"]}
+
+
+async def _run_voice_clone(db: Session, job: TTSJob, payload: Dict) -> Dict:
+    user = db.query(User).filter(User.id == job.user_id).first()
+    if not user:
+        raise JobFailed("User no longer exists")
+
+    # Samples were staged in audio storage when the job was queued; they're streamed from there to Inworld
+    samples = []
+    try:
+        for sample_path in payload["sample_paths"]:
+            samples.append(await asyncio.to_thread(audio_storage.open, sample_path))
+
+        result = await VoiceAIService.create_voice_clone(
+            voice_samples=samples,
+            voice_name=payload["voice_name"],
+            language=payload.get("language", "en-US"),
+            tags=payload.get("tags", ""),
+            description=payload.get("description", ""),
+            remove_noise=payload.get("remove_noise", True)
+        )
+    except ValueError as e:
+        raise JobFailed(str(e))
+    finally:
+        for sample in samples:
+            sample.close()
+
+    if not result or not result.get("voice_id"):
+        raise Exception("Failed to create voice clone")
+
+    user.voice_clone_id = result["voice_id"]
+    user.voice_sample_path = payload["sample_paths"][0]
+    db.commit()
+
+    return {
+        "voice_id": result["voice_id"],
+        "sample_path": payload["sample_paths"][0],
+        "message": result.get("message", "Voice clone created successfully!"),
+        "preprocessing": payload.get("preprocessing")
+    }
+
+
+async def _run_bulk_link_voice(db: Session, job: TTSJob, payload: Dict) -> Dict:
+    user = db.query(User).filter(User.id == job.user_id).first()
+    if not user:
+        raise JobFailed("User no longer exists")
+    if not user.voice_clone_id:
+        raise JobFailed("Voice clone not set up")
+
+    items = payload["links"]
+    links = {
+        link.id: link for link in db.query(Link).filter(
+            Link.user_id == user.id,
+            Link.id.in_([item["link_id"] for item in items])
+        )
+    }
+    voice_id = user.voice_clone_id
+    semaphore = asyncio.Semaphore(BULK_VOICE_CONCURRENCY)
+    finished = 0
+
+    async def generate(item: Dict) -> Optional[str]:
+        nonlocal finished
+        async with semaphore:
+            audio_path = await VoiceAIService.generate_with_voice_clone(
+                text=item["text"],
+                voice_id=voice_id,
+                user_id=user.id,
+                purpose=f"link_{item['link_id']}"
+            )
+        finished += 1
+        set_progress(job.id, f"Generated {finished}/{len(items)} link intros")
+        return audio_path
+
+    # Fan out synthesis, bounded by the semaphore
+    pending = [item for item in items if item["link_id"] in links]
+    audio_paths = await asyncio.gather(*[generate(item) for item in pending], return_exceptions=True)
+    generated = dict(zip([item["link_id"] for item in pending], audio_paths))
+
+    results = []
+    superseded = []
+    for item in items:
+        link = links.get(item["link_id"])
+        audio_path = generated.get(item["link_id"])
+        if not link:
+            results.append({"link_id": item["link_id"], "status": "failed", "error": "Link not found"})
+        elif isinstance(audio_path, Exception) or not audio_path:
+            error = str(audio_path) if isinstance(audio_path, Exception) else "Failed to generate voice message"
+            results.append({"link_id": link.id, "status": "failed", "error": error})
+        else:
+            if link.voice_message_audio:
+                superseded.append(link.voice_message_audio)
+            link.voice_message_text = item["text"]
+            link.voice_message_audio = audio_path
+            results.append({"link_id": link.id, "status": "succeeded", "text": item["text"], "audio_path": audio_path})
+
+    succeeded = sum(1 for r in results if r["status"] == "succeeded")
+    if pending and not succeeded:
+        # Nothing was generated (and no cache references taken), so the whole job can be retried
+        raise Exception("Failed to generate any link voice messages")
+
+    # One commit for every link updated by this job
+    db.commit()
+    for old_audio in superseded:
+        VoiceAIService.delete_audio_file(old_audio)
+    if succeeded:
+        audio_sprites.schedule(user.id)
+
+    return {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded}
+
+
+JOB_HANDLERS = {
+    "link_voice": _run_link_voice,
+    "welcome": _run_welcome,
+    "voice_clone": _run_voice_clone,
+    "bulk_link_voice": _run_bulk_link_voice,
+}
+
+JOB_PROGRESS = {
+    "link_voice": "Generating link voice message",
+    "welcome": "Generating welcome message",
+    "voice_clone": "Creating voice clone",
+    "bulk_link_voice": "Generating link intros",
+}
+
+
+class TTSJobQueue:
+    """Database-backed job queue drained by a fixed number of asyncio workers"""
+
+    def __init__(self, workers: int = TTS_JOB_WORKERS):
+        self.worker_count = workers
+        self._workers = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def enqueue(self, db: Session, user_id: int, kind: str, payload: Dict) -> TTSJob:
+        """Persist a new job and wake an idle worker"""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        job = TTSJob(
+            user_id=user_id,
+            kind=kind,
+            status="pending",
+            progress="Queued",
+            payload=json.dumps(payload),
+            max_attempts=TTS_JOB_MAX_ATTEMPTS,
+            next_attempt_at=datetime.now()
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def start(self):
+        """Requeue jobs interrupted by a restart and launch the workers"""
+        with SessionLocal() as db:
+            db.execute(
+                update(TTSJob).where(TTSJob.status == "running").values(
+                    status="pending", progress="Requeued after restart"
+                )
+            )
+            db.commit()
+
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        """Cancel the workers; their running jobs are requeued on the next start"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _claim(self) -> Optional[int]:
+        """Atomically move the oldest due job from pending to running"""
+        with SessionLocal() as db:
+            candidates = db.query(TTSJob.id).filter(
+                TTSJob.status == "pending",
+                TTSJob.next_attempt_at <= datetime.now()
+            ).order_by(TTSJob.id).limit(5).all()
+
+            for (job_id,) in candidates:
+                claimed = db.execute(
+                    update(TTSJob).where(TTSJob.id == job_id, TTSJob.status == "pending").values(
+                        status="running", attempts=TTSJob.attempts + 1
+                    )
+                ).rowcount
+                db.commit()
+                if claimed:
+                    return job_id
+        return None
+
+    async def _worker(self):
+        while True:
+            job_id = self._claim()
+            if job_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=TTS_JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error running TTS job {job_id}: {str(e)}")
+
+    async def _run(self, job_id: int):
+        with SessionLocal() as db:
+            job = db.query(TTSJob).filter(TTSJob.id == job_id).first()
+            job.progress = JOB_PROGRESS[job.kind]
+            db.commit()
+
+            try:
+                result = await JOB_HANDLERS[job.kind](db, job, json.loads(job.payload))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                db.rollback()
+                job = db.query(TTSJob).filter(TTSJob.id == job_id).first()
+                job.error = str(e)
+                if isinstance(e, JobFailed) or job.attempts >= job.max_attempts:
+                    job.status = "failed"
+                    job.progress = "Failed"
+                else:
+                    delay = TTS_JOB_RETRY_DELAY * (2 ** (job.attempts - 1))
+                    # Don't burn an attempt while the provider's circuit breaker is still open
+                    delay = max(delay, inworld.breaker.retry_after())
+                    job.status = "pending"
+                    job.progress = f"Retrying in {delay:.0f}s (attempt {job.attempts} failed)"
+                    job.next_attempt_at = datetime.now() + timedelta(seconds=delay)
+                db.commit()
+                return
+
+            job.status = "succeeded"
+            job.progress = "Done"
+            job.error = None
+            job.result = json.dumps(result)
+            db.commit()
+
+
+# Shared queue, started and stopped with the app
+job_queue = TTSJobQueue()
@@ -3,33 +3,158 @@ Inworld AI Voice AI Integration
 Switched from ElevenLabs to Inworld AI for TTS and voice cloning
 """
 import os
+import re
 import uuid
-import requests
-import base64
+import asyncio
+import hashlib
+import tempfile
 from pathlib import Path
-from typing import Optional, Dict
-from datetime import datetime
+from typing import Optional, Dict, AsyncIterator, List
+from datetime import datetime, date
 
-# Configure Inworld AI API
-INWORLD_API_KEY = os.getenv("INWORLD_API_KEY")
-INWORLD_API_BASE = "https://api.inworld.ai/tts/v1"
+import aiofiles
 
-# Audio storage configuration
+from inworld_client import inworld, InworldAPIError
+from audio_storage import audio_storage
+import tts_cache
+import audio_variants
+
+# Local scratch space for in-progress audio; finished files go to audio_storage
 AUDIO_DIR = Path(__file__).parent / "audio"
 AUDIO_DIR.mkdir(exist_ok=True)
 
-VOICE_SAMPLES_DIR = Path(__file__).parent / "audio" / "voice_samples"
-VOICE_SAMPLES_DIR.mkdir(exist_ok=True)
-
 # Inworld AI voice settings
 DEFAULT_VOICE = "Dennis"  # Default voice for users without clones
 DEFAULT_MODEL = "inworld-tts-1"  # Can also use "inworld-tts-1-max" for higher quality
+DEFAULT_AUDIO_CONFIG = {
+    "encoding": "MP3",
+    "sampleRateHertz": 22050
+}
+
+# Chunk size when streaming cached audio from disk
+STREAM_READ_SIZE = 64 * 1024
+
+# Long texts are split into chunks synthesized in parallel (Inworld accepts up to 2000 characters per request)
+TTS_MAX_TEXT_CHARS = int(os.getenv("TTS_MAX_TEXT_CHARS", "10000"))
+TTS_CHUNK_CHARS = min(int(os.getenv("TTS_CHUNK_CHARS", "400")), 2000)  # Texts longer than this are chunked
+TTS_CHUNK_CONCURRENCY = int(os.getenv("TTS_CHUNK_CONCURRENCY", "4"))  # Parallel chunk requests per text
+
+# Layer III bitrates (kbps) by MPEG version bits (3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5), and sample rates
+MP3_BITRATES = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    0: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+|\n\s*\n\s*")
+CLAUSE_END_RE = re.compile(r"(?<=[,;:\u2014])\s+")
+
+def split_sentences(text: str) -> list:
+    """Split text into sentences (and paragraphs) for chunked synthesis"""
+    return [s.strip() for s in SENTENCE_END_RE.split(text.strip()) if s.strip()]
+
+def _pack(pieces: list, max_chars: int) -> list:
+    """Greedily join pieces with spaces into strings of at most max_chars"""
+    packed = []
+    for piece in pieces:
+        if packed and len(packed[-1]) + 1 + len(piece) <= max_chars:
+            packed[-1] = f"{packed[-1]} {piece}"
+        else:
+            packed.append(piece)
+    return packed
+
+def split_text(text: str, max_chars: int = TTS_CHUNK_CHARS) -> list:
+    """
+    Split text into synthesis chunks of at most max_chars
+    
+    Every sentence is its own chunk, so editing one sentence leaves the other
+    chunks (and their cached audio) unchanged. Sentences that are too long are
+    split at clause boundaries, and clauses that are still too long at spaces.
+    """
+    chunks = []
+    for sentence in split_sentences(text):
+        if len(sentence) <= max_chars:
+            chunks.append(sentence)
+            continue
+        
+        pieces = []
+        for clause in CLAUSE_END_RE.split(sentence):
+            if len(clause) <= max_chars:
+                pieces.append(clause)
+            else:
+                words = []
+                for word in clause.split():
+                    # A single word longer than a chunk is cut, which only happens with junk input
+                    words.extend(word[i:i + max_chars] for i in range(0, len(word), max_chars))
+                pieces.extend(_pack(words, max_chars))
+        chunks.extend(_pack(pieces, max_chars))
+    return chunks
+
+def _info_frame_length(data: bytes) -> int:
+    """Length of a leading Xing/Info/VBRI header frame, or 0 if the first frame is audio"""
+    if len(data) < 40 or data[0] != 0xFF or data[1] & 0xE0 != 0xE0:
+        return 0
+    version = (data[1] >> 3) & 3
+    layer = (data[1] >> 1) & 3
+    bitrate_index = data[2] >> 4
+    rate_index = (data[2] >> 2) & 3
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return 0
+    
+    mono = data[3] >> 6 == 3
+    if version == 3:
+        side_info = 17 if mono else 32
+        frame_length = 144000 * MP3_BITRATES[version][bitrate_index] // MP3_SAMPLE_RATES[version][rate_index]
+    else:
+        side_info = 9 if mono else 17
+        frame_length = 72000 * MP3_BITRATES[version][bitrate_index] // MP3_SAMPLE_RATES[version][rate_index]
+    frame_length += (data[2] >> 1) & 1
+    
+    offset = 4 + (0 if data[1] & 1 else 2) + side_info
+    if data[offset:offset + 4] in (b"Xing", b"Info") or data[36:40] == b"VBRI":
+        return frame_length
+    return 0
+
+def strip_mp3_headers(data: bytes) -> bytes:
+    """
+    Drop the ID3 tags and the Xing/Info/VBRI frame from one MP3, leaving only audio frames
+    
+    Those headers describe a single file (its duration and frame count), so left in
+    place they make a joined file claim the length of its first chunk.
+    """
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | (data[9] & 0x7F)
+        data = data[10 + size + (10 if data[5] & 0x10 else 0):]
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        data = data[:-128]
+    return data[_info_frame_length(data):]
 
 class VoiceAIService:
     """Service for generating voice messages using Inworld AI"""
     
     @staticmethod
-    def create_voice_clone(
+    async def save_voice_samples(voice_samples: list, username: str) -> list:
+        """
+        Save voice samples to audio storage
+        
+        Args:
+            voice_samples: List of open binary sample files (e.g. spooled uploads), copied in chunks
+            username: Username used in the sample filenames
+            
+        Returns:
+            List of relative sample paths, in the same order as the samples
+        """
+        saved_samples = []
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        for idx, sample_file in enumerate(voice_samples):
+            sample_path = f"audio/voice_samples/{username}_{timestamp}_sample_{idx}.mp3"
+            await asyncio.to_thread(audio_storage.put_fileobj, sample_path, sample_file)
+            saved_samples.append(sample_path)
+        return saved_samples
+    
+    @staticmethod
+    async def create_voice_clone(
         voice_samples: list,
         voice_name: str,
         language: str = "en-US",
@@ -42,7 +167,7 @@ class VoiceAIService:
         Create a voice clone using Inworld AI API
         
         Args:
-            voice_samples: List of audio file bytes (1-3 samples, 5-15 seconds each)
+            voice_samples: List of open binary sample files (1-3 samples, 5-15 seconds each)
             voice_name: Name for the voice clone
             language: Language code (e.g., 'en-US')
             tags: Comma-separated tags
@@ -53,7 +178,7 @@ class VoiceAIService:
         Returns:
             Dict with voice_id and message, or None if failed
         """
-        if not INWORLD_API_KEY:
+        if not inworld.configured:
             raise ValueError("INWORLD_API_KEY environment variable is not set")
         
         if not voice_samples or len(voice_samples) == 0:
@@ -66,24 +191,7 @@ class VoiceAIService:
             # Save voice samples for reference
             saved_samples = []
             if username:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                for idx, sample_data in enumerate(voice_samples):
-                    sample_filename = f"{username}_{timestamp}_sample_{idx}.mp3"
-                    sample_path = VOICE_SAMPLES_DIR / sample_filename
-                    with open(sample_path, "wb") as f:
-                        f.write(sample_data)
-                    saved_samples.append(f"audio/voice_samples/{sample_filename}")
-            
-            # Prepare API request for voice cloning
-            url = f"{INWORLD_API_BASE}/clone"
-            headers = {
-                "Authorization": f"Basic {INWORLD_API_KEY}"
-            }
-            
-            # Prepare multipart form data
-            files = []
-            for idx, sample_data in enumerate(voice_samples):
-                files.append(('audioSamples', (f'sample_{idx}.mp3', sample_data, 'audio/mpeg')))
+                saved_samples = await VoiceAIService.save_voice_samples(voice_samples, username)
             
             data = {
                 'name': voice_name,
@@ -97,10 +205,12 @@ class VoiceAIService:
                 data['description'] = description
             
             # Make API request
-            response = requests.post(url, headers=headers, files=files, data=data)
-            
-            if response.status_code != 200:
-                print(f"Inworld AI API error: {response.text}")
+            try:
+                result = await inworld.clone_voice(voice_samples, data)
+            except InworldAPIError as e:
+                if e.retryable:
+                    raise
+                print(str(e))
                 # If API fails, return a generated voice ID for demo purposes
                 # In production, this should raise an error
                 demo_voice_id = f"{voice_name.replace(' ', '_')}_{uuid.uuid4().hex[:8]}"
@@ -110,7 +220,6 @@ class VoiceAIService:
                     "message": f"Voice clone '{voice_name}' created successfully! (Demo mode - using generated ID)"
                 }
             
-            result = response.json()
             voice_id = result.get("voiceId") or result.get("id")
             
             if not voice_id:
@@ -123,6 +232,9 @@ class VoiceAIService:
                 "message": f"Voice clone '{voice_name}' created successfully!"
             }
             
+        except InworldAPIError:
+            # Throttled or unavailable after retries: let the job retry rather than faking a voice
+            raise
         except Exception as e:
             print(f"Error creating voice clone: {str(e)}")
             # Fallback: return a demo voice ID
@@ -136,149 +248,259 @@ class VoiceAIService:
             return None
     
     @staticmethod
-    def generate_with_voice_clone(text: str, voice_id: str, user_id: int, purpose: str = "general") -> Optional[str]:
+    async def _synthesize(text: str, voice_id: str) -> Optional[bytes]:
         """
-        Generate audio using a specific voice clone via Inworld AI API
+        Call Inworld AI text-to-speech and return the decoded audio
         
         Args:
-            text: Text to convert to speech (max 2000 chars)
+            text: Text to convert to speech
             voice_id: Inworld AI voice ID
-            user_id: User ID for filename
-            purpose: Purpose of the audio (e.g., 'link', 'welcome')
             
         Returns:
-            Relative path to the saved audio file, or None if failed
+            Audio bytes, or None if the API call failed
+        """
+        try:
+            return await inworld.synthesize(
+                text=text.strip(),
+                voice_id=voice_id,
+                model_id=DEFAULT_MODEL,
+                audio_config=DEFAULT_AUDIO_CONFIG
+            )
+        except InworldAPIError as e:
+            print(str(e))
+            return None
+    
+    @staticmethod
+    async def _provider_stream(text: str, voice_id: str) -> AsyncIterator[bytes]:
+        """
+        Yield audio chunks as Inworld produces them
+        
+        Uses the streaming synthesis endpoint; if it isn't available, falls back to
+        synthesizing sentence by sentence, prefetching the next sentence while the
+        current one is sent.
+        """
+        started = False
+        try:
+            async for chunk in inworld.synthesize_stream(text.strip(), voice_id, DEFAULT_MODEL, DEFAULT_AUDIO_CONFIG):
+                started = True
+                yield chunk
+            return
+        except InworldAPIError as e:
+            if started or e.status not in (404, 405, 501):
+                raise
+        
+        sentences = split_sentences(text)
+        if not sentences:
+            return
+        
+        next_audio = asyncio.ensure_future(VoiceAIService._synthesize(sentences[0], voice_id))
+        try:
+            for idx in range(len(sentences)):
+                audio_data = await next_audio
+                if idx + 1 < len(sentences):
+                    next_audio = asyncio.ensure_future(VoiceAIService._synthesize(sentences[idx + 1], voice_id))
+                if not audio_data:
+                    raise InworldAPIError(f"Failed to synthesize sentence {idx + 1} of {len(sentences)}")
+                # Each sentence is a complete MP3; only its audio frames belong in the joined stream
+                yield strip_mp3_headers(audio_data)
+        finally:
+            if not next_audio.done():
+                next_audio.cancel()
+    
+    @staticmethod
+    async def stream_voice(text: str, voice_id: str, persist: bool = True) -> AsyncIterator[bytes]:
+        """
+        Stream audio for text, serving the cached file when there is one
+        
+        With persist, chunks are also written to a temp file while they stream;
+        once the stream completes the file becomes the cache entry, so the next
+        request for the same text and voice is served from disk.
+        
+        Args:
+            text: Text to convert to speech
+            voice_id: Inworld AI voice ID
+            persist: Tee the stream into the TTS cache
         """
-        if not INWORLD_API_KEY:
+        if not inworld.configured:
             raise ValueError("INWORLD_API_KEY environment variable is not set")
         
+        key = tts_cache.cache_key(text, voice_id, DEFAULT_MODEL, DEFAULT_AUDIO_CONFIG)
+        audio_path = await asyncio.to_thread(tts_cache.lookup, key)
+        if audio_path:
+            async for chunk in VoiceAIService._read_stored(audio_path):
+                yield chunk
+            return
+        
+        if not persist:
+            async for chunk in VoiceAIService._provider_stream(text, voice_id):
+                yield chunk
+            return
+        
+        part_path = AUDIO_DIR / f".tts_{key}.{uuid.uuid4().hex[:8]}.part"
+        size = 0
+        digest = hashlib.sha256()
         try:
-            # Generate unique filename
-            filename = f"{purpose}_{user_id}_{uuid.uuid4().hex[:8]}.mp3"
-            file_path = AUDIO_DIR / filename
-            
-            # Prepare API request
-            url = f"{INWORLD_API_BASE}/voice"
-            headers = {
-                "Authorization": f"Basic {INWORLD_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "text": text.strip(),
-                "voiceId": voice_id,
-                "modelId": DEFAULT_MODEL,
-                "audioConfig": {
-                    "encoding": "MP3",
-                    "sampleRateHertz": 22050
-                }
-            }
-            
-            # Make API request
-            response = requests.post(url, headers=headers, json=payload)
-            
-            if response.status_code != 200:
-                print(f"Inworld AI API error: {response.text}")
-                return None
+            async with aiofiles.open(part_path, "wb") as f:
+                async for chunk in VoiceAIService._provider_stream(text, voice_id):
+                    await f.write(chunk)
+                    size += len(chunk)
+                    digest.update(chunk)
+                    yield chunk
+            
+            # Complete stream: publish it as the cache entry
+            audio_path = f"audio/{tts_cache.digest_filename(digest.hexdigest())}"
+            await asyncio.to_thread(audio_storage.put_file, audio_path, part_path)
+            await asyncio.to_thread(tts_cache.store, key, audio_path, size)
+            audio_variants.schedule(audio_path)
+        finally:
+            # Client went away or the provider failed mid-stream
+            if part_path.exists():
+                part_path.unlink()
+    
+    @staticmethod
+    async def _read_stored(audio_path: str) -> AsyncIterator[bytes]:
+        """Yield a stored audio file in chunks"""
+        local_path = audio_storage.local_path(audio_path)
+        if local_path:
+            async with aiofiles.open(local_path, "rb") as f:
+                while True:
+                    chunk = await f.read(STREAM_READ_SIZE)
+                    if not chunk:
+                        return
+                    yield chunk
+        
+        audio_data = await asyncio.to_thread(audio_storage.get, audio_path)
+        for start in range(0, len(audio_data), STREAM_READ_SIZE):
+            yield audio_data[start:start + STREAM_READ_SIZE]
+    
+    @staticmethod
+    async def _save_audio(audio_data: bytes, filename: str) -> str:
+        """Write audio bytes to audio storage and return the relative path for database storage"""
+        audio_path = f"audio/{filename}"
+        await asyncio.to_thread(audio_storage.put, audio_path, audio_data)
+        return audio_path
+    
+    @staticmethod
+    async def _cached_audio(text: str, voice_id: str, acquire: bool = True) -> Optional[str]:
+        """
+        Return a cached audio file for this text and voice, synthesizing it on a miss
+        
+        Args:
+            text: Text to convert to speech
+            voice_id: Inworld AI voice ID
+            acquire: Take a reference on the file (the caller will store the path)
             
-            result = response.json()
-            audio_content_base64 = result.get("audioContent")
+        Returns:
+            Relative path to the audio file, or None if synthesis failed
+        """
+        key = tts_cache.cache_key(text, voice_id, DEFAULT_MODEL, DEFAULT_AUDIO_CONFIG)
+        
+        async with tts_cache.key_lock(key):
+            # Cache bookkeeping is blocking SQLite, so keep it off the event loop
+            audio_path = await asyncio.to_thread(tts_cache.lookup, key, acquire)
+            if audio_path:
+                return audio_path
             
-            if not audio_content_base64:
-                print("No audio content in response")
+            if len(text.strip()) > TTS_CHUNK_CHARS:
+                audio_data = await VoiceAIService._synthesize_chunked(text, voice_id)
+            else:
+                audio_data = await VoiceAIService._synthesize(text, voice_id)
+            if not audio_data:
                 return None
             
-            # Decode base64 audio and save
-            audio_data = base64.b64decode(audio_content_base64)
-            with open(file_path, "wb") as f:
-                f.write(audio_data)
-            
-            # Return relative path for database storage
-            return f"audio/{filename}"
-            
-        except Exception as e:
-            print(f"Error generating audio with Inworld AI: {str(e)}")
+            audio_path = await VoiceAIService._save_audio(audio_data, tts_cache.content_filename(audio_data))
+            await asyncio.to_thread(tts_cache.store, key, audio_path, len(audio_data), 1 if acquire else 0)
+            audio_variants.schedule(audio_path)
+            return audio_path
+    
+    @staticmethod
+    async def _synthesize_chunked(text: str, voice_id: str) -> Optional[bytes]:
+        """
+        Synthesize a long text as separately cached chunks and join them in order
+        
+        Chunks are synthesized concurrently (at most TTS_CHUNK_CONCURRENCY at a time)
+        and each is cached on its own, so after an edit only the changed sentences
+        go back to Inworld.
+        
+        Returns:
+            Audio bytes, or None if any chunk failed
+        """
+        semaphore = asyncio.Semaphore(TTS_CHUNK_CONCURRENCY)
+        
+        async def render(chunk: str) -> Optional[bytes]:
+            async with semaphore:
+                # Chunk files stay in the cache without a reference, so they're evicted when unused
+                chunk_path = await VoiceAIService._cached_audio(chunk, voice_id, acquire=False)
+                if not chunk_path:
+                    return None
+                return await asyncio.to_thread(audio_storage.get, chunk_path)
+        
+        parts = await asyncio.gather(*[render(chunk) for chunk in split_text(text)])
+        if not parts or any(part is None for part in parts):
             return None
+        return await VoiceAIService._join_mp3(parts)
     
     @staticmethod
-    def generate_voice_message(text: str, user_id: int, voice_id: Optional[str] = None) -> Optional[str]:
+    async def _join_mp3(parts: List[bytes]) -> bytes:
         """
-        Generate a voice message from text using Inworld AI API
+        Join complete MP3 files into one
+        
+        With ffmpeg, the concat demuxer copies the audio frames and writes one header
+        for the whole file. Without it, each part's own ID3 tags and Xing/Info header
+        are stripped so the result doesn't claim the first part's duration.
+        """
+        if len(parts) == 1:
+            return parts[0]
+        if audio_variants.FFMPEG_PATH:
+            with tempfile.TemporaryDirectory(prefix="voicetree_join_") as work_dir:
+                work_dir = Path(work_dir)
+                listing = []
+                for idx, part in enumerate(parts):
+                    (work_dir / f"part_{idx}.mp3").write_bytes(part)
+                    listing.append(f"file 'part_{idx}.mp3'\n")
+                (work_dir / "parts.txt").write_text("".join(listing))
+                output = work_dir / "joined.mp3"
+                if await audio_variants.run_ffmpeg(
+                    ["-f", "concat", "-i", str(work_dir / "parts.txt"), "-c", "copy", str(output)],
+                    "joining audio chunks"
+                ):
+                    return output.read_bytes()
+        
+        return b"".join(strip_mp3_headers(part) for part in parts)
+    
+    @staticmethod
+    async def generate_with_voice_clone(text: str, voice_id: str, user_id: int, purpose: str = "general") -> Optional[str]:
+        """
+        Generate audio using a specific voice clone via Inworld AI API
         
         Args:
-            text: Text content to convert to speech (max 2000 chars)
-            user_id: ID of the user submitting the message
-            voice_id: Optional custom voice ID (uses default if not provided)
+            text: Text to convert to speech (max TTS_MAX_TEXT_CHARS; long texts are synthesized in chunks)
+            voice_id: Inworld AI voice ID
+            user_id: User ID for filename
+            purpose: Purpose of the audio (e.g., 'link', 'welcome')
             
         Returns:
-            Relative path to the saved audio file, or None if generation fails
+            Relative path to the saved audio file, or None if failed
             
         Raises:
-            ValueError: If text exceeds 2000 characters or API key is not set
+            ValueError: If text exceeds TTS_MAX_TEXT_CHARS characters or API key is not set
         """
-        # Validate input
-        if not text or len(text.strip()) == 0:
-            raise ValueError("Text content cannot be empty")
-        
-        if len(text) > 2000:
-            raise ValueError("Text content exceeds 2000 character limit")
+        if len(text) > TTS_MAX_TEXT_CHARS:
+            raise ValueError(f"Text content exceeds {TTS_MAX_TEXT_CHARS} character limit")
         
-        if not INWORLD_API_KEY:
+        if not inworld.configured:
             raise ValueError("INWORLD_API_KEY environment variable is not set")
         
         try:
-            # Use voice clone if provided, otherwise use default
-            voice = voice_id if voice_id else DEFAULT_VOICE
-            
-            # Generate unique filename
-            filename = f"voice_{user_id}_{uuid.uuid4().hex[:8]}.mp3"
-            file_path = AUDIO_DIR / filename
-            
-            # Prepare API request
-            url = f"{INWORLD_API_BASE}/voice"
-            headers = {
-                "Authorization": f"Basic {INWORLD_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "text": text.strip(),
-                "voiceId": voice,
-                "modelId": DEFAULT_MODEL,
-                "audioConfig": {
-                    "encoding": "MP3",
-                    "sampleRateHertz": 22050
-                }
-            }
-            
-            # Make API request
-            response = requests.post(url, headers=headers, json=payload)
-            
-            if response.status_code != 200:
-                print(f"Inworld AI API error: {response.text}")
-                return None
-            
-            result = response.json()
-            audio_content_base64 = result.get("audioContent")
-            
-            if not audio_content_base64:
-                print("No audio content in response")
-                return None
-            
-            # Decode base64 audio and save
-            audio_data = base64.b64decode(audio_content_base64)
-            with open(file_path, "wb") as f:
-                f.write(audio_data)
-            
-            # Return relative path for database storage
-            return f"audio/{filename}"
+            # Identical text and voice share one content-addressed file
+            return await VoiceAIService._cached_audio(text, voice_id)
             
         except Exception as e:
-            print(f"Error generating voice message: {str(e)}")
+            print(f"Error generating audio with Inworld AI: {str(e)}")
             return None
     
     @staticmethod
-    def test_voice_clone(text: str, voice_id: str) -> Optional[bytes]:
+    async def test_voice_clone(text: str, voice_id: str) -> Optional[bytes]:
         """
         Test a voice clone by generating audio and returning the raw bytes
         Used for the success screen test interface
@@ -290,44 +512,16 @@ class VoiceAIService:
         Returns:
             Audio bytes, or None if failed
         """
-        if not INWORLD_API_KEY:
+        if not inworld.configured:
             raise ValueError("INWORLD_API_KEY environment variable is not set")
         
         try:
-            # Prepare API request
-            url = f"{INWORLD_API_BASE}/voice"
-            headers = {
-                "Authorization": f"Basic {INWORLD_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "text": text.strip(),
-                "voiceId": voice_id,
-                "modelId": DEFAULT_MODEL,
-                "audioConfig": {
-                    "encoding": "MP3",
-                    "sampleRateHertz": 22050
-                }
-            }
-            
-            # Make API request
-            response = requests.post(url, headers=headers, json=payload)
-            
-            if response.status_code != 200:
-                print(f"Inworld AI API error: {response.text}")
-                return None
-            
-            result = response.json()
-            audio_content_base64 = result.get("audioContent")
-            
-            if not audio_content_base64:
-                print("No audio content in response")
+            # Cache without taking a reference, so repeated tests of the same sentence are free
+            audio_path = await VoiceAIService._cached_audio(text, voice_id, acquire=False)
+            if not audio_path:
                 return None
             
-            # Decode base64 audio and return bytes
-            return base64.b64decode(audio_content_base64)
-            
+            return await asyncio.to_thread(audio_storage.get, audio_path)
         except Exception as e:
             print(f"Error testing voice clone: {str(e)}")
             return None
@@ -337,6 +531,9 @@ class VoiceAIService:
         """
         Delete an audio file from the storage
         
+        Cached TTS audio may be shared, so for those files this only drops one reference
+        and leaves the file for the cache to evict once nothing uses it.
+        
         Args:
             audio_path: Relative path to the audio file
             
@@ -344,23 +541,82 @@ class VoiceAIService:
             True if deletion was successful, False otherwise
         """
         try:
+            if audio_path and tts_cache.release(audio_path):
+                return True
             if audio_path:
-                full_path = Path(__file__).parent / audio_path
-                if full_path.exists():
-                    full_path.unlink()
-                    return True
+                audio_variants.delete_variants(audio_path)
+                return audio_storage.delete(audio_path)
         except Exception as e:
             print(f"Error deleting audio file: {str(e)}")
         return False
     
     @staticmethod
-    def validate_text(text: str, max_length: int = 2000) -> tuple[bool, Optional[str]]:
+    def daily_welcome_text(base_text: str, display_name: str, day: date, max_length: int = 500) -> str:
+        """
+        Write the day's welcome message for a "daily_ai" profile
+
+        Wraps the creator's own welcome text in a greeting and sign-off that change
+        with the date, so each day's message is fresh but stays in their words.
+
+        Args:
+            base_text: The creator's welcome message
+            display_name: Creator's display name
+            day: Date the message is for
+            max_length: Maximum message length (daily messages stay short even when the static welcome is long)
+
+        Returns:
+            Message text for the day
+        """
+        weekday = day.strftime("%A")
+        greetings = [
+            f"Happy {weekday}!",
+            f"Hey, welcome in, and happy {weekday}.",
+            f"Good to see you this {weekday}!",
+            f"Hi there, it's {display_name}. Hope your {weekday} is going well.",
+        ]
+        sign_offs = [
+            "Thanks for stopping by!",
+            "Have a great day!",
+            "Check out my latest links below.",
+            "See you tomorrow!",
+        ]
+        # Stable for a given creator and day, different from one day to the next
+        seed = day.toordinal() + sum(map(ord, display_name))
+        text = f"{greetings[seed % len(greetings)]} {base_text.strip()} {sign_offs[(seed // len(greetings)) % len(sign_offs)]}"
+
+        if len(text) > max_length:
+            text = base_text.strip()[:max_length]
+        return text
+
+    @staticmethod
+    def default_link_intro(title: str, description: Optional[str] = None, max_length: int = 200) -> str:
+        """
+        Write a short spoken intro for a link from its title and description
+        
+        Args:
+            title: Link title
+            description: Optional link description
+            max_length: Maximum intro length (Link.voice_message_text holds 200 chars)
+            
+        Returns:
+            Intro text, trimmed at a word boundary to fit max_length
+        """
+        text = f"Check out {title.strip()}!"
+        if description and description.strip():
+            text += f" {description.strip()}"
+        
+        if len(text) > max_length:
+            text = text[:max_length - 3].rsplit(" ", 1)[0].rstrip(".,;:!") + "..."
+        return text
+    
+    @staticmethod
+    def validate_text(text: str, max_length: int = TTS_MAX_TEXT_CHARS) -> tuple[bool, Optional[str]]:
         """
         Validate text content for voice message generation
         
         Args:
             text: Text to validate
-            max_length: Maximum allowed length (default 2000 for Inworld AI)
+            max_length: Maximum allowed length (longer than one Inworld request; long texts are chunked)
             
         Returns:
             Tuple of (is_valid, error_message)
@@ -0,0 +1,201 @@
+"""
+Daily welcome message pre-generation for VoiceTree
+Re-renders "daily_ai" welcome messages once a day during an off-peak window, so profile views only ever serve finished audio
+
+Usage:
+    python welcome_scheduler.py  # Regenerate today's messages now, outside the window
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime, date, time as dt_time
+from typing import Optional, Dict, List, Tuple
+
+from sqlalchemy import update
+
+from database import SessionLocal
+from models import User
+from voice_ai import VoiceAIService
+from inworld_client import inworld
+
+# Scheduler configuration (window times are server local time, "HH:MM"; the window may wrap midnight)
+DAILY_WELCOME_WINDOW_START = os.getenv("DAILY_WELCOME_WINDOW_START", "03:00")
+DAILY_WELCOME_WINDOW_END = os.getenv("DAILY_WELCOME_WINDOW_END", "05:00")
+DAILY_WELCOME_CONCURRENCY = int(os.getenv("DAILY_WELCOME_CONCURRENCY", "3"))  # Parallel syntheses
+DAILY_WELCOME_CHECK_INTERVAL = float(os.getenv("DAILY_WELCOME_CHECK_INTERVAL", "300"))  # Seconds, 0 disables
+DAILY_WELCOME_BATCH = int(os.getenv("DAILY_WELCOME_BATCH", "100"))  # Users loaded per query
+
+
+def _parse_clock(value: str) -> dt_time:
+    hours, _, minutes = value.strip().partition(":")
+    return dt_time(int(hours), int(minutes or 0))
+
+
+def in_window(now: datetime, start: str = DAILY_WELCOME_WINDOW_START, end: str = DAILY_WELCOME_WINDOW_END) -> bool:
+    """Whether `now` falls inside the off-peak window"""
+    start_time, end_time = _parse_clock(start), _parse_clock(end)
+    current = now.time()
+    if start_time <= end_time:
+        return start_time <= current < end_time
+    # Wraps midnight, e.g. 23:00-02:00
+    return current >= start_time or current < end_time
+
+
+def _daily_users(after_id: int) -> List[Tuple[int, str, str, str, Optional[str]]]:
+    """Next batch of users with a daily_ai welcome that can be generated"""
+    with SessionLocal() as db:
+        return db.query(
+            User.id, User.display_name, User.voice_clone_id,
+            User.welcome_message_text, User.welcome_message_audio
+        ).filter(
+            User.id > after_id,
+            User.welcome_message_type == "daily_ai",
+            User.voice_clone_id.isnot(None),
+            User.welcome_message_text.isnot(None)
+        ).order_by(User.id).limit(DAILY_WELCOME_BATCH).all()
+
+
+def swap_welcome_audio(user_id: int, old_audio: Optional[str], new_audio: str) -> bool:
+    """
+    Point the user at the new audio, unless their welcome changed while it was generating
+
+    The update only matches if welcome_message_audio still holds the file we started
+    from, so a welcome the creator saved in the meantime is never overwritten.
+
+    Returns:
+        True if the new audio is now live
+    """
+    with SessionLocal() as db:
+        result = db.execute(
+            update(User).where(
+                User.id == user_id,
+                User.welcome_message_type == "daily_ai",
+                User.welcome_message_audio == old_audio if old_audio else User.welcome_message_audio.is_(None)
+            ).values(welcome_message_audio=new_audio)
+        )
+        db.commit()
+        swapped = result.rowcount == 1
+
+    if not swapped or old_audio == new_audio:
+        # Lost the race, or the same audio as yesterday: drop the reference we just took
+        VoiceAIService.delete_audio_file(new_audio)
+    elif old_audio:
+        VoiceAIService.delete_audio_file(old_audio)
+    return swapped
+
+
+class WelcomeScheduler:
+    """Runs the daily regeneration once per day, inside the off-peak window"""
+
+    def __init__(self):
+        self.last_run_date: Optional[date] = None
+        self.last_report: Optional[Dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _regenerate(self, semaphore: asyncio.Semaphore, day: date, user: Tuple, report: Dict):
+        user_id, display_name, voice_id, base_text, old_audio = user
+        text = VoiceAIService.daily_welcome_text(base_text, display_name, day)
+        async with semaphore:
+            audio_path = await VoiceAIService.generate_with_voice_clone(
+                text=text,
+                voice_id=voice_id,
+                user_id=user_id,
+                purpose="welcome"
+            )
+        if not audio_path:
+            report["failed"] += 1
+            return
+        if swap_welcome_audio(user_id, old_audio, audio_path):
+            report["updated"] += 1
+        else:
+            report["skipped"] += 1
+
+    async def run(self, day: Optional[date] = None) -> Dict:
+        """
+        Regenerate every daily_ai welcome message for `day` (default today)
+
+        Returns:
+            Report with users processed, updated, skipped (changed mid-run) and failed
+        """
+        day = day or date.today()
+        started = time.monotonic()
+        report = {"date": day.isoformat(), "users": 0, "updated": 0, "skipped": 0, "failed": 0}
+        if not inworld.configured:
+            report["error"] = "INWORLD_API_KEY environment variable is not set"
+            self.last_report = report
+            return report
+
+        semaphore = asyncio.Semaphore(DAILY_WELCOME_CONCURRENCY)
+        after_id = 0
+        while True:
+            users = await asyncio.to_thread(_daily_users, after_id)
+            if not users:
+                break
+            report["users"] += len(users)
+            results = await asyncio.gather(
+                *(self._regenerate(semaphore, day, user, report) for user in users),
+                return_exceptions=True
+            )
+            for user, result in zip(users, results):
+                if isinstance(result, Exception):
+                    report["failed"] += 1
+                    print(f"Error generating daily welcome for user {user[0]}: {str(result)}")
+            after_id = users[-1][0]
+
+        report["duration_seconds"] = round(time.monotonic() - started, 2)
+        self.last_run_date = day
+        self.last_report = report
+        return report
+
+    async def _run_forever(self):
+        while True:
+            now = datetime.now()
+            if self.last_run_date != now.date() and in_window(now):
+                try:
+                    report = await self.run(now.date())
+                    print(
+                        f"Daily welcomes: {report['updated']} updated, {report['failed']} failed "
+                        f"({report['users']} users)"
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Don't retry in a tight loop; tomorrow's window gets another go
+                    self.last_run_date = now.date()
+                    print(f"Error generating daily welcome messages: {str(e)}")
+            await asyncio.sleep(DAILY_WELCOME_CHECK_INTERVAL)
+
+    async def start(self):
+        """Launch the scheduler (started with the app)"""
+        if DAILY_WELCOME_CHECK_INTERVAL > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Shared scheduler, started and stopped with the app
+welcome_scheduler = WelcomeScheduler()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate today's daily_ai welcome messages")
+    parser.parse_args()
+
+    async def run():
+        try:
+            return await welcome_scheduler.run()
+        finally:
+            await inworld.close()
+
+    report = asyncio.run(run())
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
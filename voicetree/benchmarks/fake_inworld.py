@@ -0,0 +1,275 @@
+"""
+Local stand-in for the Inworld TTS API
+Serves /tts/v1/voice, /tts/v1/voice:stream and /tts/v1/clone with deterministic audio, configurable latency and injected faults
+
+Usage:
+    python voicetree/benchmarks/fake_inworld.py --port 8090 --latency lognormal:0.8,0.5 \\
+        --error-rate 0.05 --rate-limit 10
+    INWORLD_API_BASE=http://localhost:8090/tts/v1 INWORLD_API_KEY=local uvicorn app:app --port 8000
+    curl -X POST http://localhost:8090/_config -d '{"latency": "fixed:3"}'  # change faults while running
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+from aiohttp import web
+
+# Silent MPEG-2 Layer III frames: 22050 Hz mono 32 kbps, 576 samples (~26 ms) per frame.
+# Zeroed side info decodes as silence; the first frame's unused bytes carry a digest of
+# the request, so different texts and voices give different (but repeatable) files.
+FRAME_HEADER = bytes([0xFF, 0xF3, 0x40, 0xC0])
+FRAME_SIZE = 104
+SIDE_INFO_SIZE = 9
+FRAME_SECONDS = 576 / 22050
+
+SPEECH_CHARS_PER_SECOND = 15  # Roughly conversational speed, sets the audio length
+STREAM_CHUNK_FRAMES = 40  # Frames per streamed chunk (~1s of audio)
+
+
+def fake_audio(text: str, voice_id: str) -> bytes:
+    """Deterministic, decodable MP3 whose duration follows the text length"""
+    digest = hashlib.sha256(f"{voice_id}\n{text}".encode("utf-8")).digest()
+    frames = max(1, round(len(text) / SPEECH_CHARS_PER_SECOND / FRAME_SECONDS))
+    padding = bytes(FRAME_SIZE - len(FRAME_HEADER) - SIDE_INFO_SIZE - len(digest))
+    silent = FRAME_HEADER + bytes(FRAME_SIZE - len(FRAME_HEADER))
+    return FRAME_HEADER + bytes(SIDE_INFO_SIZE) + digest + padding + silent * (frames - 1)
+
+
+def parse_latency(spec: str):
+    """
+    Parse a latency distribution into a sampler returning seconds
+
+    fixed:S, uniform:LOW,HIGH, normal:MEAN,STDDEV, lognormal:MEDIAN,SIGMA,
+    or exponential:MEAN. Samples are never negative.
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value.strip()]
+    samplers = {
+        "fixed": (1, lambda rng, s: s),
+        "uniform": (2, lambda rng, low, high: rng.uniform(low, high)),
+        "normal": (2, lambda rng, mean, stddev: rng.gauss(mean, stddev)),
+        "lognormal": (2, lambda rng, median, sigma: median * rng.lognormvariate(0, sigma)),
+        "exponential": (1, lambda rng, mean: rng.expovariate(1 / mean) if mean > 0 else 0),
+    }
+    if kind not in samplers or len(values) != samplers[kind][0]:
+        raise ValueError(f"Invalid latency distribution: {spec!r}")
+    sample = samplers[kind][1]
+    return lambda rng: max(0.0, sample(rng, *values))
+
+
+class FakeInworld:
+    """Request handlers plus the fault settings and counters they share"""
+
+    def __init__(self, latency: str = "fixed:0", latency_per_char: float = 0.0, error_rate: float = 0.0,
+                 error_statuses=(500, 503), rate_limit: float = 0.0, rate_burst: int = 10,
+                 throttle_rate: float = 0.0, retry_after: float = 1.0, stream_chunk_delay: float = 0.0,
+                 seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+        self.configure(
+            latency=latency, latency_per_char=latency_per_char, error_rate=error_rate,
+            error_statuses=error_statuses, rate_limit=rate_limit, rate_burst=rate_burst,
+            throttle_rate=throttle_rate, retry_after=retry_after, stream_chunk_delay=stream_chunk_delay
+        )
+        self.tokens = float(self.rate_burst)
+        self.updated = time.monotonic()
+        self.stats = defaultdict(lambda: defaultdict(int))
+
+    def configure(self, **settings):
+        """Apply new settings (unknown names are rejected)"""
+        for name, value in settings.items():
+            if name == "latency":
+                self.latency_sampler = parse_latency(value)
+            elif name == "error_statuses":
+                value = tuple(int(status) for status in value)
+            elif name not in ("latency_per_char", "error_rate", "rate_limit", "rate_burst",
+                              "throttle_rate", "retry_after", "stream_chunk_delay"):
+                raise ValueError(f"Unknown setting: {name}")
+            setattr(self, name, value)
+
+    def settings(self) -> Dict:
+        return {
+            "latency": self.latency,
+            "latency_per_char": self.latency_per_char,
+            "error_rate": self.error_rate,
+            "error_statuses": list(self.error_statuses),
+            "rate_limit": self.rate_limit,
+            "rate_burst": self.rate_burst,
+            "throttle_rate": self.throttle_rate,
+            "retry_after": self.retry_after,
+            "stream_chunk_delay": self.stream_chunk_delay,
+        }
+
+    def _over_quota(self) -> bool:
+        """Token bucket quota, like the real API's per-key request rate"""
+        if self.rate_limit <= 0:
+            return False
+        now = time.monotonic()
+        self.tokens = min(self.rate_burst, self.tokens + (now - self.updated) * self.rate_limit)
+        self.updated = now
+        if self.tokens < 1:
+            return True
+        self.tokens -= 1
+        return False
+
+    def _fault(self, endpoint: str, request: web.Request) -> Optional[web.Response]:
+        """The error response to send instead of a result, if any"""
+        counters = self.stats[endpoint]
+        counters["requests"] += 1
+        if not request.headers.get("Authorization"):
+            counters["unauthorized"] += 1
+            return web.json_response({"code": 16, "message": "Missing credentials"}, status=401)
+        if self._over_quota() or self.rng.random() < self.throttle_rate:
+            counters["throttled"] += 1
+            return web.json_response(
+                {"code": 8, "message": "Quota exceeded"},
+                status=429,
+                headers={"Retry-After": f"{self.retry_after:g}"}
+            )
+        if self.rng.random() < self.error_rate:
+            status = self.rng.choice(self.error_statuses)
+            counters[f"error_{status}"] += 1
+            return web.json_response({"code": 13, "message": "Injected failure"}, status=status)
+        return None
+
+    async def _delay(self, text: str = ""):
+        await asyncio.sleep(self.latency_sampler(self.rng) + self.latency_per_char * len(text))
+
+    async def voice(self, request: web.Request) -> web.Response:
+        fault = self._fault("voice", request)
+        payload = await request.json()
+        await self._delay(payload.get("text", ""))
+        if fault:
+            return fault
+        audio = fake_audio(payload.get("text", ""), payload.get("voiceId", ""))
+        self.stats["voice"]["ok"] += 1
+        self.stats["voice"]["audio_bytes"] += len(audio)
+        return web.json_response({"audioContent": base64.b64encode(audio).decode("ascii")})
+
+    async def voice_stream(self, request: web.Request) -> web.StreamResponse:
+        fault = self._fault("voice:stream", request)
+        payload = await request.json()
+        # Time to first chunk; the remaining latency is spread over the chunks
+        await self._delay()
+        if fault:
+            return fault
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        audio = fake_audio(payload.get("text", ""), payload.get("voiceId", ""))
+        chunk_size = FRAME_SIZE * STREAM_CHUNK_FRAMES
+        for start in range(0, len(audio), chunk_size):
+            if start:
+                await asyncio.sleep(self.stream_chunk_delay + self.latency_per_char * SPEECH_CHARS_PER_SECOND)
+            chunk = base64.b64encode(audio[start:start + chunk_size]).decode("ascii")
+            await response.write(json.dumps({"result": {"audioContent": chunk}}).encode("utf-8") + b"\n")
+        await response.write_eof()
+        self.stats["voice:stream"]["ok"] += 1
+        self.stats["voice:stream"]["audio_bytes"] += len(audio)
+        return response
+
+    async def clone(self, request: web.Request) -> web.Response:
+        fault = self._fault("clone", request)
+        name = ""
+        digest = hashlib.sha256()
+        samples = 0
+        reader = await request.multipart()
+        async for part in reader:
+            if part.name == "name":
+                name = await part.text()
+            elif part.name == "audioSamples":
+                samples += 1
+                while True:
+                    data = await part.read_chunk()
+                    if not data:
+                        break
+                    digest.update(data)
+        await self._delay()
+        if fault:
+            return fault
+        if not samples:
+            return web.json_response({"code": 3, "message": "At least one audio sample is required"}, status=400)
+        self.stats["clone"]["ok"] += 1
+        voice_id = f"{name.replace(' ', '_') or 'voice'}_{digest.hexdigest()[:8]}"
+        return web.json_response({"voiceId": voice_id, "name": name})
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({endpoint: dict(counters) for endpoint, counters in self.stats.items()})
+
+    async def update_config(self, request: web.Request) -> web.Response:
+        try:
+            self.configure(**await request.json())
+        except (ValueError, TypeError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+        if request.query.get("reset_stats"):
+            self.stats.clear()
+        return web.json_response(self.settings())
+
+    async def get_config(self, request: web.Request) -> web.Response:
+        return web.json_response(self.settings())
+
+
+def create_app(fake: FakeInworld) -> web.Application:
+    app = web.Application(client_max_size=50 * 1024 * 1024)
+    app.router.add_post("/tts/v1/voice", fake.voice)
+    app.router.add_post("/tts/v1/voice:stream", fake.voice_stream)
+    app.router.add_post("/tts/v1/clone", fake.clone)
+    app.router.add_get("/_stats", fake.get_stats)
+    app.router.add_get("/_config", fake.get_config)
+    app.router.add_post("/_config", fake.update_config)
+    return app
+
+
+async def start_server(fake: FakeInworld, host: str = "127.0.0.1", port: int = 8090) -> web.AppRunner:
+    """Run the stand-in inside an existing event loop (tests, benchmarks); call runner.cleanup() to stop"""
+    runner = web.AppRunner(create_app(fake))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Inworld TTS API stand-in with latency and fault injection")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", default="fixed:0.2",
+                        help="Response latency distribution: fixed:S, uniform:LOW,HIGH, normal:MEAN,SD, "
+                             "lognormal:MEDIAN,SIGMA or exponential:MEAN (seconds)")
+    parser.add_argument("--latency-per-char", type=float, default=0.0, help="Extra seconds per character of text")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 5xx")
+    parser.add_argument("--error-statuses", default="500,503", help="Statuses to pick injected errors from")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Requests per second before answering 429 (0 = off)")
+    parser.add_argument("--rate-burst", type=int, default=10)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429 regardless of rate")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--stream-chunk-delay", type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible latency and faults")
+    args = parser.parse_args()
+
+    try:
+        fake = FakeInworld(
+            latency=args.latency,
+            latency_per_char=args.latency_per_char,
+            error_rate=args.error_rate,
+            error_statuses=[int(status) for status in args.error_statuses.split(",")],
+            rate_limit=args.rate_limit,
+            rate_burst=args.rate_burst,
+            throttle_rate=args.throttle_rate,
+            retry_after=args.retry_after,
+            stream_chunk_delay=args.stream_chunk_delay,
+            seed=args.seed,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(f"Fake Inworld API on http://{args.host}:{args.port}/tts/v1 ({json.dumps(fake.settings())})")
+    web.run_app(create_app(fake), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Synthetic dataset generator for selfie.fm
+Bulk-loads users, links, profile views, link clicks and pending voice messages into a SQLite database
+
+Usage:
+    python voicetree/benchmarks/generate_dataset.py --db bench.db --users 5000 --events 1000000
+"""
+import argparse
+import bisect
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, update, bindparam
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from database import Base  # noqa: E402
+from models import User, Link, ProfileView, LinkClick, VoiceMessage  # noqa: E402
+
+BATCH_SIZE = 50000
+HISTORY_DAYS = 90  # Spread events over this many days so 30-day filters are selective
+CLICK_SHARE = 0.4  # Fraction of events that are link clicks (the rest are profile views)
+
+REFERRERS = [
+    ("direct", 30),
+    ("https://www.instagram.com/", 25),
+    ("https://l.instagram.com/", 8),
+    ("https://www.tiktok.com/", 12),
+    ("https://twitter.com/", 6),
+    ("https://t.co/", 4),
+    ("https://www.youtube.com/", 5),
+    ("https://m.facebook.com/", 4),
+    ("https://www.linkedin.com/", 2),
+    ("https://www.google.com/", 2),
+    ("https://duckduckgo.com/", 1),
+    ("https://news.ycombinator.com/", 1),
+]
+
+USER_AGENTS = [
+    ("Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148 Instagram 309.0", 30),
+    ("Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1", 20),
+    ("Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36", 18),
+    ("Mozilla/5.0 (Linux; Android 13; SM-S911B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Mobile Safari/537.36 musical_ly_2023", 10),
+    ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36", 10),
+    ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0", 7),
+    ("Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0", 3),
+    ("", 2),
+]
+
+LINK_TITLES = [
+    "My Website", "Latest Video", "Shop My Favorites", "Podcast", "Newsletter", "Instagram",
+    "TikTok", "YouTube Channel", "Spotify Playlist", "Book a Call", "Merch Store", "Blog",
+    "Support Me", "New Single", "Tour Dates", "Free Guide", "Discord Community", "Course",
+]
+
+VOICE_TEXTS = [
+    "Hey! Love your content, keep it up!",
+    "Just wanted to say your last video changed my week.",
+    "Where did you get that jacket from?",
+    "Shout out from Berlin, see you at the next show!",
+    "Can you do a tutorial on your editing setup?",
+]
+
+
+def zipf_cum_weights(n: int, s: float = 1.1) -> list:
+    """Cumulative Zipf weights so rank 0 is the most popular item"""
+    return list(itertools.accumulate(1.0 / ((rank + 1) ** s) for rank in range(n)))
+
+
+def weighted_picker(rng: random.Random, choices: list):
+    """Return a fast sampler over (value, weight) pairs"""
+    values = [v for v, _ in choices]
+    cum = list(itertools.accumulate(w for _, w in choices))
+    total = cum[-1]
+    return lambda: values[bisect.bisect_right(cum, rng.random() * total)]
+
+
+def make_engine(db_path: str):
+    engine = create_engine(f"sqlite:///{db_path}")
+
+    @event.listens_for(engine, "connect")
+    def _fast_pragmas(dbapi_connection, connection_record):
+        # Bulk load settings: durability doesn't matter for a throwaway benchmark database
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=OFF")
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.execute("PRAGMA cache_size=-200000")
+        cursor.close()
+
+    return engine
+
+
+def generate(db_path: str, users: int, events: int, pending_voices: int = None, seed: int = 42,
+             verbose: bool = True) -> dict:
+    """
+    Build a synthetic database with skewed popularity
+
+    Args:
+        db_path: SQLite file to create (replaced if it exists)
+        users: Number of creator profiles
+        events: Total ProfileView + LinkClick rows
+        pending_voices: Pending VoiceMessage rows (defaults to 1% of events, capped at 100k)
+        seed: Random seed for a reproducible dataset
+
+    Returns:
+        Dict with row counts and load timings
+    """
+    rng = random.Random(seed)
+    log = print if verbose else (lambda *a, **k: None)
+    if pending_voices is None:
+        pending_voices = min(100000, max(100, events // 100))
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    engine = make_engine(db_path)
+    Base.metadata.create_all(bind=engine)
+
+    now = datetime.now()
+    started = time.perf_counter()
+    timings = {}
+
+    # Users and links
+    user_rows = []
+    link_rows = []
+    user_links = []  # user index -> list of link ids, most popular first
+    link_id = 0
+    for i in range(users):
+        user_rows.append({
+            "id": i + 1,
+            "username": f"user{i:06d}",
+            "display_name": f"Creator {i}",
+            "bio": rng.choice(["Artist", "Podcaster", "Coach", "Musician", "Streamer"]) + f" #{i}",
+            "is_published": True,
+            "imported_from_linktree": rng.random() < 0.3,
+            "welcome_message_type": "daily_ai" if rng.random() < 0.05 else "static",
+            "profile_views": 0,
+            "total_link_clicks": 0,
+            "voice_message_plays": 0,
+            "auto_approve_voice": False,
+            "created_at": now - timedelta(days=rng.randint(HISTORY_DAYS, 720)),
+        })
+        ids = []
+        for order in range(rng.randint(3, 20)):
+            link_id += 1
+            ids.append(link_id)
+            link_rows.append({
+                "id": link_id,
+                "user_id": i + 1,
+                "title": rng.choice(LINK_TITLES),
+                "url": f"https://example.com/user{i:06d}/{order}",
+                "is_active": rng.random() < 0.95,
+                "order": order,
+                "click_count": 0,
+                "created_at": now - timedelta(days=rng.randint(0, HISTORY_DAYS)),
+            })
+        user_links.append(ids)
+
+    t = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), user_rows)
+        for start in range(0, len(link_rows), BATCH_SIZE):
+            conn.execute(Link.__table__.insert(), link_rows[start:start + BATCH_SIZE])
+    timings["users_and_links_s"] = round(time.perf_counter() - t, 3)
+    log(f"Inserted {users} users and {len(link_rows)} links in {timings['users_and_links_s']}s")
+
+    # Events, streamed in batches
+    user_cum = zipf_cum_weights(users)
+    user_total = user_cum[-1]
+    link_cums = {}
+    pick_referrer = weighted_picker(rng, REFERRERS)
+    pick_agent = weighted_picker(rng, USER_AGENTS)
+    history_seconds = HISTORY_DAYS * 86400
+
+    profile_views = [0] * users
+    user_clicks = [0] * users
+    link_clicks = {}
+    views_inserted = clicks_inserted = 0
+
+    t = time.perf_counter()
+    with engine.begin() as conn:
+        remaining = events
+        while remaining > 0:
+            batch = min(BATCH_SIZE, remaining)
+            remaining -= batch
+            views, clicks = [], []
+            for _ in range(batch):
+                u = bisect.bisect_right(user_cum, rng.random() * user_total)
+                when = now - timedelta(seconds=int(history_seconds * rng.random() ** 1.5))
+                referrer = pick_referrer()
+                if rng.random() < CLICK_SHARE:
+                    ids = user_links[u]
+                    cum = link_cums.get(len(ids))
+                    if cum is None:
+                        cum = link_cums[len(ids)] = zipf_cum_weights(len(ids))
+                    lid = ids[bisect.bisect_right(cum, rng.random() * cum[-1])]
+                    link_clicks[lid] = link_clicks.get(lid, 0) + 1
+                    user_clicks[u] += 1
+                    clicks.append({
+                        "link_id": lid,
+                        "user_id": u + 1,
+                        "click_date": when,
+                        "referrer": referrer,
+                        "user_agent": pick_agent(),
+                    })
+                else:
+                    profile_views[u] += 1
+                    views.append({"user_id": u + 1, "view_date": when, "referrer": referrer})
+            if views:
+                conn.execute(ProfileView.__table__.insert(), views)
+            if clicks:
+                conn.execute(LinkClick.__table__.insert(), clicks)
+            views_inserted += len(views)
+            clicks_inserted += len(clicks)
+            log(f"  {events - remaining}/{events} events")
+    timings["events_s"] = round(time.perf_counter() - t, 3)
+    log(f"Inserted {views_inserted} views and {clicks_inserted} clicks in {timings['events_s']}s")
+
+    # Pending voice messages, concentrated on popular profiles
+    t = time.perf_counter()
+    with engine.begin() as conn:
+        remaining = pending_voices
+        while remaining > 0:
+            batch = min(BATCH_SIZE, remaining)
+            remaining -= batch
+            conn.execute(VoiceMessage.__table__.insert(), [{
+                "user_id": bisect.bisect_right(user_cum, rng.random() * user_total) + 1,
+                "text_content": rng.choice(VOICE_TEXTS),
+                "audio_file_path": f"audio/voice_bench_{rng.getrandbits(32):08x}.mp3",
+                "is_approved": False,
+                "is_active": True,
+                "created_at": now - timedelta(seconds=rng.randint(0, history_seconds)),
+            } for _ in range(batch)])
+    timings["voice_messages_s"] = round(time.perf_counter() - t, 3)
+
+    # Keep the denormalized counters consistent with the event tables
+    t = time.perf_counter()
+    users_table = User.__table__
+    links_table = Link.__table__
+    with engine.begin() as conn:
+        conn.execute(
+            update(users_table).where(users_table.c.id == bindparam("uid")).values(
+                profile_views=bindparam("views"), total_link_clicks=bindparam("clicks")
+            ),
+            [{"uid": u + 1, "views": profile_views[u], "clicks": user_clicks[u]} for u in range(users)],
+        )
+        if link_clicks:
+            conn.execute(
+                update(links_table).where(links_table.c.id == bindparam("lid")).values(
+                    click_count=bindparam("clicks")
+                ),
+                [{"lid": lid, "clicks": n} for lid, n in link_clicks.items()],
+            )
+    timings["counters_s"] = round(time.perf_counter() - t, 3)
+    engine.dispose()
+
+    summary = {
+        "users": users,
+        "links": len(link_rows),
+        "profile_views": views_inserted,
+        "link_clicks": clicks_inserted,
+        "pending_voice_messages": pending_voices,
+        "timings": timings,
+        "total_s": round(time.perf_counter() - started, 3),
+    }
+    log(f"Dataset ready in {summary['total_s']}s: {db_path}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic selfie.fm dataset")
+    parser.add_argument("--db", default="bench.db", help="SQLite file to create (replaced if present)")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--events", type=int, default=1000000, help="Total profile views + link clicks")
+    parser.add_argument("--pending-voices", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    generate(args.db, args.users, args.events, args.pending_voices, args.seed)
+
+
+if __name__ == "__main__":
+    main()
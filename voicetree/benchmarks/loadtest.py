@@ -0,0 +1,344 @@
+"""
+HTTP load generator for selfie.fm
+Drives a running instance with visitor and creator traffic mixes and writes a JSON latency report
+
+Usage:
+    cd voicetree/backend && uvicorn app:app --port 8000
+    python voicetree/benchmarks/loadtest.py --base-url http://localhost:8000 \\
+        --mix visitor=0.9,creator=0.1 --concurrency 50 --duration 60 --output report.json
+    python voicetree/benchmarks/loadtest.py --compare baseline.json report.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import aiohttp
+
+# Histogram bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+AUDIO_SRC_RE = re.compile(r'src="(/audio/[^"]+)"')
+
+REFERRERS = [
+    "direct",
+    "https://www.instagram.com/",
+    "https://twitter.com/",
+    "https://www.tiktok.com/",
+    "https://www.youtube.com/",
+    "https://www.google.com/",
+]
+
+USER_AGENTS = [
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148",
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 Chrome/120.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 Chrome/120.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36",
+]
+
+
+class Recorder:
+    """Collects per-endpoint latency samples and errors"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.status_codes = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, elapsed_ms: float, status: int):
+        self.samples[endpoint].append(elapsed_ms)
+        self.status_codes[endpoint][str(status)] += 1
+        if status == 0 or status >= 400:
+            self.errors[endpoint] += 1
+
+    @staticmethod
+    def _percentile(sorted_samples: list, pct: float) -> float:
+        if not sorted_samples:
+            return 0.0
+        index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+        return round(sorted_samples[index], 3)
+
+    @staticmethod
+    def _histogram(samples: list) -> dict:
+        buckets = {f"le_{b}": 0 for b in LATENCY_BUCKETS_MS}
+        buckets["le_inf"] = 0
+        for s in samples:
+            for b in LATENCY_BUCKETS_MS:
+                if s <= b:
+                    buckets[f"le_{b}"] += 1
+                    break
+            else:
+                buckets["le_inf"] += 1
+        return buckets
+
+    def summarize(self, samples: list, errors: int, elapsed_s: float, status_codes: dict = None) -> dict:
+        ordered = sorted(samples)
+        count = len(ordered)
+        summary = {
+            "requests": count,
+            "errors": errors,
+            "error_rate": round(errors / count, 4) if count else 0.0,
+            "throughput_rps": round(count / elapsed_s, 2) if elapsed_s else 0.0,
+            "mean_ms": round(sum(ordered) / count, 3) if count else 0.0,
+            "p50_ms": self._percentile(ordered, 50),
+            "p90_ms": self._percentile(ordered, 90),
+            "p99_ms": self._percentile(ordered, 99),
+            "max_ms": round(ordered[-1], 3) if count else 0.0,
+            "histogram": self._histogram(ordered),
+        }
+        if status_codes is not None:
+            summary["status_codes"] = dict(status_codes)
+        return summary
+
+    def report(self, elapsed_s: float) -> dict:
+        all_samples = [s for samples in self.samples.values() for s in samples]
+        return {
+            "overall": self.summarize(all_samples, sum(self.errors.values()), elapsed_s),
+            "endpoints": {
+                endpoint: self.summarize(samples, self.errors[endpoint], elapsed_s, self.status_codes[endpoint])
+                for endpoint, samples in sorted(self.samples.items())
+            },
+        }
+
+
+class LoadTest:
+    """Seeds profiles and runs weighted visitor/creator sessions against the app"""
+
+    def __init__(self, base_url: str, mix: dict, concurrency: int, duration: float,
+                 users: int, links_per_user: int, think_time: float, seed: int):
+        self.base_url = base_url.rstrip("/")
+        self.mix = mix
+        self.concurrency = concurrency
+        self.duration = duration
+        self.user_count = users
+        self.links_per_user = links_per_user
+        self.think_time = think_time
+        self.random = random.Random(seed)
+        self.recorder = Recorder()
+        self.profiles = []  # [(username, [link_id, ...])]
+        self.popularity = []  # Zipf-like weights, most popular profile first
+
+    async def request(self, session: aiohttp.ClientSession, method: str, endpoint: str, path: str, **kwargs):
+        """Issue one request, record its latency under the route template name"""
+        start = time.perf_counter()
+        try:
+            async with session.request(method, self.base_url + path, **kwargs) as response:
+                body = await response.read()
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            body, status = b"", 0
+        self.recorder.record(f"{method} {endpoint}", (time.perf_counter() - start) * 1000, status)
+        return status, body
+
+    async def seed(self, session: aiohttp.ClientSession):
+        """Create (or reuse) published load-test profiles with links"""
+        for i in range(self.user_count):
+            username = f"loadtest{i:05d}"
+            async with session.post(f"{self.base_url}/api/users", json={
+                "username": username,
+                "display_name": f"Load Test {i}",
+                "bio": "Seeded by the load generator",
+            }) as response:
+                created = response.status == 200
+
+            if created:
+                for j in range(self.links_per_user):
+                    async with session.post(f"{self.base_url}/api/users/{username}/links", json={
+                        "title": f"Link {j}",
+                        "url": f"https://example.com/{username}/{j}",
+                        "description": "Seeded link",
+                    }) as response:
+                        response.raise_for_status()
+                async with session.put(f"{self.base_url}/api/users/{username}/publish") as response:
+                    response.raise_for_status()
+
+            async with session.get(f"{self.base_url}/api/users/{username}/links") as response:
+                response.raise_for_status()
+                link_ids = [link["id"] for link in await response.json()]
+            self.profiles.append((username, link_ids))
+
+        self.popularity = [1.0 / (rank + 1) for rank in range(len(self.profiles))]
+
+    def pick_profile(self):
+        return self.random.choices(self.profiles, weights=self.popularity, k=1)[0]
+
+    async def think(self):
+        if self.think_time:
+            await asyncio.sleep(self.random.uniform(0, self.think_time))
+
+    async def visitor_session(self, session: aiohttp.ClientSession):
+        """Anonymous visitor: load a profile, click a few links, maybe play voice"""
+        username, link_ids = self.pick_profile()
+        headers = {
+            "Referer": self.random.choice(REFERRERS),
+            "User-Agent": self.random.choice(USER_AGENTS),
+        }
+
+        status, body = await self.request(session, "GET", "/{username}", f"/{username}", headers=headers)
+        if status != 200:
+            return
+        audio_urls = AUDIO_SRC_RE.findall(body.decode("utf-8", "ignore"))
+
+        if audio_urls and self.random.random() < 0.3:
+            await self.think()
+            await self.request(session, "GET", "/audio/{filename}", self.random.choice(audio_urls))
+            await self.request(session, "POST", "/api/track/voice-play/{username}",
+                               f"/api/track/voice-play/{username}")
+
+        for _ in range(self.random.choice([0, 1, 1, 2])):
+            if not link_ids:
+                break
+            await self.think()
+            link_id = self.random.choice(link_ids)
+            await self.request(session, "POST", "/api/clicks/{username}/{link_id}",
+                               f"/api/clicks/{username}/{link_id}", headers=headers)
+
+    async def creator_session(self, session: aiohttp.ClientSession):
+        """Creator: load the dashboard and analytics, occasionally edit a link"""
+        username, link_ids = self.pick_profile()
+
+        await self.request(session, "GET", "/dashboard/{username}", f"/dashboard/{username}")
+        analytics = ["stats", "views-chart", "clicks-chart", "traffic-sources", "recent-clicks", "pending-voices"]
+        await asyncio.gather(*[
+            self.request(session, "GET", f"/api/admin/{{username}}/{name}", f"/api/admin/{username}/{name}")
+            for name in analytics
+        ])
+
+        if link_ids and self.random.random() < 0.2:
+            await self.think()
+            link_id = self.random.choice(link_ids)
+            await self.request(session, "PUT", "/api/users/{username}/links/{link_id}",
+                               f"/api/users/{username}/links/{link_id}", json={
+                                   "title": f"Link {link_id} ({self.random.randint(0, 9999)})",
+                                   "url": f"https://example.com/{username}/{link_id}",
+                               })
+
+    async def worker(self, session: aiohttp.ClientSession, deadline: float):
+        scenarios = {"visitor": self.visitor_session, "creator": self.creator_session}
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        while time.perf_counter() < deadline:
+            name = self.random.choices(names, weights=weights, k=1)[0]
+            await scenarios[name](session)
+            await self.think()
+
+    async def run(self) -> dict:
+        timeout = aiohttp.ClientTimeout(total=30)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            await self.seed(session)
+
+            start = time.perf_counter()
+            deadline = start + self.duration
+            await asyncio.gather(*[self.worker(session, deadline) for _ in range(self.concurrency)])
+            elapsed = time.perf_counter() - start
+
+        report = self.recorder.report(elapsed)
+        report["config"] = {
+            "base_url": self.base_url,
+            "mix": self.mix,
+            "concurrency": self.concurrency,
+            "duration_s": self.duration,
+            "users": self.user_count,
+            "links_per_user": self.links_per_user,
+            "think_time_s": self.think_time,
+        }
+        report["started_at"] = datetime.now().isoformat()
+        report["elapsed_s"] = round(elapsed, 3)
+        return report
+
+
+def parse_mix(value: str) -> dict:
+    """Parse 'visitor=0.9,creator=0.1' into a weight mapping"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("visitor", "creator"):
+            raise argparse.ArgumentTypeError(f"Unknown traffic mix '{name}' (expected visitor or creator)")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def compare_reports(baseline_path: str, current_path: str):
+    """Print per-endpoint latency and error deltas between two reports"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+
+    rows = [("overall", baseline["overall"], current["overall"])]
+    for endpoint, stats in current["endpoints"].items():
+        if endpoint in baseline["endpoints"]:
+            rows.append((endpoint, baseline["endpoints"][endpoint], stats))
+
+    print(f"{'endpoint':<48} {'p50 ms':>16} {'p99 ms':>16} {'error rate':>18}")
+    for name, old, new in rows:
+        print(
+            f"{name:<48} "
+            f"{old['p50_ms']:>7.1f} -> {new['p50_ms']:<7.1f}"
+            f"{old['p99_ms']:>7.1f} -> {new['p99_ms']:<7.1f}"
+            f"{old['error_rate']:>8.2%} -> {new['error_rate']:<8.2%}"
+        )
+
+
+def print_summary(report: dict):
+    overall = report["overall"]
+    print(
+        f"{overall['requests']} requests in {report['elapsed_s']}s "
+        f"({overall['throughput_rps']} req/s), error rate {overall['error_rate']:.2%}"
+    )
+    print(f"{'endpoint':<48} {'count':>7} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for endpoint, stats in report["endpoints"].items():
+        print(f"{endpoint:<48} {stats['requests']:>7} {stats['p50_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['errors']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a running selfie.fm instance")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("visitor=0.9,creator=0.1"),
+                        help="Weighted traffic mix, e.g. visitor=0.9,creator=0.1")
+    parser.add_argument("--concurrency", type=int, default=20, help="Number of concurrent simulated clients")
+    parser.add_argument("--duration", type=float, default=30, help="Test duration in seconds")
+    parser.add_argument("--users", type=int, default=50, help="Number of seeded profiles")
+    parser.add_argument("--links-per-user", type=int, default=8)
+    parser.add_argument("--think-time", type=float, default=0.0, help="Max random pause between actions (seconds)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for reproducible traffic")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Compare two saved reports instead of running a test")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_reports(*args.compare)
+        return
+
+    test = LoadTest(
+        base_url=args.base_url,
+        mix=args.mix,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        users=args.users,
+        links_per_user=args.links_per_user,
+        think_time=args.think_time,
+        seed=args.seed,
+    )
+    report = asyncio.run(test.run())
+    print_summary(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+    if report["overall"]["requests"] == 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
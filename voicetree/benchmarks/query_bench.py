@@ -0,0 +1,157 @@
+"""
+Analytics and moderation query benchmark for selfie.fm
+Times the real route handlers against synthetic datasets at several event scales
+
+Usage:
+    python voicetree/benchmarks/query_bench.py --scales 10000,1000000 --output results.json
+    python voicetree/benchmarks/query_bench.py --baseline results.json --threshold 1.5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..", "backend")
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from generate_dataset import generate  # noqa: E402
+
+DEFAULT_SCALES = [10000, 1000000, 10000000]
+
+
+def load_queries():
+    """Import the route handlers to benchmark (app.py resolves its paths relative to backend/)"""
+    cwd = os.getcwd()
+    os.chdir(BACKEND_DIR)
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+
+    # name -> callable(username, db)
+    return {
+        "stats": app.get_dashboard_stats,
+        "views_chart": app.get_views_chart_data,
+        "clicks_chart": app.get_clicks_chart_data,
+        "traffic_sources": app.get_traffic_sources,
+        "recent_clicks": lambda username, db: app.get_recent_clicks(username, limit=20, db=db),
+        "pending_voices": app.get_pending_voice_messages,
+        "moderation_feed": lambda username, db: app.get_moderation_feed(username, cursor=None, limit=50, db=db),
+    }
+
+
+def dataset_path(events: int, users: int) -> str:
+    return os.path.join(DATA_DIR, f"bench_{users}u_{events}e.db")
+
+
+def time_query(fn, username: str, session_factory, repeat: int) -> dict:
+    """Run one query `repeat` times on fresh sessions and summarize the timings"""
+    timings = []
+    for _ in range(repeat):
+        db = session_factory()
+        try:
+            start = time.perf_counter()
+            fn(username, db)
+            timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            db.close()
+    timings.sort()
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "min_ms": round(timings[0], 3),
+        "max_ms": round(timings[-1], 3),
+    }
+
+
+def run(scales: list, users: int, repeat: int, regenerate: bool) -> dict:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    queries = load_queries()
+    os.makedirs(DATA_DIR, exist_ok=True)
+    results = {}
+
+    for events in scales:
+        path = dataset_path(events, users)
+        if regenerate or not os.path.exists(path):
+            print(f"Generating dataset with {events} events...")
+            generate(path, users, events, verbose=False)
+
+        engine = create_engine(f"sqlite:///{path}")
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        # Most popular profile and a typical one from the middle of the long tail
+        targets = {"top_user": "user000000", "median_user": f"user{users // 2:06d}"}
+
+        scale_results = {}
+        for name, fn in queries.items():
+            scale_results[name] = {
+                target: time_query(fn, username, session_factory, repeat)
+                for target, username in targets.items()
+            }
+            print(
+                f"[{events:>10} events] {name:<18} "
+                + "  ".join(f"{t}={r['median_ms']:.2f}ms" for t, r in scale_results[name].items())
+            )
+        results[str(events)] = scale_results
+        engine.dispose()
+
+    return results
+
+
+def find_regressions(baseline: dict, current: dict, threshold: float) -> list:
+    """List (scale, query, target, old_ms, new_ms) entries slower than threshold x baseline"""
+    regressions = []
+    for scale, queries in current.items():
+        for name, targets in queries.items():
+            for target, result in targets.items():
+                old = baseline.get(scale, {}).get(name, {}).get(target)
+                if not old:
+                    continue
+                # Ignore sub-millisecond noise
+                if result["median_ms"] > max(old["median_ms"] * threshold, old["median_ms"] + 1.0):
+                    regressions.append((scale, name, target, old["median_ms"], result["median_ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark analytics and moderation queries")
+    parser.add_argument("--scales", default=",".join(str(s) for s in DEFAULT_SCALES),
+                        help="Comma-separated event counts to benchmark")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=7, help="Runs per query (median is reported)")
+    parser.add_argument("--regenerate", action="store_true", help="Rebuild cached datasets")
+    parser.add_argument("--output", help="Write results JSON to this path")
+    parser.add_argument("--baseline", help="Previous results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="Slowdown factor over baseline that counts as a regression")
+    args = parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(",") if s]
+    results = run(scales, args.users, args.repeat, args.regenerate)
+    report = {"generated_at": datetime.now().isoformat(), "users": args.users, "results": results}
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = find_regressions(baseline, results, args.threshold)
+        for scale, name, target, old, new in regressions:
+            print(f"REGRESSION [{scale} events] {name} ({target}): {old:.2f}ms -> {new:.2f}ms")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Linktree page parsing micro-benchmark for selfie.fm
+Times LinktreeScraper.parse_html per page (embedded __NEXT_DATA__ and DOM-only pages) with each available parser backend, against the previous BeautifulSoup extraction
+
+Usage:
+    python voicetree/benchmarks/scrape_bench.py --links 10,50,200 --repeat 50
+    python voicetree/benchmarks/scrape_bench.py --html saved_page.html --output results.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..", "backend")
+
+sys.path.insert(0, BACKEND_DIR)
+
+import scraper as scraper_module  # noqa: E402
+
+DEFAULT_LINK_COUNTS = [10, 50, 200]
+
+
+def next_data_script(links: int) -> str:
+    """The __NEXT_DATA__ payload a Linktree profile page embeds"""
+    payload = {
+        "props": {"pageProps": {
+            "account": {
+                "username": "bench",
+                "pageTitle": "Bench Creator",
+                "description": "Links, podcasts & more",
+                "profilePictureUrl": "https://ugc.production.linktr.ee/bench.jpg",
+            },
+            "links": [
+                {"id": i, "type": "CLASSIC", "title": f"Link number {i} & more", "position": i,
+                 "url": f"https://example.com/{i}?utm_source=linktree", "thumbnail": None, "locked": False}
+                for i in range(links)
+            ],
+        }},
+        "page": "/[profile]",
+        "buildId": "bench",
+    }
+    return f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(payload)}</script>'
+
+
+def synthetic_page(links: int, next_data: bool = False) -> str:
+    """A page shaped like a Linktree profile: heavy head, nested wrappers, icons, footer links"""
+    head = "".join(
+        f'<link rel="preload" href="/_next/static/chunks/{i}.js" as="script">' for i in range(30)
+    )
+    scripts = "".join(
+        f'<script>window.__chunk_{i} = {json.dumps({"id": i, "data": "x" * 400})};</script>' for i in range(10)
+    )
+    buttons = "".join(
+        f'<div class="sc-wrapper"><div class="sc-item"><a data-testid="LinkButton" class="sc-LinkButton-{i}" '
+        f'href="https://example.com/{i}?utm_source=linktree" target="_blank" rel="noopener">'
+        f'<div class="thumb"><svg viewBox="0 0 24 24"><path d="M12 2L2 7l10 5 10-5-10-5z"></path></svg></div>'
+        f'<p class="sc-title">Link number {i} &amp; more</p></a></div></div>'
+        for i in range(links)
+    )
+    footer = (
+        '<footer><a href="https://linktr.ee/s/about">Join Linktree</a>'
+        '<a href="https://linktr.ee/privacy">Privacy</a><a href="#">Report</a>'
+        '<a href="javascript:void(0)">Cookie Preferences</a></footer>'
+    )
+    return (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+        '<title>Bench Creator | Linktree</title>'
+        '<meta property="og:title" content="Bench Creator">'
+        '<meta property="og:description" content="Links, podcasts &amp; more">'
+        f'{head}</head><body><div id="__next"><main><h1>@bench</h1>{buttons}</main>{footer}</div>'
+        f'{scripts}{next_data_script(links) if next_data else ""}</body></html>'
+    )
+
+
+def legacy_parse(html: str, username: str) -> dict:
+    """The previous extraction (BeautifulSoup html.parser, three select passes, links uncapped), as a baseline"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    display_name = username
+    title_tag = soup.find('title')
+    if title_tag:
+        title_text = title_tag.get_text()
+        if '|' in title_text:
+            display_name = title_text.split('|')[0].strip()
+        elif 'Linktree' in title_text:
+            display_name = title_text.replace('Linktree', '').strip()
+    og_title = soup.find('meta', property='og:title')
+    if og_title and og_title.get('content'):
+        display_name = og_title['content']
+    bio = ""
+    og_description = soup.find('meta', property='og:description')
+    if og_description and og_description.get('content'):
+        bio = og_description['content']
+
+    links = []
+    for selector in [
+        'a[data-testid*="link"]',
+        'a[class*="Link"]',
+        'a[href]:not([href^="#"]):not([href^="javascript"])'
+    ]:
+        for link in soup.select(selector):
+            href = link.get('href', '')
+            title = link.get_text(strip=True)
+            if not href or not title or len(title) < 2:
+                continue
+            if 'cookie' in title.lower() or 'privacy' in title.lower():
+                continue
+            if href.startswith('http') or href.startswith('//'):
+                if href.startswith('//'):
+                    href = 'https:' + href
+                if not any(l['url'] == href for l in links):
+                    links.append({'title': title, 'url': href})
+        if links:
+            break
+    return {'username': username, 'display_name': display_name or username, 'bio': bio, 'avatar_url': None, 'links': links}
+
+
+def backends() -> dict:
+    """name -> parse(html, username) for every backend that can run here"""
+    lxml_etree = scraper_module.etree
+    scraper = scraper_module.LinktreeScraper()
+
+    def with_etree(etree):
+        def parse(html, username):
+            scraper_module.etree = etree
+            try:
+                return scraper.parse_html(html, username)
+            finally:
+                scraper_module.etree = lxml_etree
+        return parse
+
+    available = {}
+    if lxml_etree is not None:
+        available["lxml"] = with_etree(lxml_etree)
+    available["stdlib"] = with_etree(None)
+    try:
+        import bs4  # noqa: F401
+        available["bs4_legacy"] = legacy_parse
+    except ImportError:
+        print("beautifulsoup4 not installed; skipping the legacy baseline")
+    return available
+
+
+def time_parse(parse, html: str, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(html, "bench")
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    median = statistics.median(timings)
+    return {
+        "median_ms": round(median, 3),
+        "min_ms": round(timings[0], 3),
+        "max_ms": round(timings[-1], 3),
+        "pages_per_second": round(1000 / median, 1) if median else None,
+    }
+
+
+def run(pages: dict, repeat: int) -> dict:
+    parsers = backends()
+    results = {}
+    for page_name, html in pages.items():
+        # Every backend must extract the same thing, or the timings don't compare like for like.
+        # The legacy extraction never read __NEXT_DATA__, so it's only checked on DOM-only pages.
+        outputs = {
+            name: parse(html, "bench") for name, parse in parsers.items()
+            if not (name == "bs4_legacy" and "__NEXT_DATA__" in html)
+        }
+        reference = next(iter(outputs.values()))
+        mismatched = [name for name, output in outputs.items() if output != reference]
+        if mismatched:
+            print(f"WARNING [{page_name}] output differs for: {', '.join(mismatched)}")
+
+        page_results = {"bytes": len(html.encode("utf-8")), "links_found": len(reference["links"])}
+        for name, parse in parsers.items():
+            page_results[name] = time_parse(parse, html, repeat)
+        results[page_name] = page_results
+        print(
+            f"[{page_name:<14} {page_results['bytes'] / 1024:>7.1f} KB {page_results['links_found']:>4} links] "
+            + "  ".join(f"{name}={page_results[name]['median_ms']:.2f}ms" for name in parsers)
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Linktree page parsing per page")
+    parser.add_argument("--links", default=",".join(str(n) for n in DEFAULT_LINK_COUNTS),
+                        help="Comma-separated link counts for synthetic pages")
+    parser.add_argument("--html", action="append", default=[], help="Saved Linktree page to benchmark (repeatable)")
+    parser.add_argument("--repeat", type=int, default=30, help="Parses per page and backend (median is reported)")
+    parser.add_argument("--output", help="Write results JSON to this path")
+    args = parser.parse_args()
+
+    pages = {}
+    for n in (int(n) for n in args.links.split(",") if n):
+        pages[f"next_data_{n}"] = synthetic_page(n, next_data=True)
+        pages[f"dom_only_{n}"] = synthetic_page(n)
+    for path in args.html:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            pages[os.path.basename(path)] = f.read()
+
+    results = run(pages, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"generated_at": datetime.now().isoformat(), "repeat": args.repeat, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture
+def app_db(tmp_path, monkeypatch):
+    """Point the shared SessionLocal and audio storage at a fresh database and directory"""
+    import database
+    import models  # noqa: F401 (registers the tables)
+    from audio_storage import audio_storage
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    database.Base.metadata.create_all(bind=engine)
+    original_bind = database.SessionLocal.kw["bind"]
+    database.SessionLocal.configure(bind=engine)
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(audio_storage, "root", tmp_path / "storage")
+    try:
+        yield database.SessionLocal
+    finally:
+        database.SessionLocal.configure(bind=original_bind)
+        engine.dispose()
+
+
+@pytest.fixture
+def fake_tts(monkeypatch):
+    """Synthesize deterministic bytes per text instead of calling Inworld; returns the list of texts synthesized"""
+    import audio_sprites
+    import audio_variants
+    from inworld_client import inworld
+    from voice_ai import VoiceAIService
+
+    calls = []
+
+    async def synthesize(text, voice_id):
+        calls.append(text)
+        return f"{voice_id}:{text}".encode()
+
+    monkeypatch.setattr(VoiceAIService, "_synthesize", staticmethod(synthesize))
+    monkeypatch.setattr(inworld, "api_key", "test-key")
+    monkeypatch.setattr(audio_variants, "AUDIO_VARIANTS_ENABLED", False)
+    monkeypatch.setattr(audio_sprites, "AUDIO_SPRITES_ENABLED", False)
+    return calls
@@ -0,0 +1,207 @@
+"""
+Contract tests for the audio storage backends
+
+The S3 backend runs against moto in server mode, a real HTTP endpoint like MinIO, so
+presigned URLs and multipart uploads go over the wire. Point S3_TEST_ENDPOINT_URL at a
+MinIO instance (with S3_TEST_BUCKET, S3_ACCESS_KEY_ID, S3_SECRET_ACCESS_KEY) to run the
+same tests against it instead.
+"""
+import io
+import os
+import socket
+
+import pytest
+
+import audio_storage
+from audio_storage import AudioStorage, LocalAudioStorage, S3AudioStorage
+
+MIB = 1024 * 1024
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def s3_endpoint():
+    """(endpoint_url, bucket, access_key_id, secret_access_key) for an S3-compatible server"""
+    endpoint = os.getenv("S3_TEST_ENDPOINT_URL")
+    if endpoint:
+        yield (
+            endpoint,
+            os.getenv("S3_TEST_BUCKET", "voicetree-test"),
+            os.getenv("S3_ACCESS_KEY_ID"),
+            os.getenv("S3_SECRET_ACCESS_KEY"),
+        )
+        return
+
+    pytest.importorskip("boto3")
+    moto_server = pytest.importorskip("moto.server")
+    port = free_port()
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    try:
+        yield f"http://127.0.0.1:{port}", "voicetree-test", "testing", "testing"
+    finally:
+        server.stop()
+
+
+@pytest.fixture
+def s3_storage(s3_endpoint):
+    endpoint, bucket, access_key_id, secret_access_key = s3_endpoint
+    storage = S3AudioStorage(
+        bucket=bucket, prefix="/media/", endpoint_url=endpoint,
+        access_key_id=access_key_id, secret_access_key=secret_access_key
+    )
+    try:
+        storage.client.create_bucket(Bucket=bucket)
+    except storage.client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+    yield storage
+
+    paginator = storage.client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket):
+        for item in page.get("Contents", []):
+            storage.client.delete_object(Bucket=bucket, Key=item["Key"])
+
+
+@pytest.fixture
+def local_storage(tmp_path):
+    return LocalAudioStorage(tmp_path)
+
+
+@pytest.fixture(params=["local", "s3"])
+def storage(request):
+    return request.getfixturevalue(f"{request.param}_storage")
+
+
+def test_interface_is_abstract():
+    with pytest.raises(TypeError):
+        AudioStorage()
+
+    class Partial(AudioStorage):
+        def put(self, key, data, content_type="audio/mpeg"):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_put_get_roundtrip(storage):
+    storage.put("audio/tts_a.mp3", b"ID3 first")
+
+    assert storage.get("audio/tts_a.mp3") == b"ID3 first"
+    assert storage.exists("audio/tts_a.mp3")
+    assert storage.size("audio/tts_a.mp3") == len(b"ID3 first")
+    assert b"".join(storage.iter_chunks("audio/tts_a.mp3", chunk_size=3)) == b"ID3 first"
+
+
+def test_missing_key(storage):
+    assert not storage.exists("audio/missing.mp3")
+    assert storage.size("audio/missing.mp3") is None
+    assert storage.delete("audio/missing.mp3") is False
+
+
+def test_put_file_consumes_source(storage, tmp_path):
+    source = tmp_path / "finished.mp3"
+    source.write_bytes(b"finished audio")
+
+    storage.put_file("audio/voice_samples/7_sample_0.mp3", source)
+
+    assert not source.exists()
+    assert storage.get("audio/voice_samples/7_sample_0.mp3") == b"finished audio"
+
+
+def test_put_fileobj_copies_from_start(storage):
+    data = os.urandom(3 * MIB)  # Large enough for a multipart upload on S3
+    fileobj = io.BytesIO(data)
+    fileobj.seek(len(data))
+
+    storage.put_fileobj("audio/voice_samples/7_sample_1.mp3", fileobj)
+
+    assert storage.get("audio/voice_samples/7_sample_1.mp3") == data
+
+
+def test_open_reads_whole_blob(storage):
+    small = b"small blob"
+    large = os.urandom(audio_storage.SPOOL_MAX_MEMORY + 1024)  # Spills to disk on S3
+    storage.put("audio/small.mp3", small)
+    storage.put("audio/large.mp3", large)
+
+    with storage.open("audio/small.mp3") as f:
+        assert f.read() == small
+    with storage.open("audio/large.mp3") as f:
+        assert f.read(10) == large[:10]
+        f.seek(0)
+        assert f.read() == large
+
+
+def test_delete(storage):
+    storage.put("audio/tts_b.mp3", b"bytes")
+
+    assert storage.delete("audio/tts_b.mp3") is True
+    assert not storage.exists("audio/tts_b.mp3")
+    assert storage.delete("audio/tts_b.mp3") is False
+
+
+def test_list_pages_through_every_object(storage):
+    keys = {f"audio/tts_{i:02d}.mp3" for i in range(7)} | {"audio/voice_samples/1_sample_0.mp3"}
+    for key in keys:
+        storage.put(key, key.encode())
+    storage.put("exports/not_audio.csv", b"skip me")
+
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        page = storage.list("audio/", start_after=cursor, limit=3)
+        if not page:
+            break
+        assert len(page) <= 3
+        seen.extend(page)
+        cursor = page[-1].cursor
+        pages += 1
+
+    assert pages == 3
+    assert [stored.key for stored in seen if stored.key not in keys] == []
+    assert sorted(stored.key for stored in seen) == sorted(keys)
+    for stored in seen:
+        assert stored.size == len(stored.key.encode())
+        assert stored.modified > 0
+
+
+def test_s3_keys_live_under_prefix(s3_storage):
+    s3_storage.put("audio/tts_c.mp3", b"prefixed")
+    # An object outside the configured prefix must not show up as app audio
+    s3_storage.client.put_object(Bucket=s3_storage.bucket, Key="audio/tts_other_app.mp3", Body=b"other")
+
+    raw = s3_storage.client.get_object(Bucket=s3_storage.bucket, Key="media/audio/tts_c.mp3")
+    assert raw["Body"].read() == b"prefixed"
+    assert raw["CacheControl"] == audio_storage.OBJECT_CACHE_CONTROL
+    assert raw["ContentType"] == "audio/mpeg"
+
+    listed = s3_storage.list("audio/")
+    assert [stored.key for stored in listed] == ["audio/tts_c.mp3"]
+    assert listed[0].cursor == "media/audio/tts_c.mp3"
+
+
+def test_s3_presigned_url_downloads_object(s3_storage):
+    requests = pytest.importorskip("requests")
+    s3_storage.put("audio/tts_d.mp3", b"presigned bytes")
+
+    url = s3_storage.url("audio/tts_d.mp3", expires=60)
+
+    assert "media/audio/tts_d.mp3" in url
+    response = requests.get(url, timeout=10)
+    assert response.status_code == 200
+    assert response.content == b"presigned bytes"
+
+
+def test_local_backend_serves_from_disk(local_storage):
+    local_storage.put("audio/tts_e.mp3", b"on disk")
+
+    assert local_storage.local_path("audio/tts_e.mp3").read_bytes() == b"on disk"
+    assert local_storage.local_path("audio/missing.mp3") is None
+    assert local_storage.url("audio/tts_e.mp3") is None
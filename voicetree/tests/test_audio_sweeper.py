@@ -0,0 +1,51 @@
+"""Tests for the audio storage sweeper"""
+import asyncio
+import threading
+
+import audio_sweeper
+from audio_storage import audio_storage
+from audio_sweeper import AudioSweeper
+from models import User, VoiceMessage
+
+
+def test_sweep_deletes_unreferenced_audio_off_the_event_loop(app_db, monkeypatch):
+    monkeypatch.setattr(audio_sweeper, "AUDIO_SWEEP_BATCH_DELAY", 0)
+    with app_db() as db:
+        user = User(username="ann", display_name="Ann")
+        db.add(user)
+        db.flush()
+        db.add(VoiceMessage(user_id=user.id, text_content="no", audio_file_path="audio/rejected.mp3", is_active=False))
+        db.add(VoiceMessage(user_id=user.id, text_content="yes", audio_file_path="audio/kept.mp3", is_active=True))
+        db.commit()
+    for key in ("audio/rejected.mp3", "audio/kept.mp3", "audio/orphan.mp3"):
+        audio_storage.put(key, b"audio")
+
+    loop_threads = []
+    for name in ("_load_references", "_still_referenced", "_reclaim"):
+        original = getattr(audio_sweeper, name)
+
+        def wrapped(*args, _original=original):
+            loop_threads.append(threading.current_thread() is threading.main_thread())
+            return _original(*args)
+
+        monkeypatch.setattr(audio_sweeper, name, wrapped)
+
+    report = asyncio.run(AudioSweeper().sweep(max_batches=0, grace=0))
+
+    assert report["deleted_files"] == 2
+    assert report["complete"]
+    assert not audio_storage.exists("audio/rejected.mp3")
+    assert not audio_storage.exists("audio/orphan.mp3")
+    assert audio_storage.exists("audio/kept.mp3")
+    assert loop_threads and not any(loop_threads)
+
+
+def test_dry_run_deletes_nothing(app_db, monkeypatch):
+    monkeypatch.setattr(audio_sweeper, "AUDIO_SWEEP_BATCH_DELAY", 0)
+    audio_storage.put("audio/orphan.mp3", b"audio")
+
+    report = asyncio.run(AudioSweeper().sweep(dry_run=True, max_batches=0, grace=0))
+
+    assert report["reclaimable_files"] == 1
+    assert report["deleted_files"] == 0
+    assert audio_storage.exists("audio/orphan.mp3")
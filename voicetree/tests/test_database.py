@@ -0,0 +1,20 @@
+"""Tests for database initialization"""
+from sqlalchemy import create_engine, inspect, text
+
+import database
+import models  # noqa: F401 (registers the tables)
+
+
+def test_init_db_adds_indexes_to_existing_tables(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    database.Base.metadata.create_all(bind=engine)
+    # A database created before the keyset moderation index existed
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_voice_messages_moderation"))
+    monkeypatch.setattr(database, "engine", engine)
+
+    database.init_db()
+    database.init_db()  # Idempotent
+
+    names = {index["name"] for index in inspect(engine).get_indexes("voice_messages")}
+    assert "ix_voice_messages_moderation" in names
@@ -0,0 +1,63 @@
+"""Tests for joining chunked TTS MP3s without stale per-chunk headers"""
+import asyncio
+
+import audio_variants
+import voice_ai
+from voice_ai import VoiceAIService, strip_mp3_headers
+
+# MPEG-2 Layer III, no CRC, 32 kbps, 22050 Hz, mono: 104-byte frames
+FRAME_HEADER = bytes([0xFF, 0xF3, 0x40, 0xC0])
+FRAME_LENGTH = 104
+
+
+def audio_frame(fill: int) -> bytes:
+    return FRAME_HEADER + bytes([fill]) * (FRAME_LENGTH - 4)
+
+
+def info_frame(tag: bytes = b"Info") -> bytes:
+    body = bytes(9) + tag + bytes(FRAME_LENGTH - 4 - 9 - len(tag))
+    return FRAME_HEADER + body
+
+
+def id3v2(size: int = 20) -> bytes:
+    return b"ID3\x04\x00\x00" + bytes([0, 0, 0, size]) + bytes(size)
+
+
+def id3v1() -> bytes:
+    return b"TAG" + bytes(125)
+
+
+def test_strip_removes_tags_and_info_frame():
+    frames = audio_frame(1) + audio_frame(2)
+
+    assert strip_mp3_headers(id3v2() + info_frame() + frames + id3v1()) == frames
+    assert strip_mp3_headers(info_frame(b"Xing") + frames) == frames
+
+
+def test_strip_leaves_plain_audio_alone():
+    frames = audio_frame(1) + audio_frame(2)
+
+    assert strip_mp3_headers(frames) == frames
+    assert strip_mp3_headers(b"") == b""
+
+
+def test_join_without_ffmpeg_keeps_only_audio_frames(monkeypatch):
+    monkeypatch.setattr(audio_variants, "FFMPEG_PATH", None)
+    first = id3v2() + info_frame() + audio_frame(1)
+    second = id3v2() + info_frame() + audio_frame(2) + id3v1()
+
+    joined = asyncio.run(VoiceAIService._join_mp3([first, second]))
+
+    assert joined == audio_frame(1) + audio_frame(2)
+
+
+def test_join_single_part_is_unchanged(monkeypatch):
+    monkeypatch.setattr(audio_variants, "FFMPEG_PATH", None)
+    only = id3v2() + info_frame() + audio_frame(1)
+
+    assert asyncio.run(VoiceAIService._join_mp3([only])) == only
+
+
+def test_info_frame_length_matches_header():
+    assert voice_ai._info_frame_length(info_frame() + audio_frame(1)) == FRAME_LENGTH
+    assert voice_ai._info_frame_length(audio_frame(1)) == 0
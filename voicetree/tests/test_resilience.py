@@ -0,0 +1,47 @@
+"""Tests for the provider rate limiter"""
+import asyncio
+
+import resilience
+from resilience import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_pause_does_not_refill_the_paused_window(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    bucket = TokenBucket(rate=10, burst=20)
+
+    bucket.pause(2)
+    clock.now += 1
+    assert bucket.snapshot()["available_tokens"] == 0
+
+    clock.now += 1.05  # 50ms after the pause ends
+    assert bucket.snapshot()["available_tokens"] <= 1
+
+
+def test_burst_after_pause_is_rate_limited():
+    bucket = TokenBucket(rate=20, burst=20)
+    bucket.pause(0.2)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        released = []
+
+        async def call():
+            await bucket.acquire()
+            released.append(loop.time())
+
+        await asyncio.gather(*[call() for _ in range(5)])
+        return released
+
+    released = asyncio.run(main())
+
+    # A full bucket would release all five at once; at 20/s they are ~50ms apart
+    assert released[-1] - released[0] >= 0.15
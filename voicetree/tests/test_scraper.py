@@ -0,0 +1,45 @@
+"""Tests for reading Linktree profiles out of fetched pages"""
+import json
+
+import pytest
+
+from scraper import LinktreeScraper
+
+ANCHORS = '<a href="https://example.com/shop">Shop</a>'
+
+
+def make_page(account, links=None):
+    payload = {"props": {"pageProps": {"account": account, "links": links or []}}}
+    return (
+        "<html><head><title>Ann | Linktree</title></head><body>"
+        f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(payload)}</script>'
+        f"{ANCHORS}</body></html>"
+    )
+
+
+def test_next_data_is_used_when_well_formed():
+    page = make_page(
+        {"username": "Ann", "pageTitle": "Ann B", "description": None},
+        [{"title": "Blog", "url": "https://example.com/blog", "position": 0}]
+    )
+
+    data = LinktreeScraper().parse_html(page, "ann")
+
+    assert data["display_name"] == "Ann B"
+    assert data["links"] == [{"title": "Blog", "url": "https://example.com/blog"}]
+
+
+@pytest.mark.parametrize("account, links", [
+    ({"username": "ann", "pageTitle": 42}, []),
+    ({"username": 7, "description": ["bio"]}, []),
+    ({"username": "ann"}, [{"title": None, "url": 123}]),
+    ({"username": "ann"}, [{"title": {"text": "Blog"}, "url": "https://example.com/blog"}]),
+])
+def test_malformed_next_data_falls_back_to_html(account, links):
+    scraper = LinktreeScraper()
+    page = make_page(account, links)
+
+    assert scraper.parse_next_data(page, "ann") is None
+    data = scraper.parse_html(page, "ann")
+    assert data["display_name"] == "Ann"
+    assert data["links"] == [{"title": "Shop", "url": "https://example.com/shop"}]
@@ -0,0 +1,113 @@
+"""Tests for the TTS cache's per-key synthesis locks"""
+import asyncio
+
+import tts_cache
+
+
+def test_key_lock_serializes_and_is_dropped():
+    order = []
+
+    async def worker(name):
+        async with tts_cache.key_lock("k"):
+            order.append(f"{name} in")
+            await asyncio.sleep(0.01)
+            order.append(f"{name} out")
+
+    async def main():
+        await asyncio.gather(worker("a"), worker("b"), worker("c"))
+
+    asyncio.run(main())
+
+    assert order == ["a in", "a out", "b in", "b out", "c in", "c out"]
+    assert tts_cache._key_locks == {}
+
+
+def test_key_lock_is_dropped_when_waiter_is_cancelled():
+    async def main():
+        async with tts_cache.key_lock("k"):
+            waiter = asyncio.create_task(hold("k"))
+            await asyncio.sleep(0)
+            assert tts_cache._key_locks["k"][1] == 2
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        assert tts_cache._key_locks == {}
+
+    async def hold(key):
+        async with tts_cache.key_lock(key):
+            pass
+
+    asyncio.run(main())
+
+
+def test_nested_keys_do_not_block_each_other():
+    async def main():
+        async with tts_cache.key_lock("whole text"):
+            async with tts_cache.key_lock("chunk"):
+                assert set(tts_cache._key_locks) == {"whole text", "chunk"}
+        assert tts_cache._key_locks == {}
+
+    asyncio.run(asyncio.wait_for(main(), timeout=1))
+
+
+def put_entry(key, data, ref_count=0):
+    from audio_storage import audio_storage
+    path = f"audio/{tts_cache.content_filename(data)}"
+    audio_storage.put(path, data)
+    tts_cache.store(key, path, len(data), ref_count)
+    return path
+
+
+def ref_counts(session_factory):
+    from models import TTSCacheEntry
+    with session_factory() as db:
+        return {entry.cache_key: entry.ref_count for entry in db.query(TTSCacheEntry)}
+
+
+def test_lookup_with_acquire_takes_a_reference(app_db):
+    put_entry("k1", b"audio one")
+
+    assert tts_cache.lookup("k1") is not None
+    assert ref_counts(app_db) == {"k1": 0}
+    assert tts_cache.lookup("k1", acquire=True) is not None
+    assert ref_counts(app_db) == {"k1": 1}
+    assert tts_cache.lookup("missing", acquire=True) is None
+
+
+def test_evict_skips_entries_referenced_after_selection(app_db, monkeypatch):
+    from sqlalchemy import event
+    from audio_storage import audio_storage
+    import database
+
+    path = put_entry("k1", b"x" * 100)
+    monkeypatch.setattr(tts_cache, "TTS_CACHE_MAX_BYTES", 10**9)
+
+    def acquire_first(conn, cursor, statement, parameters, context, executemany):
+        # A lookup(acquire=True) commits between eviction's candidate scan and its DELETE
+        if statement.startswith("DELETE FROM tts_cache "):
+            cursor.execute("UPDATE tts_cache SET ref_count = ref_count + 1")
+
+    event.listen(database.engine, "before_cursor_execute", acquire_first)
+    try:
+        assert tts_cache.evict(0) == 0
+    finally:
+        event.remove(database.engine, "before_cursor_execute", acquire_first)
+
+    assert ref_counts(app_db) == {"k1": 1}
+    assert audio_storage.exists(path)
+
+
+def test_evict_deletes_unreferenced_entries_and_aliases(app_db):
+    from audio_storage import audio_storage
+    from models import TTSCacheAlias
+
+    old = put_entry("old", b"o" * 100)
+    put_entry("alias", b"o" * 100)
+    kept = put_entry("kept", b"k" * 100, ref_count=1)
+
+    assert tts_cache.evict(150) == 100
+
+    assert ref_counts(app_db) == {"kept": 1}
+    assert not audio_storage.exists(old)
+    assert audio_storage.exists(kept)
+    with app_db() as db:
+        assert db.query(TTSCacheAlias).count() == 0
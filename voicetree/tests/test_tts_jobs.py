@@ -0,0 +1,104 @@
+"""Tests for the TTS job handlers' cache reference bookkeeping"""
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+import audio_variants
+import tts_jobs
+import voice_ai
+from models import User, Link, TTSJob, TTSCacheEntry
+from schemas import GenerateWelcomeRequest
+
+
+def make_user(db):
+    user = User(username="ann", display_name="Ann", voice_clone_id="voice-ann")
+    db.add(user)
+    db.commit()
+    link = Link(user_id=user.id, title="Site", url="https://example.com")
+    db.add(link)
+    db.commit()
+    return user, link
+
+
+def refs(db):
+    db.expire_all()
+    return {entry.audio_path: entry.ref_count for entry in db.query(TTSCacheEntry)}
+
+
+def test_regenerating_same_link_text_keeps_one_reference(app_db, fake_tts):
+    with app_db() as db:
+        user, link = make_user(db)
+        job = TTSJob(user_id=user.id, kind="link_voice", payload="{}")
+        db.add(job)
+        db.commit()
+
+        for _ in range(2):
+            asyncio.run(tts_jobs._run_link_voice(db, job, {"link_id": link.id, "text": "Hello there"}))
+
+        assert list(refs(db).values()) == [1]
+        assert fake_tts == ["Hello there"]
+
+
+def test_regenerating_same_welcome_keeps_one_reference(app_db, fake_tts):
+    with app_db() as db:
+        user, _ = make_user(db)
+        job = TTSJob(user_id=user.id, kind="welcome", payload="{}")
+        db.add(job)
+        db.commit()
+
+        for _ in range(2):
+            asyncio.run(tts_jobs._run_welcome(db, job, {"text": "Welcome!"}))
+
+        assert list(refs(db).values()) == [1]
+
+
+def test_bulk_regeneration_keeps_one_reference(app_db, fake_tts):
+    with app_db() as db:
+        user, link = make_user(db)
+        job = TTSJob(user_id=user.id, kind="bulk_link_voice", payload="{}")
+        db.add(job)
+        db.commit()
+        payload = {"links": [{"link_id": link.id, "text": "Same intro"}]}
+
+        for _ in range(2):
+            asyncio.run(tts_jobs._run_bulk_link_voice(db, job, payload))
+
+        assert list(refs(db).values()) == [1]
+
+
+def test_changed_text_releases_old_file(app_db, fake_tts):
+    with app_db() as db:
+        user, link = make_user(db)
+        job = TTSJob(user_id=user.id, kind="link_voice", payload="{}")
+        db.add(job)
+        db.commit()
+
+        asyncio.run(tts_jobs._run_link_voice(db, job, {"link_id": link.id, "text": "First"}))
+        asyncio.run(tts_jobs._run_link_voice(db, job, {"link_id": link.id, "text": "Second"}))
+
+        assert sorted(refs(db).values()) == [0, 1]
+
+
+def test_long_welcome_is_synthesized_in_chunks(app_db, fake_tts, monkeypatch):
+    monkeypatch.setattr(audio_variants, "FFMPEG_PATH", None)
+    text = " ".join(f"Sentence number {i} of a long welcome." for i in range(60))
+    assert len(text) > voice_ai.TTS_CHUNK_CHARS
+    request = GenerateWelcomeRequest(text=text)
+
+    with app_db() as db:
+        user, _ = make_user(db)
+        job = TTSJob(user_id=user.id, kind="welcome", payload="{}")
+        db.add(job)
+        db.commit()
+
+        result = asyncio.run(tts_jobs._run_welcome(db, job, {"text": request.text}))
+
+        assert len(fake_tts) == 60
+        assert result["audio_path"] == user.welcome_message_audio
+
+
+def test_welcome_text_limit_is_the_synthesis_limit():
+    GenerateWelcomeRequest(text="x" * voice_ai.TTS_MAX_TEXT_CHARS)
+    with pytest.raises(ValidationError):
+        GenerateWelcomeRequest(text="x" * (voice_ai.TTS_MAX_TEXT_CHARS + 1))
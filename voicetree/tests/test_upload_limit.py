@@ -0,0 +1,110 @@
+"""Tests for the voice clone request body cap and per-sample size check"""
+import asyncio
+import io
+from typing import List
+
+import pytest
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from sample_preprocessing import SampleRejected, UploadSizeLimit, checked_upload
+
+MAX_BYTES = 4096
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimit, max_bytes=MAX_BYTES)
+    received = []
+
+    @app.post("/api/voice/clone/{username}")
+    async def clone(username: str, voice_samples: List[UploadFile] = File(...)):
+        received.append(username)
+        return {"sizes": [len(await sample.read()) for sample in voice_samples]}
+
+    @app.post("/other")
+    async def other(voice_samples: List[UploadFile] = File(...)):
+        return {"sizes": [len(await sample.read()) for sample in voice_samples]}
+
+    return app, received
+
+
+def make_client():
+    app, received = make_app()
+    return TestClient(app), received
+
+
+def test_small_upload_passes():
+    client, received = make_client()
+
+    response = client.post("/api/voice/clone/ann", files=[("voice_samples", ("a.mp3", b"x" * 1000))])
+
+    assert response.status_code == 200
+    assert response.json() == {"sizes": [1000]}
+    assert received == ["ann"]
+
+
+def test_declared_length_over_limit_is_rejected_before_the_route():
+    client, received = make_client()
+
+    response = client.post("/api/voice/clone/ann", files=[("voice_samples", ("a.mp3", b"x" * 5000))])
+
+    assert response.status_code == 413
+    assert received == []
+
+
+def test_streamed_body_is_cut_off_at_limit():
+    app, received = make_app()
+    boundary = "bound"
+    head = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"voice_samples\"; filename=\"a.mp3\"\r\n"
+        "Content-Type: audio/mpeg\r\n\r\n"
+    ).encode()
+    chunks = [head] + [b"x" * 1024] * 100 + [f"\r\n--{boundary}--\r\n".encode()]
+    pulled = []
+    sent = []
+
+    async def receive():
+        pulled.append(1)
+        return {"type": "http.request", "body": chunks[len(pulled) - 1], "more_body": len(pulled) < len(chunks)}
+
+    async def send(message):
+        sent.append(message)
+
+    # Chunked transfer: no Content-Length for the middleware to check up front
+    scope = {
+        "type": "http", "method": "POST", "path": "/api/voice/clone/ann", "raw_path": b"/api/voice/clone/ann",
+        "root_path": "", "scheme": "http", "query_string": b"", "http_version": "1.1",
+        "headers": [(b"content-type", f"multipart/form-data; boundary={boundary}".encode())],
+        "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+    }
+    asyncio.run(app(scope, receive, send))
+
+    assert sent[0]["status"] == 413
+    assert received == []
+    assert len(pulled) <= MAX_BYTES // 1024 + 2
+
+
+def test_other_routes_are_not_limited():
+    client, _ = make_client()
+
+    response = client.post("/other", files=[("voice_samples", ("a.mp3", b"x" * 5000))])
+
+    assert response.status_code == 200
+
+
+def test_checked_upload_returns_the_uploaded_file_rewound():
+    source = io.BytesIO(b"x" * 1000)
+    source.seek(400)
+    upload = UploadFile(source, filename="a.mp3")
+
+    assert checked_upload(upload, max_bytes=1000) is source
+    assert source.tell() == 0
+
+
+def test_checked_upload_rejects_oversized_sample():
+    upload = UploadFile(io.BytesIO(b"x" * 1001), filename="a.mp3")
+
+    with pytest.raises(SampleRejected, match="a.mp3"):
+        checked_upload(upload, max_bytes=1000)